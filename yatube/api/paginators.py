@@ -0,0 +1,33 @@
+from django.db.models import Q
+
+from posts.paginators import CursorPaginator, FeedCursorPaginator
+
+
+class ValuesCursorPaginator(CursorPaginator):
+    """Курсорный пагинатор постов по строкам .values()."""
+
+    def get_key(self, row):
+        return row['pub_date'].isoformat(), row['id']
+
+
+class FeedValuesCursorPaginator(FeedCursorPaginator, ValuesCursorPaginator):
+    """Лента подписок по строкам .values() с ключом записи ленты."""
+
+
+class CommentCursorPaginator(ValuesCursorPaginator):
+    """Комментарии поста от старых к новым по ключу (created, id)."""
+
+    ordering = ('created', 'id')
+
+    def get_key(self, row):
+        return row['created'].isoformat(), row['id']
+
+    def after(self, queryset, key):
+        created, pk = key
+        return queryset.filter(
+            Q(created__gt=created) | Q(created=created, id__gt=pk))
+
+    def before(self, queryset, key):
+        created, pk = key
+        return queryset.filter(
+            Q(created__lt=created) | Q(created=created, id__lt=pk))
@@ -0,0 +1,147 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+COUNT_POSTS_API: int = 5  # постов у автора в тестах API
+LIMIT: int = 2  # постов на странице в тестах API
+
+
+class ApiViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {number}')
+            for number in range(COUNT_POSTS_API)
+        ]
+        cls.comment = Comment.objects.create(
+            post=cls.posts[0], author=cls.author, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+
+    def get_json(self, url, status=HTTPStatus.OK, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status)
+        return response.json()
+
+    def test_post_list_cursor_pagination(self):
+        """Лента листается курсором без пропусков и повторов"""
+        url = reverse('api:post_list')
+        data = self.get_json(url, limit=LIMIT)
+        texts = [post['text'] for post in data['results']]
+        while data['next']:
+            data = self.get_json(url, limit=LIMIT, cursor=data['next'])
+            texts.extend(post['text'] for post in data['results'])
+        self.assertEqual(
+            texts, [post.text for post in reversed(self.posts)])
+
+    def test_sparse_fields(self):
+        """?fields= оставляет только запрошенные поля"""
+        data = self.get_json(
+            reverse('api:post_detail', args=[self.posts[0].id]),
+            fields='text,author')
+        self.assertEqual(data, {'text': 'Пост 0', 'author': 'author'})
+        self.get_json(
+            reverse('api:post_list'), HTTPStatus.BAD_REQUEST,
+            fields='password')
+
+    def test_bulk_fetch_by_ids(self):
+        """?ids= отдаёт посты в порядке списка и пропускает несуществующие"""
+        ids = [self.posts[2].id, 0, self.posts[0].id]
+        data = self.get_json(
+            reverse('api:post_list'), ids=','.join(map(str, ids)),
+            fields='id')
+        self.assertEqual(
+            data['results'],
+            [{'id': self.posts[2].id}, {'id': self.posts[0].id}])
+
+    def test_one_query_per_page(self):
+        """Страница ленты и пост отдаются одним запросом"""
+        urls = (
+            reverse('api:post_list'),
+            reverse('api:post_detail', args=[self.posts[0].id]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                # автор поста для области кеша запоминается первым ответом
+                self.client.get(url, {'fields': 'id'})
+                with self.assertNumQueries(1):
+                    self.client.get(url)
+
+    def test_group_profile_and_comments(self):
+        """Посты группы, автора и комментарии поста"""
+        cases = (
+            (reverse('api:group_posts', args=[self.group.slug]),
+             COUNT_POSTS_API),
+            (reverse('api:profile_posts', args=[self.author.username]),
+             COUNT_POSTS_API),
+            (reverse('api:comment_list', args=[self.posts[0].id]), 1),
+        )
+        for url, count in cases:
+            with self.subTest(url=url):
+                data = self.get_json(url, limit=COUNT_POSTS_API)
+                self.assertEqual(len(data['results']), count)
+        self.get_json(
+            reverse('api:group_posts', args=['missing']),
+            HTTPStatus.NOT_FOUND)
+
+    def test_cached_list_sees_new_post(self):
+        """Закешированный ответ сбрасывается новым постом"""
+        url = reverse('api:post_list')
+        self.get_json(url)
+        Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.get_json(url)['results'][0]['text'],
+                         'Новый пост')
+
+    def test_follow_feed_requires_login(self):
+        """Лента подписок только для вошедших пользователей"""
+        url = reverse('api:follow_posts')
+        self.get_json(url, HTTPStatus.UNAUTHORIZED)
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=reader, author=self.author)
+        client = Client()
+        client.force_login(reader)
+        response = client.get(url, {'limit': COUNT_POSTS_API})
+        self.assertEqual(len(response.json()['results']), COUNT_POSTS_API)
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_follow_feed_merges_popular_author(self):
+        """Лента с постами популярного автора листается курсором по
+        порядку"""
+        reader = User.objects.create_user(username='reader')
+        popular = User.objects.create_user(username='popular')
+        Follow.objects.create(user=reader, author=self.author)
+        Follow.objects.create(user=reader, author=popular)
+        Follow.objects.create(
+            user=User.objects.create_user(username='other'), author=popular)
+        posts = [
+            Post.objects.create(author=author, text=f'Лента {number}')
+            for number, author in enumerate([self.author, popular] * 2)
+        ]
+        client = Client()
+        client.force_login(reader)
+        url = reverse('api:follow_posts')
+        data = client.get(url, {'limit': LIMIT}).json()
+        texts = [post['text'] for post in data['results']]
+        while data['next']:
+            data = client.get(
+                url, {'limit': LIMIT, 'cursor': data['next']}).json()
+            texts.extend(post['text'] for post in data['results'])
+        self.assertEqual(
+            texts, [post.text for post in reversed(self.posts + posts)])
+
+    def test_read_only(self):
+        response = self.client.post(reverse('api:post_list'))
+        self.assertEqual(response.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
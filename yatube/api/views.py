@@ -0,0 +1,217 @@
+from functools import wraps
+from http import HTTPStatus
+
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from posts.cache import (
+    AUTHORS_SCOPE, GROUPS_SCOPE, cache_versioned, post_author_scope,
+)
+from posts import shards
+from posts.feed import feed_posts
+from posts.models import Comment, Group, Post, User
+from posts.views import COUNT_POSTS
+from .paginators import (
+    CommentCursorPaginator, FeedValuesCursorPaginator, ValuesCursorPaginator,
+)
+
+MAX_LIMIT: int = 100  # больше записей на странице не отдаётся
+MAX_IDS: int = 100  # больше постов по списку id не отдаётся
+# поле ответа -> поле .values()
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+COMMENT_FIELDS = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+GROUP_FIELDS = {
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+}
+
+
+class ApiError(Exception):
+    """Ошибка запроса: отдаётся клиенту как {"detail": ...}."""
+
+    def __init__(self, detail, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(detail)
+        self.detail = detail
+        self.status = status
+
+
+def api_view(view):
+    """Только GET; ApiError превращается в JSON-ответ с ошибкой."""
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except ApiError as error:
+            return JsonResponse({'detail': error.detail}, status=error.status)
+    return wrapper
+
+
+def get_fields(request, available):
+    """Поля из ?fields=a,b; без параметра — все."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(available)
+    fields = [field for field in raw.split(',') if field]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}')
+    return fields
+
+
+def get_limit(request):
+    raw = request.GET.get('limit')
+    if raw is None:
+        return COUNT_POSTS
+    if not raw.isdigit() or not 0 < int(raw) <= MAX_LIMIT:
+        raise ApiError(f'limit должен быть от 1 до {MAX_LIMIT}')
+    return int(raw)
+
+
+def get_ids(request):
+    """Список id из ?ids=1,2,3 или None."""
+    raw = request.GET.get('ids')
+    if raw is None:
+        return None
+    parts = raw.split(',')
+    if not all(part.isdigit() for part in parts) or len(parts) > MAX_IDS:
+        raise ApiError(f'ids — не больше {MAX_IDS} чисел через запятую')
+    return [int(part) for part in parts]
+
+
+def serialize(rows, fields, lookups):
+    """Строки .values() в словари ответа без создания моделей."""
+    results = []
+    for row in rows:
+        item = {field: row[lookups[field]] for field in fields}
+        if 'image' in item:
+            item['image'] = (
+                default_storage.url(item['image']) if item['image'] else None
+            )
+        results.append(item)
+    return results
+
+
+def paginate(request, queryset, lookups, paginator_class, keys):
+    """Страница по курсору ?cursor=; keys нужны пагинатору для курсора."""
+    fields = get_fields(request, lookups)
+    values = {lookups[field] for field in fields}
+    rows = queryset.values(*shards.local_values(values | keys))
+    page = paginator_class(rows, get_limit(request)).get_cursor_page(
+        request.GET.get('cursor'))
+    return JsonResponse({
+        'results': serialize(
+            shards.fill_values(page, values), fields, lookups),
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    })
+
+
+def paginate_posts(request, queryset, paginator_class=ValuesCursorPaginator):
+    return paginate(
+        request, queryset, POST_FIELDS, paginator_class, {'id', 'pub_date'},
+    )
+
+
+def get_id_or_404(queryset, message):
+    pk = queryset.values_list('pk', flat=True).first()
+    if pk is None:
+        raise ApiError(message, HTTPStatus.NOT_FOUND)
+    return pk
+
+
+@api_view
+@cache_versioned('posts')
+def post_list(request):
+    """Лента постов или посты по списку ?ids= в порядке списка."""
+    ids = get_ids(request)
+    if ids is None:
+        return paginate_posts(request, shards.everywhere(Post.objects.all()))
+    fields = get_fields(request, POST_FIELDS)
+    values = {POST_FIELDS[field] for field in fields}
+    rows = shards.for_posts(Post.objects.filter(id__in=ids), ids).values(
+        *shards.local_values(values | {'id', 'pub_date'}))
+    by_id = {row['id']: row for row in shards.fill_values(rows, values)}
+    return JsonResponse({
+        'results': serialize(
+            [by_id[pk] for pk in ids if pk in by_id], fields, POST_FIELDS),
+    })
+
+
+@api_view
+@cache_versioned('post:{post_id}', post_author_scope, GROUPS_SCOPE)
+def post_detail(request, post_id):
+    fields = get_fields(request, POST_FIELDS)
+    values = {POST_FIELDS[field] for field in fields}
+    row = shards.for_post(Post.objects.filter(pk=post_id), post_id).values(
+        *shards.local_values(values)).first()
+    if row is None:
+        raise ApiError('Пост не найден', HTTPStatus.NOT_FOUND)
+    return JsonResponse(
+        serialize(shards.fill_values([row], values), fields, POST_FIELDS)[0])
+
+
+@api_view
+@cache_versioned('post:{post_id}', post_author_scope, AUTHORS_SCOPE)
+def comment_list(request, post_id):
+    get_id_or_404(
+        shards.for_post(Post.objects.filter(pk=post_id), post_id),
+        'Пост не найден')
+    return paginate(
+        request,
+        shards.for_post(Comment.objects.filter(post_id=post_id), post_id),
+        COMMENT_FIELDS, CommentCursorPaginator, {'id', 'created'},
+    )
+
+
+@api_view
+@cache_versioned('posts')
+def group_list(request):
+    fields = get_fields(request, GROUP_FIELDS)
+    rows = Group.objects.order_by('title').values(
+        *[GROUP_FIELDS[field] for field in fields])
+    return JsonResponse({
+        'results': serialize(rows, fields, GROUP_FIELDS),
+    })
+
+
+@api_view
+@cache_versioned('group:{slug}', AUTHORS_SCOPE)
+def group_posts(request, slug):
+    group_id = get_id_or_404(
+        Group.objects.filter(slug=slug), 'Группа не найдена')
+    return paginate_posts(
+        request, shards.everywhere(Post.objects.filter(group_id=group_id)))
+
+
+@api_view
+@cache_versioned('profile:{username}', GROUPS_SCOPE)
+def profile_posts(request, username):
+    author_id = get_id_or_404(
+        User.objects.filter(username=username), 'Автор не найден')
+    return paginate_posts(request, shards.for_author(
+        Post.objects.filter(author_id=author_id), author_id))
+
+
+@api_view
+def follow_posts(request):
+    """Лента подписок пользователя, вошедшего через сессию."""
+    if not request.user.is_authenticated:
+        raise ApiError('Нужно войти', HTTPStatus.UNAUTHORIZED)
+    return paginate_posts(
+        request, feed_posts(request.user), FeedValuesCursorPaginator)
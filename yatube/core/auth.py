@@ -0,0 +1,98 @@
+import time
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import SESSION_KEY, get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+USER_VERSION_KEY: str = 'user-version:{}'  # меняется при сохранении User
+SNAPSHOT_KEY: str = '_user_snapshot'  # снимок пользователя в сессии
+# поля снимка: остальные, в том числе пароль, грузятся при обращении
+SNAPSHOT_FIELDS = (
+    'id', 'username', 'first_name', 'last_name', 'email',
+    'is_active', 'is_staff', 'is_superuser',
+)
+
+
+def user_version(user_id):
+    """Версия пользователя; заводится от текущего времени, как версии
+    областей кеша, чтобы после вытеснения не совпасть со старой."""
+    key = USER_VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_user(user_id):
+    """Устаревает снимки пользователя во всех сессиях."""
+    key = USER_VERSION_KEY.format(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def make_snapshot(user, version):
+    return {
+        'version': version,
+        'checked': time.time(),
+        'fields': {name: getattr(user, name) for name in SNAPSHOT_FIELDS},
+    }
+
+
+def is_fresh(snapshot, version):
+    """Снимок той же версии пользователя и проверен по базе не раньше
+    USER_SNAPSHOT_MAX_AGE секунд назад."""
+    return (
+        snapshot is not None
+        and snapshot['version'] == version
+        and time.time() - snapshot.get('checked', 0)
+        < settings.USER_SNAPSHOT_MAX_AGE
+    )
+
+
+def from_snapshot(snapshot):
+    """Пользователь из снимка: остальные поля отложены, и save()
+    обновит только поля снимка."""
+    model = get_user_model()
+    fields = snapshot['fields']
+    # from_db ждёт значения в порядке полей модели
+    names = [
+        field.attname for field in model._meta.concrete_fields
+        if field.attname in fields
+    ]
+    return model.from_db(
+        DEFAULT_DB_ALIAS, names, [fields[name] for name in names])
+
+
+def remember_user(request, user):
+    """Кладёт в сессию снимок пользователя, только что вошедшего."""
+    request.session[SNAPSHOT_KEY] = make_snapshot(user, user_version(user.pk))
+
+
+def get_user(request):
+    """request.user без запросов к базе, пока снимок в сессии свежий.
+
+    Снимок сверяется с версией пользователя в кеше: после смены пароля
+    или данных пользователь читается из базы заново, и Django проверяет
+    хеш сессии и is_active, как обычно. Изменения мимо сигналов
+    (update(), SQL) версию не меняют, поэтому снимок старше
+    USER_SNAPSHOT_MAX_AGE секунд тоже проверяется заново. При выходе
+    снимок удаляется вместе с сессией.
+    """
+    session = request.session
+    user_id = session.get(SESSION_KEY)
+    if user_id is None:
+        return AnonymousUser()
+    version = user_version(user_id)
+    snapshot = session.get(SNAPSHOT_KEY)
+    if is_fresh(snapshot, version):
+        return from_snapshot(snapshot)
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        session[SNAPSHOT_KEY] = make_snapshot(user, version)
+    return user
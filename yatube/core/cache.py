@@ -0,0 +1,271 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+MAGIC: bytes = b'YTMMAP01'
+# заголовок файла: магия, число наборов, слотов в наборе, размер слота
+FILE_HEADER = struct.Struct('<8sIII')
+# заголовок слота: хеш ключа, срок, последнее чтение, длины ключа и
+# значения, флаги
+SLOT_HEADER = struct.Struct('<QddHIBx')
+ACCESSED = struct.Struct('<d')
+ACCESSED_OFFSET: int = 16  # смещение времени чтения в заголовке слота
+EXPIRES = struct.Struct('<d')
+EXPIRES_OFFSET: int = 8  # смещение срока в заголовке слота
+FLAG_ZLIB: int = 1
+LOCK_STRIPES: int = 64  # блокировки потоков внутри процесса
+DEFAULT_SLOTS: int = 2048
+DEFAULT_SLOT_SIZE: int = 32 * 1024
+DEFAULT_WAYS: int = 8
+
+
+class MmapCache(BaseCache):
+    """Кеш в файле, отображённом в память, общий для процессов сервера.
+
+    Файл — хеш-таблица фиксированного размера: ключ попадает в один
+    набор из WAYS слотов по SLOT_SIZE байт, при нехватке места
+    вытесняется давнее всех читавшийся слот набора. Набор блокируется
+    fcntl-блокировкой своего диапазона байт, поэтому incr атомарен и
+    между процессами. Значение, не влезающее в слот, сжимается zlib,
+    а не влезающее и после сжатия не кешируется.
+
+    OPTIONS: SLOTS, SLOT_SIZE и WAYS; MAX_ENTRIES не используется.
+    После смены размеров файл размечается заново, и все процессы
+    со старыми размерами нужно перезапустить.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+    _open_lock = threading.Lock()
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._ways = int(options.get('WAYS', DEFAULT_WAYS))
+        slots = int(options.get('SLOTS', DEFAULT_SLOTS))
+        self._sets = max(slots // self._ways, 1)
+        self._slot_size = int(options.get('SLOT_SIZE', DEFAULT_SLOT_SIZE))
+        self._set_size = self._ways * self._slot_size
+        self._pid = None
+
+    def _open(self):
+        """Отображает файл в память; после fork — заново."""
+        if self._pid == os.getpid():
+            return self._map
+        with self._open_lock:
+            if self._pid != os.getpid():
+                self._map_file()
+        return self._map
+
+    def _map_file(self):
+        header = FILE_HEADER.pack(
+            MAGIC, self._sets, self._ways, self._slot_size)
+        size = FILE_HEADER.size + self._sets * self._set_size
+        fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(fd, fcntl.LOCK_EX)
+        try:
+            fresh = os.pread(fd, FILE_HEADER.size, 0) != header
+            if os.fstat(fd).st_size < size:
+                # файл только растёт: уменьшение уронило бы SIGBUS
+                # процессы, которые ещё держат старое отображение
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+            if fresh:
+                for offset in self._offsets(range(self._sets)):
+                    self._free(self._map, offset)
+                self._map[:FILE_HEADER.size] = header
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+        self._fd = fd
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._pid = os.getpid()
+
+    def _offsets(self, indexes):
+        for index in indexes:
+            start = FILE_HEADER.size + index * self._set_size
+            yield from range(start, start + self._set_size, self._slot_size)
+
+    @contextmanager
+    def _locked(self, index):
+        start = FILE_HEADER.size + index * self._set_size
+        with self._locks[index % LOCK_STRIPES]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, self._set_size, start)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, self._set_size, start)
+
+    def _prepare(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        raw = key.encode()
+        digest = hashlib.blake2b(raw, digest_size=8).digest()
+        hashed = int.from_bytes(digest, 'little') or 1
+        return raw, hashed, hashed % self._sets
+
+    def _expires(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return math.inf if expires is None else expires
+
+    def _capacity(self, raw):
+        return self._slot_size - SLOT_HEADER.size - len(raw)
+
+    def _encode(self, value, raw):
+        """Значение и флаги; сжимается, только если не влезает в слот."""
+        data = pickle.dumps(value, self.pickle_protocol)
+        if len(data) > self._capacity(raw):
+            return zlib.compress(data, 1), FLAG_ZLIB
+        return data, 0
+
+    def _decode(self, data, flags):
+        if flags & FLAG_ZLIB:
+            data = zlib.decompress(data)
+        return pickle.loads(data)
+
+    def _free(self, mm, offset):
+        SLOT_HEADER.pack_into(mm, offset, 0, 0, 0, 0, 0, 0)
+
+    def _find(self, mm, index, hashed, raw, now):
+        """Слот живого ключа в наборе; просроченный слот освобождается."""
+        for offset in self._offsets([index]):
+            stored, expires, _, key_len, _, _ = SLOT_HEADER.unpack_from(
+                mm, offset)
+            if stored != hashed:
+                continue
+            start = offset + SLOT_HEADER.size
+            if mm[start:start + key_len] != raw:
+                continue
+            if expires <= now:
+                self._free(mm, offset)
+                return None
+            return offset
+        return None
+
+    def _victim(self, mm, index, now):
+        """Свободный или просроченный слот, иначе давнее всех читавшийся."""
+        victim = oldest = None
+        for offset in self._offsets([index]):
+            stored, expires, accessed, *_ = SLOT_HEADER.unpack_from(
+                mm, offset)
+            if not stored or expires <= now:
+                return offset
+            if victim is None or accessed < oldest:
+                victim, oldest = offset, accessed
+        return victim
+
+    def _read(self, mm, offset, now):
+        _, _, _, key_len, value_len, flags = SLOT_HEADER.unpack_from(
+            mm, offset)
+        ACCESSED.pack_into(mm, offset + ACCESSED_OFFSET, now)
+        start = offset + SLOT_HEADER.size + key_len
+        return mm[start:start + value_len], flags
+
+    def _write(self, mm, offset, hashed, raw, payload, flags, expires, now):
+        SLOT_HEADER.pack_into(
+            mm, offset, hashed, expires, now, len(raw), len(payload), flags)
+        start = offset + SLOT_HEADER.size
+        mm[start:start + len(raw)] = raw
+        start += len(raw)
+        mm[start:start + len(payload)] = payload
+
+    def _store(self, mm, index, hashed, raw, encoded, expires, offset=None):
+        payload, flags = encoded
+        now = time.time()
+        if offset is None:
+            offset = self._find(mm, index, hashed, raw, now)
+        if len(payload) > self._capacity(raw):
+            # старое значение устарело, а новое не влезает в слот
+            if offset is not None:
+                self._free(mm, offset)
+            return False
+        if offset is None:
+            offset = self._victim(mm, index, now)
+        self._write(mm, offset, hashed, raw, payload, flags, expires, now)
+        return True
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        raw, hashed, index = self._prepare(key, version)
+        encoded = self._encode(value, raw)
+        mm = self._open()
+        with self._locked(index):
+            if self._find(mm, index, hashed, raw, time.time()) is not None:
+                return False
+            return self._store(
+                mm, index, hashed, raw, encoded, self._expires(timeout))
+
+    def get(self, key, default=None, version=None):
+        raw, hashed, index = self._prepare(key, version)
+        mm = self._open()
+        now = time.time()
+        with self._locked(index):
+            offset = self._find(mm, index, hashed, raw, now)
+            if offset is None:
+                return default
+            data, flags = self._read(mm, offset, now)
+        return self._decode(data, flags)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        raw, hashed, index = self._prepare(key, version)
+        encoded = self._encode(value, raw)
+        mm = self._open()
+        with self._locked(index):
+            self._store(
+                mm, index, hashed, raw, encoded, self._expires(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        raw, hashed, index = self._prepare(key, version)
+        mm = self._open()
+        with self._locked(index):
+            offset = self._find(mm, index, hashed, raw, time.time())
+            if offset is None:
+                return False
+            EXPIRES.pack_into(
+                mm, offset + EXPIRES_OFFSET, self._expires(timeout))
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        raw, hashed, index = self._prepare(key, version)
+        mm = self._open()
+        now = time.time()
+        with self._locked(index):
+            offset = self._find(mm, index, hashed, raw, now)
+            if offset is None:
+                raise ValueError("Key '%s' not found" % raw.decode())
+            data, flags = self._read(mm, offset, now)
+            value = self._decode(data, flags) + delta
+            expires = EXPIRES.unpack_from(mm, offset + EXPIRES_OFFSET)[0]
+            self._store(
+                mm, index, hashed, raw, self._encode(value, raw), expires,
+                offset)
+        return value
+
+    def has_key(self, key, version=None):
+        raw, hashed, index = self._prepare(key, version)
+        mm = self._open()
+        with self._locked(index):
+            return self._find(mm, index, hashed, raw, time.time()) is not None
+
+    def delete(self, key, version=None):
+        raw, hashed, index = self._prepare(key, version)
+        mm = self._open()
+        with self._locked(index):
+            offset = self._find(mm, index, hashed, raw, time.time())
+            if offset is not None:
+                self._free(mm, offset)
+
+    def clear(self):
+        mm = self._open()
+        for index in range(self._sets):
+            with self._locked(index):
+                for offset in self._offsets([index]):
+                    self._free(mm, offset)
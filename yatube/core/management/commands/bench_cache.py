@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'filebased': 'django.core.cache.backends.filebased.FileBasedCache',
+    'mmap': 'core.cache.MmapCache',
+}
+KEYS: int = 500  # число разных ключей, как у страниц лент
+COUNTER_KEY: str = 'bench-counter'
+
+
+def create_cache(name, location):
+    params = {'TIMEOUT': None, 'OPTIONS': {'MAX_ENTRIES': KEYS * 2}}
+    return import_string(BACKENDS[name])(location, params)
+
+
+def run_worker(name, location, ops, value):
+    """Работа одного процесса: чтение с досозданием и incr счётчика."""
+    cache = create_cache(name, location)
+    rng = random.Random(os.getpid())
+    hits = 0
+    for _ in range(ops):
+        key = f'bench-{rng.randrange(KEYS)}'
+        if cache.get(key) is None:
+            cache.set(key, value)
+        else:
+            hits += 1
+        try:
+            cache.incr(COUNTER_KEY)
+        except ValueError:
+            cache.add(COUNTER_KEY, 0)
+            cache.incr(COUNTER_KEY)
+    return hits
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает кеши locmem, filebased и mmap: скорость операций '
+        'в одном процессе, долю попаданий и точность incr в нескольких.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ops', type=int, default=20000,
+            help='Сколько операций каждого вида выполнить',
+        )
+        parser.add_argument(
+            '--processes', type=int, default=4,
+            help='Сколько процессов работают с кешем одновременно',
+        )
+        parser.add_argument(
+            '--value-size', type=int, default=16 * 1024,
+            help='Размер значения в байтах, как у страницы ленты',
+        )
+        parser.add_argument(
+            '--backend', action='append', choices=list(BACKENDS),
+            help='Какие кеши сравнивать, по умолчанию все',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        # похоже на HTML: сжимается, но не до нуля
+        words = [f'слово{number}' for number in range(200)]
+        value = ' '.join(
+            rng.choice(words) for _ in range(options['value_size'] // 8)
+        ).encode()[:options['value_size']]
+        for name in options['backend'] or BACKENDS:
+            with tempfile.TemporaryDirectory() as directory:
+                location = (
+                    name if name == 'locmem'
+                    else os.path.join(directory, 'cache')
+                )
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                self.single_process(name, location, options['ops'], value)
+                self.many_processes(
+                    name, location, options['ops'], options['processes'],
+                    value)
+
+    def timed(self, title, ops, operation):
+        started = time.perf_counter()
+        for number in range(ops):
+            operation(f'bench-{number % KEYS}')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{title}: {ops / elapsed:,.0f} оп/с, '
+            f'{elapsed / ops * 1e6:.1f} мкс на операцию')
+
+    def single_process(self, name, location, ops, value):
+        cache = create_cache(name, location)
+        cache.set(COUNTER_KEY, 0)
+        self.timed('set', ops, lambda key: cache.set(key, value))
+        self.timed('get', ops, cache.get)
+        self.timed('incr', ops, lambda key: cache.incr(COUNTER_KEY))
+        cache.clear()
+
+    def many_processes(self, name, location, ops, processes, value):
+        context = multiprocessing.get_context('fork')
+        started = time.perf_counter()
+        with context.Pool(processes) as pool:
+            hits = pool.starmap(
+                run_worker, [(name, location, ops, value)] * processes)
+        elapsed = time.perf_counter() - started
+        total = ops * processes
+        counter = create_cache(name, location).get(COUNTER_KEY) or 0
+        self.stdout.write(
+            f'процессов {processes}: {total / elapsed:,.0f} чтений/с, '
+            f'попаданий {sum(hits) / total:.1%}, '
+            f'incr в общем счётчике {counter} из {total}')
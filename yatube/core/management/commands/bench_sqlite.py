@@ -0,0 +1,212 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.sqlite import apply_pragmas, is_locked, retry_locked
+
+POSTS: int = 100  # постов, которые комментируют писатели
+DEFAULT_TIMEOUT: float = 5  # ожидание блокировки у sqlite3 по умолчанию
+SCHEMA = (
+    'CREATE TABLE post ('
+    'id INTEGER PRIMARY KEY, comments INTEGER NOT NULL DEFAULT 0)',
+    'CREATE TABLE comment ('
+    'id INTEGER PRIMARY KEY, post_id INTEGER NOT NULL, text TEXT NOT NULL)',
+    'CREATE INDEX comment_post ON comment (post_id, id)',
+)
+
+
+def connect(path, tuned):
+    """Соединение как у Django: автокоммит и явные BEGIN."""
+    connection = sqlite3.connect(
+        path, timeout=DEFAULT_TIMEOUT, isolation_level=None,
+        check_same_thread=False,
+    )
+    if tuned:
+        apply_pragmas(connection, settings.SQLITE_PRAGMAS)
+    return connection
+
+
+def add_comment(connection, rng):
+    """Транзакция как у add_comment: чтение поста, вставка, счётчик."""
+    post_id = rng.randrange(POSTS) + 1
+    connection.execute('BEGIN')
+    try:
+        connection.execute(
+            'SELECT comments FROM post WHERE id = ?', (post_id,)).fetchone()
+        connection.execute(
+            'INSERT INTO comment (post_id, text) VALUES (?, ?)',
+            (post_id, 'комментарий ' * rng.randrange(1, 20)))
+        connection.execute(
+            'UPDATE post SET comments = comments + 1 WHERE id = ?',
+            (post_id,))
+        connection.execute('COMMIT')
+    except BaseException:
+        if connection.in_transaction:
+            connection.execute('ROLLBACK')
+        raise
+
+
+def read_comments(connection, rng):
+    """Чтение как у страницы поста: счётчик и последние комментарии."""
+    post_id = rng.randrange(POSTS) + 1
+    connection.execute(
+        'SELECT comments FROM post WHERE id = ?', (post_id,)).fetchone()
+    connection.execute(
+        'SELECT id, text FROM comment WHERE post_id = ? '
+        'ORDER BY id DESC LIMIT 20', (post_id,)).fetchall()
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.write_errors = 0
+        self.retries = 0
+        self.reads = []
+        self.read_errors = 0
+
+    def add(self, **values):
+        with self.lock:
+            for name, value in values.items():
+                if name == 'reads':
+                    self.reads.extend(value)
+                else:
+                    setattr(self, name, getattr(self, name) + value)
+
+
+def writer(path, tuned, deadline, seed, stats):
+    """Писатель: по умолчанию соединение на каждый запрос и без повторов,
+    в настроенном профиле — одно соединение потока и retry_locked."""
+    rng = random.Random(seed)
+    connection = connect(path, tuned) if tuned else None
+    writes = errors = retries = 0
+    while time.monotonic() < deadline:
+        attempts = []
+
+        def attempt():
+            attempts.append(1)
+            add_comment(connection, rng)
+        try:
+            if tuned:
+                retry_locked(attempt)
+            else:
+                connection = connect(path, tuned)
+                try:
+                    attempt()
+                finally:
+                    connection.close()
+            writes += 1
+        except sqlite3.OperationalError as error:
+            if not is_locked(error):
+                raise
+            errors += 1
+        retries += len(attempts) - 1
+    if tuned:
+        connection.close()
+    stats.add(writes=writes, write_errors=errors, retries=retries)
+
+
+def reader(path, tuned, deadline, seed, stats):
+    rng = random.Random(seed)
+    connection = connect(path, tuned) if tuned else None
+    latencies = []
+    errors = 0
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            if tuned:
+                read_comments(connection, rng)
+            else:
+                connection = connect(path, tuned)
+                try:
+                    read_comments(connection, rng)
+                finally:
+                    connection.close()
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError as error:
+            if not is_locked(error):
+                raise
+            errors += 1
+    if tuned:
+        connection.close()
+    stats.add(reads=latencies, read_errors=errors)
+
+
+def percentile(values, share):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает SQLite по умолчанию (журнал отката, соединение на '
+        'запрос) с профилем SQLITE_PRAGMAS (WAL, постоянные соединения, '
+        'повтор занятых транзакций) под одновременными записями '
+        'комментариев и чтениями.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--writers', type=int, default=8,
+            help='Сколько потоков пишут комментарии',
+        )
+        parser.add_argument(
+            '--readers', type=int, default=8,
+            help='Сколько потоков читают страницу поста',
+        )
+        parser.add_argument(
+            '--duration', type=float, default=5,
+            help='Сколько секунд длится замер каждого профиля',
+        )
+
+    def handle(self, *args, **options):
+        for title, tuned in (('по умолчанию', False), ('WAL', True)):
+            with tempfile.TemporaryDirectory() as directory:
+                stats = self.run(
+                    os.path.join(directory, 'bench.sqlite3'), tuned, options)
+            self.report(title, stats, options['duration'])
+
+    def run(self, path, tuned, options):
+        connection = connect(path, tuned)
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.executemany(
+            'INSERT INTO post (id) VALUES (?)',
+            [(number + 1,) for number in range(POSTS)])
+        connection.close()
+        stats = Stats()
+        deadline = time.monotonic() + options['duration']
+        threads = [
+            threading.Thread(
+                target=writer, args=(path, tuned, deadline, number, stats))
+            for number in range(options['writers'])
+        ] + [
+            threading.Thread(
+                target=reader, args=(path, tuned, deadline, -number, stats))
+            for number in range(1, options['readers'] + 1)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return stats
+
+    def report(self, title, stats, duration):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        self.stdout.write(
+            f'записи: {stats.writes / duration:,.0f}/с, '
+            f'ошибок «database is locked» {stats.write_errors}, '
+            f'повторов {stats.retries}')
+        self.stdout.write(
+            f'чтения: {len(stats.reads) / duration:,.0f}/с, '
+            f'p50 {percentile(stats.reads, 0.5) * 1000:.2f} мс, '
+            f'p99 {percentile(stats.reads, 0.99) * 1000:.2f} мс, '
+            f'ошибок {stats.read_errors}')
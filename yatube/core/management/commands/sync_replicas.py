@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.replicas import PRIMARY, sync
+
+SQLITE_ENGINE: str = 'django.db.backends.sqlite3'
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную базу SQLite в реплики DATABASE_REPLICAS через '
+        'backup API: один раз или раз в --interval секунд.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=1,
+            help='Пауза между копированиями, секунд',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Скопировать один раз и выйти',
+        )
+
+    def handle(self, *args, **options):
+        aliases = settings.DATABASE_REPLICAS
+        for alias in [PRIMARY, *aliases]:
+            if settings.DATABASES[alias]['ENGINE'] != SQLITE_ENGINE:
+                raise CommandError(
+                    f'База {alias} не SQLite: реплики других баз '
+                    f'настраиваются средствами самой базы')
+        while True:
+            for alias in aliases:
+                started = time.perf_counter()
+                sync(alias)
+                if options['verbosity'] > 1:
+                    self.stdout.write(
+                        f'{alias}: {time.perf_counter() - started:.3f} с')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
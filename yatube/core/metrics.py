@@ -0,0 +1,225 @@
+import math
+import mmap
+import os
+import struct
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+# заголовок файла: сколько байт занято записями
+USED = struct.Struct('<Q')
+# запись: длина ключа, ключ с выравниванием до 8 байт, значение
+KEY_LENGTH = struct.Struct('<I')
+VALUE = struct.Struct('<d')
+INITIAL_SIZE: int = 64 * 1024
+FILE_SUFFIX: str = '.metrics'
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, math.inf,
+)
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, math.inf,
+)
+# имя, тип и описание метрик в порядке вывода
+FAMILIES = (
+    ('yatube_requests_total', 'counter', 'Обработано запросов'),
+    ('yatube_request_duration_seconds', 'histogram',
+     'Время обработки запроса'),
+    ('yatube_response_size_bytes', 'histogram', 'Размер тела ответа'),
+    ('yatube_db_queries_total', 'counter', 'SQL-запросов'),
+    ('yatube_db_query_seconds_total', 'counter', 'Время SQL-запросов'),
+    ('yatube_cache_hits_total', 'counter', 'Попаданий в кеш'),
+    ('yatube_cache_misses_total', 'counter', 'Промахов кеша'),
+    ('yatube_cache_hit_ratio', 'gauge',
+     'Доля попаданий в кеш за всё время работы'),
+)
+
+
+class MetricsFile:
+    """Значения метрик одного процесса в файле, отображённом в память.
+
+    Пишет в файл только его процесс, поэтому межпроцессных блокировок
+    нет: запись дописывается целиком и лишь затем учитывается в
+    заголовке, а значение обновляется одной 8-байтной записью.
+    Читатели складывают файлы всех процессов каталога.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file = open(path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size < INITIAL_SIZE:
+            self.file.truncate(INITIAL_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.offsets = {}
+        self.used = USED.size
+        for key, offset, _ in read_entries(self.map):
+            self.offsets[key] = offset
+            self.used = offset + VALUE.size
+        self.values = {
+            key: VALUE.unpack_from(self.map, offset)[0]
+            for key, offset in self.offsets.items()
+        }
+
+    def inc(self, key, amount=1):
+        with self.lock:
+            if key not in self.offsets:
+                self.append(key)
+            value = self.values[key] + amount
+            self.values[key] = value
+            VALUE.pack_into(self.map, self.offsets[key], value)
+
+    def append(self, key):
+        encoded = key.encode()
+        padded = len(encoded) + (-(KEY_LENGTH.size + len(encoded)) % 8)
+        size = KEY_LENGTH.size + padded + VALUE.size
+        if self.used + size > len(self.map):
+            self.grow(self.used + size)
+        offset = self.used
+        KEY_LENGTH.pack_into(self.map, offset, len(encoded))
+        start = offset + KEY_LENGTH.size
+        self.map[start:start + len(encoded)] = encoded
+        value_offset = start + padded
+        VALUE.pack_into(self.map, value_offset, 0.0)
+        self.used += size
+        USED.pack_into(self.map, 0, self.used)
+        self.offsets[key] = value_offset
+        self.values[key] = 0.0
+
+    def grow(self, needed):
+        size = len(self.map)
+        while size < needed:
+            size *= 2
+        self.map.close()
+        self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+
+
+def read_entries(data):
+    """(ключ, смещение значения, значение) записей файла метрик."""
+    used = USED.unpack_from(data, 0)[0] if len(data) >= USED.size else 0
+    offset = USED.size
+    while offset < used:
+        length = KEY_LENGTH.unpack_from(data, offset)[0]
+        start = offset + KEY_LENGTH.size
+        key = bytes(data[start:start + length]).decode()
+        value_offset = start + length + (-(KEY_LENGTH.size + length) % 8)
+        yield key, value_offset, VALUE.unpack_from(data, value_offset)[0]
+        offset = value_offset + VALUE.size
+
+
+_files = {}
+_files_lock = threading.Lock()
+
+
+def get_file():
+    """Файл метрик текущего процесса; после fork открывается свой."""
+    directory = settings.METRICS_DIR
+    key = (directory, os.getpid())
+    if key not in _files:
+        with _files_lock:
+            if key not in _files:
+                os.makedirs(directory, exist_ok=True)
+                _files[key] = MetricsFile(os.path.join(
+                    directory, f'{os.getpid()}{FILE_SUFFIX}'))
+    return _files[key]
+
+
+def escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def sample(name, **labels):
+    """Ключ значения: имя метрики с метками в формате Prometheus."""
+    if not labels:
+        return name
+    pairs = ','.join(
+        f'{label}="{escape(value)}"' for label, value in labels.items())
+    return f'{name}{{{pairs}}}'
+
+
+def format_bound(bound):
+    return '+Inf' if bound == math.inf else repr(float(bound))
+
+
+def observe(metrics, name, buckets, value, **labels):
+    """Наблюдение гистограммы: корзины накопительные, как в выводе."""
+    for bound in buckets:
+        # нулевые корзины создаются сразу, чтобы в файле они шли по порядку
+        metrics.inc(
+            sample(f'{name}_bucket', **labels, le=format_bound(bound)),
+            1 if value <= bound else 0)
+    metrics.inc(sample(f'{name}_sum', **labels), value)
+    metrics.inc(sample(f'{name}_count', **labels))
+
+
+def record(request, response, data):
+    """Учитывает запрос по замерам ServerTimingMiddleware."""
+    if not settings.METRICS_DIR:
+        return
+    metrics = get_file()
+    view = data['view']
+    metrics.inc(sample(
+        'yatube_requests_total', view=view, method=request.method,
+        status=response.status_code))
+    observe(metrics, 'yatube_request_duration_seconds', DURATION_BUCKETS,
+            data['total_ms'] / 1000, view=view)
+    if not response.streaming:
+        observe(metrics, 'yatube_response_size_bytes', SIZE_BUCKETS,
+                len(response.content), view=view)
+    metrics.inc(sample('yatube_db_queries_total', view=view), data['queries'])
+    metrics.inc(
+        sample('yatube_db_query_seconds_total', view=view),
+        data['sql_ms'] / 1000)
+    metrics.inc(
+        sample('yatube_cache_hits_total', view=view), data['cache_hits'])
+    metrics.inc(
+        sample('yatube_cache_misses_total', view=view), data['cache_misses'])
+
+
+def collect(directory):
+    """Суммы значений по файлам всех процессов, в порядке появления."""
+    totals = defaultdict(float)
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(FILE_SUFFIX):
+            continue
+        with open(os.path.join(directory, name), 'rb') as file:
+            data = file.read()
+        for key, _, value in read_entries(data):
+            totals[key] += value
+    return totals
+
+
+def hit_ratios(totals):
+    hits = 'yatube_cache_hits_total'
+    ratios = {}
+    for key, value in totals.items():
+        if not key.startswith(hits + '{'):
+            continue
+        labels = key[len(hits):]
+        misses = totals.get(f'yatube_cache_misses_total{labels}', 0)
+        if value + misses:
+            ratios[f'yatube_cache_hit_ratio{labels}'] = (
+                value / (value + misses))
+    return ratios
+
+
+def render(directory):
+    """Метрики всех процессов в текстовом формате Prometheus."""
+    totals = collect(directory) if os.path.isdir(directory) else {}
+    totals.update(hit_ratios(totals))
+    families = defaultdict(list)
+    for key, value in totals.items():
+        name = key.split('{', 1)[0]
+        for suffix in ('_bucket', '_sum', '_count'):
+            if name.endswith(suffix):
+                name = name[:-len(suffix)]
+                break
+        families[name].append(f'{key} {value!r}')
+    lines = []
+    for name, kind, description in FAMILIES:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(families.get(name, ()))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,214 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import caches
+from django.db import connections
+from django.template.backends.django import Template
+from django.utils.functional import SimpleLazyObject
+
+from . import auth, metrics, replicas
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class Timings:
+    """Замеры одного запроса; сам же служит обёрткой SQL-запросов."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.queries = 0
+        self.sql = 0.0
+        self.templates = 0.0
+        self.cache = 0.0
+        self.hits = 0
+        self.misses = 0
+        # виды замеров, внутри которых сейчас идёт вызов: get_many
+        # вызывает get, а шаблон вкладывает другие шаблоны
+        self.active = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql += time.perf_counter() - started
+
+    def as_dict(self, view):
+        now = time.perf_counter()
+        view_time = now - self.view_started if self.view_started else 0
+        return {
+            'view': view,
+            'total_ms': round((now - self.started) * 1000, 2),
+            'view_ms': round(view_time * 1000, 2),
+            'sql_ms': round(self.sql * 1000, 2),
+            'queries': self.queries,
+            'template_ms': round(self.templates * 1000, 2),
+            'cache_ms': round(self.cache * 1000, 2),
+            'cache_hits': self.hits,
+            'cache_misses': self.misses,
+        }
+
+
+def server_timing(data):
+    """Значение заголовка Server-Timing по замерам запроса."""
+    return ', '.join((
+        f'db;desc="{data["queries"]} queries";dur={data["sql_ms"]}',
+        f'tpl;dur={data["template_ms"]}',
+        f'cache;desc="{data["cache_hits"]} hits, {data["cache_misses"]} '
+        f'misses";dur={data["cache_ms"]}',
+        f'view;desc="{data["view"]}";dur={data["view_ms"]}',
+        f'total;dur={data["total_ms"]}',
+    ))
+
+
+def instrument(cls, name, kind, record):
+    """Оборачивает метод класса: record(timings, result, args, kwargs)
+    получает результат, время вызова копится в атрибуте kind."""
+    original = getattr(cls, name)
+    if getattr(original, 'instrumented', False):
+        return
+
+    @wraps(original)
+    def wrapper(self, *args, **kwargs):
+        timings = getattr(_local, 'timings', None)
+        if timings is None or kind in timings.active:
+            return original(self, *args, **kwargs)
+        timings.active.add(kind)
+        started = time.perf_counter()
+        try:
+            result = original(self, *args, **kwargs)
+        finally:
+            timings.active.discard(kind)
+            setattr(timings, kind, getattr(timings, kind)
+                    + time.perf_counter() - started)
+        record(timings, result, args, kwargs)
+        return result
+
+    wrapper.instrumented = True
+    setattr(cls, name, wrapper)
+
+
+def record_get(timings, result, args, kwargs):
+    default = args[1] if len(args) > 1 else kwargs.get('default')
+    if result is default:
+        timings.misses += 1
+    else:
+        timings.hits += 1
+
+
+def record_get_many(timings, result, args, kwargs):
+    timings.hits += len(result)
+    timings.misses += len(args[0]) - len(result)
+
+
+def install():
+    """Подключает замеры шаблонов и кешей всех настроенных бэкендов."""
+    instrument(Template, 'render', 'templates', lambda *args: None)
+    for alias in settings.CACHES:
+        backend = type(caches[alias])
+        instrument(backend, 'get', 'cache', record_get)
+        instrument(backend, 'get_many', 'cache', record_get_many)
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else ''
+
+
+class ServerTimingMiddleware:
+    """Время SQL, шаблонов, кеша и представления в заголовке Server-Timing,
+    в строке лога и в метриках /metrics; доля запросов профилируется
+    cProfile."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        timings = _local.timings = Timings()
+        profiler = None
+        if random.random() < settings.SERVER_TIMING_PROFILE_RATE:
+            profiler = cProfile.Profile()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                if profiler is not None:
+                    profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            _local.timings = None
+        view = get_view_name(request)
+        data = timings.as_dict(view)
+        response['Server-Timing'] = server_timing(data)
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            **data,
+        }))
+        metrics.record(request, response, data)
+        if profiler is not None:
+            self.dump(profiler, view)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _local.timings.view_started = time.perf_counter()
+
+    def dump(self, profiler, view):
+        directory = settings.SERVER_TIMING_PROFILE_DIR
+        os.makedirs(directory, exist_ok=True)
+        name = view.replace(':', '-') or 'unresolved'
+        profiler.dump_stats(os.path.join(
+            directory, f'{name}-{time.time_ns()}-{os.getpid()}.prof'))
+
+
+class ReplicaMiddleware:
+    """Направляет чтения GET и HEAD в реплики; после записи посетитель
+    на REPLICA_STICKY_SECONDS читает основную базу и видит свои изменения.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        pinned = settings.REPLICA_PIN_COOKIE in request.COOKIES
+        replicas.start_request(
+            request.method in ('GET', 'HEAD') and not pinned)
+        try:
+            with connections[replicas.PRIMARY].execute_wrapper(
+                    replicas.track_writes):
+                response = self.get_response(request)
+        finally:
+            wrote = replicas.finish_request()
+        if wrote:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS, httponly=True,
+            )
+        return response
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """request.user из снимка в сессии (core.auth.get_user), без
+    запроса пользователя к базе на каждой странице."""
+
+    def process_request(self, request):
+        request.user = SimpleLazyObject(lambda: auth.get_user(request))
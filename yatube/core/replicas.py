@@ -0,0 +1,154 @@
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+PRIMARY: str = DEFAULT_DB_ALIAS
+WRITES_KEY: str = 'db-writes'  # счётчик изменений, видимых страницам
+REPLICA_KEY: str = 'replica:{}'  # (счётчик изменений, время копии)
+# всегда из основной базы: вышедший пользователь не должен «войти»
+# обратно по старой копии сессии
+PRIMARY_APPS = frozenset({'sessions'})
+# запросы, которые меняют данные основной базы
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_state = threading.local()
+
+
+def record_write():
+    """Отмечает изменение данных, от которого зависят страницы кеша.
+
+    Счётчик стартует от текущего времени, как версии областей, чтобы
+    после вытеснения из кеша не оказаться меньше, чем у реплики.
+    """
+    try:
+        cache.incr(WRITES_KEY)
+    except ValueError:
+        cache.add(WRITES_KEY, int(time.time() * 1000), None)
+
+
+def start_request(read_only):
+    """Начало запроса: чтение пойдёт в реплику, если её можно читать."""
+    replicas = settings.DATABASE_REPLICAS
+    _state.candidate = random.choice(replicas) if (
+        read_only and replicas) else None
+    _state.alias = None
+    _state.wrote = False
+
+
+def finish_request():
+    """Конец запроса; True, если в нём были записи в базу."""
+    wrote = getattr(_state, 'wrote', False)
+    _state.candidate = None
+    _state.alias = None
+    _state.wrote = False
+    return wrote
+
+
+def track_writes(execute, sql, params, many, context):
+    """Обёртка запросов основной базы: отмечает, что запрос что-то
+    записал.
+
+    Выбор базы для записи ещё не запись: get_or_create и чтения через
+    db_for_write только читают, и посетитель из-за них не должен
+    переходить на основную базу.
+    """
+    result = execute(sql, params, many, context)
+    if sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+        _state.wrote = True
+    return result
+
+
+def replica_lag(alias):
+    """(изменений нет в реплике, её возраст в секундах) или None."""
+    values = cache.get_many([REPLICA_KEY.format(alias), WRITES_KEY])
+    if len(values) < 2:
+        return None
+    writes, synced_at = values[REPLICA_KEY.format(alias)]
+    return values[WRITES_KEY] - writes, time.time() - synced_at
+
+
+def read_alias():
+    """База для чтения: реплика, пока запрос ничего не записал.
+
+    Давно не обновлявшаяся или ни разу не скопированная реплика
+    не читается.
+    """
+    candidate = getattr(_state, 'candidate', None)
+    if candidate is None or _state.wrote:
+        return PRIMARY
+    if _state.alias is None:
+        lag = replica_lag(candidate)
+        usable = lag is not None and lag[1] <= settings.REPLICA_MAX_AGE
+        _state.alias = candidate if usable else PRIMARY
+    return _state.alias
+
+
+@contextmanager
+def fresh_reads():
+    """Чтения, результат которых кешируется по версиям областей.
+
+    Страница ляжет в кеш под текущими версиями, поэтому считать её
+    можно только по реплике, в которой есть все изменения до них;
+    иначе чтение идёт в основную базу.
+    """
+    alias = read_alias()
+    if alias == PRIMARY:
+        yield
+        return
+    lag = replica_lag(alias)
+    if lag is not None and lag[0] <= 0:
+        yield
+        return
+    _state.alias = PRIMARY
+    try:
+        yield
+    finally:
+        _state.alias = alias
+
+
+class ReplicaRouter:
+    """Чтения безопасных запросов — в реплики, записи — в основную базу."""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return PRIMARY
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # реплики — копии основной базы вместе со схемой
+        return db not in settings.DATABASE_REPLICAS
+
+
+def backup(source_path, target_path):
+    """Копирует файл SQLite целиком через backup API, не мешая чтению."""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def sync(alias):
+    """Обновляет реплику и запоминает, какие изменения в ней есть."""
+    cache.add(WRITES_KEY, int(time.time() * 1000), None)
+    writes = cache.get(WRITES_KEY)
+    synced_at = time.time()
+    backup(
+        settings.DATABASES[PRIMARY]['NAME'],
+        settings.DATABASES[alias]['NAME'],
+    )
+    cache.set(REPLICA_KEY.format(alias), (writes, synced_at), None)
@@ -0,0 +1,107 @@
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import (
+    SessionStore as CachedDBStore,
+)
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .sqlite import retry_locked
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX: str = 'core.sessions'
+
+_lock = threading.Lock()
+_pending = set()  # ключи сессий, ещё не записанные в базу
+_flusher = None
+
+
+class SessionStore(CachedDBStore):
+    """Сессии в кеше с отложенной записью в базу.
+
+    Чтение идёт из кеша, база нужна лишь при промахе. Изменённая сессия
+    сразу кладётся в кеш, а в базу её раз в SESSION_WRITE_BEHIND секунд
+    пишет фоновый поток процесса; при 0 запись синхронная, как у
+    cached_db. Новые сессии и удаление пишутся в базу сразу: ключ
+    должен быть уникальным, а удалённая при выходе сессия не должна
+    вернуться из базы.
+    """
+
+    cache_key_prefix = KEY_PREFIX
+
+    def save(self, must_create=False):
+        if must_create or self.session_key is None or (
+                not settings.SESSION_WRITE_BEHIND):
+            super().save(must_create)
+            return
+        self._cache.set(
+            self.cache_key, self._get_session(), self.get_expiry_age())
+        schedule(self.session_key)
+
+    def delete(self, session_key=None):
+        key = session_key or self.session_key
+        with _lock:
+            _pending.discard(key)
+        super().delete(session_key)
+
+
+def schedule(session_key):
+    """Ставит сессию в очередь записи и запускает поток записи."""
+    global _flusher
+    with _lock:
+        _pending.add(session_key)
+        if _flusher is None:
+            _flusher = threading.Thread(
+                target=run_flusher, name='sessions', daemon=True)
+            _flusher.start()
+            atexit.register(flush)
+
+
+def run_flusher():
+    while True:
+        time.sleep(settings.SESSION_WRITE_BEHIND)
+        try:
+            flush()
+        except Exception:
+            logger.exception('Не удалось записать сессии в базу')
+
+
+def flush():
+    """Записывает в базу сессии из очереди; возвращает их число.
+
+    Данные берутся из кеша: там самая новая версия. Сессии, которых в
+    кеше уже нет, пропускаются — их удалили при выходе или вытеснили,
+    и писать нечего. Запись — UPDATE без вставки: сессия, удалённая
+    после чтения кеша, в базу не вернётся.
+    """
+    with _lock:
+        keys = list(_pending)
+        _pending.clear()
+    if not keys:
+        return 0
+    cache = SessionStore()._cache
+    found = cache.get_many([KEY_PREFIX + key for key in keys])
+    stores = []
+    for key in keys:
+        data = found.get(KEY_PREFIX + key)
+        if data is not None:
+            store = SessionStore(key)
+            store._session_cache = data
+            stores.append(store)
+
+    sessions = SessionStore.get_model_class().objects.using(DEFAULT_DB_ALIAS)
+
+    def write():
+        with transaction.atomic(using=DEFAULT_DB_ALIAS):
+            return sum(
+                sessions.filter(session_key=store.session_key).update(
+                    session_data=store.encode(store._session_cache),
+                    expire_date=store.get_expiry_date(),
+                )
+                for store in stores
+            )
+    return retry_locked(write)
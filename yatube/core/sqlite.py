@@ -0,0 +1,100 @@
+import random
+import sqlite3
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db import router, transaction
+
+
+def apply_pragmas(connection, pragmas):
+    """Выполняет PRAGMA name = value для соединения или курсора."""
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Настраивает новое соединение SQLite прагмами SQLITE_PRAGMAS.
+
+    WAL не действует в базах в памяти, поэтому тестовые базы остаются
+    как есть.
+    """
+    if connection.vendor != 'sqlite' or connection.is_in_memory_db():
+        return
+    with connection.cursor() as cursor:
+        apply_pragmas(cursor, settings.SQLITE_PRAGMAS)
+
+
+def is_locked(error):
+    message = str(error)
+    return 'database is locked' in message or 'database is busy' in message
+
+
+def retry_locked(func, attempts=None, delay=None, sleep=time.sleep):
+    """Вызывает func, пока база занята: не больше attempts раз с паузой
+    delay, которая удваивается и немного случайна, чтобы повторы разных
+    потоков не совпадали.
+
+    busy_timeout не спасает, когда транзакция, начатая чтением, хочет
+    писать после чужой записи: SQLite сразу отвечает «database is
+    locked», и транзакцию нужно повторить целиком.
+    """
+    attempts = attempts or settings.SQLITE_WRITE_ATTEMPTS
+    delay = settings.SQLITE_RETRY_DELAY if delay is None else delay
+    for attempt in range(attempts):
+        try:
+            return func()
+        except (OperationalError, sqlite3.OperationalError) as error:
+            if not is_locked(error) or attempt == attempts - 1:
+                raise
+        sleep(delay * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def write_atomic(func, aliases=(DEFAULT_DB_ALIAS,)):
+    """Вызывает func в транзакциях баз aliases и повторяет их целиком,
+    если база занята.
+
+    Внутри уже открытой транзакции повторять нечего: блокировку держит
+    она сама, и ошибка уходит наверх.
+    """
+    def attempt():
+        with ExitStack() as stack:
+            for alias in aliases:
+                stack.enter_context(transaction.atomic(using=alias))
+            return func()
+    if any(connections[alias].in_atomic_block for alias in aliases):
+        return attempt()
+    return retry_locked(attempt)
+
+
+def save_atomic(instance):
+    """Сохраняет instance в транзакциях основной базы и базы, в которую
+    его пишет роутер (например, шарда поста), с повтором, если база
+    занята.
+
+    Новый объект перед повтором снова становится новым: откаченная
+    попытка могла успеть получить id.
+    """
+    alias = router.db_for_write(type(instance), instance=instance)
+    adding, pk = instance._state.adding, instance.pk
+
+    def save():
+        if adding:
+            instance._state.adding, instance.pk = adding, pk
+        instance.save()
+    write_atomic(save, list(dict.fromkeys([DEFAULT_DB_ALIAS, alias])))
+
+
+def write_transaction(view):
+    """Выполняет view в транзакции основной базы и повторяет её, если
+    база занята.
+
+    Годится для представлений, которые только пишут в базу: долгая
+    работа вроде обработки картинок повторялась бы вместе с ними.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        return write_atomic(lambda: view(*args, **kwargs))
+    return wrapper
@@ -0,0 +1,149 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import sessions
+from core.sessions import SessionStore
+
+User = get_user_model()
+
+
+class CachedAuthTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', password='secret-password')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def auth_queries(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        # сами таблицы, а не соединения с auth_user в запросах постов
+        tables = ('FROM "auth_user"', 'FROM "django_session"')
+        return response, [
+            query['sql'] for query in queries
+            if any(table in query['sql'] for table in tables)
+        ]
+
+    def test_logged_in_page_skips_session_and_user_queries(self):
+        """Сессия и пользователь авторизованного клиента берутся из кеша"""
+        url = reverse('posts:follow_index')
+        self.client.get(url)
+        response, queries = self.auth_queries(self.client, url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['user'], self.user)
+        self.assertEqual(queries, [])
+
+    def test_guest_with_session_makes_no_auth_queries(self):
+        """Гость с сессией не обращается к базе за пользователем"""
+        guest = Client()
+        session = guest.session
+        session['seen'] = True
+        session.save()
+        guest.cookies['sessionid'] = session.session_key
+        response, queries = self.auth_queries(guest, reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, [])
+
+    def test_password_change_logs_out_other_sessions(self):
+        """После смены пароля снимок устаревает, и сессия закрывается"""
+        url = reverse('posts:follow_index')
+        self.client.get(url)
+        self.user.set_password('new-password')
+        self.user.save()
+        response = self.client.get(url)
+        self.assertRedirects(
+            response, f'{reverse("users:login")}?next={url}')
+
+    def test_profile_change_is_visible_at_once(self):
+        """Изменённое имя пользователя видно на следующей странице"""
+        self.client.get(reverse('posts:index'))
+        self.user.first_name = 'Новое'
+        self.user.save()
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.context['user'].first_name, 'Новое')
+
+    def test_update_without_signals_applies_after_max_age(self):
+        """Отключённый через update() пользователь выходит, когда снимок
+        устаревает"""
+        url = reverse('posts:follow_index')
+        self.client.get(url)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        later = time.time() + settings.USER_SNAPSHOT_MAX_AGE
+        with mock.patch('core.auth.time.time', return_value=later):
+            response = self.client.get(url)
+        self.assertRedirects(
+            response, f'{reverse("users:login")}?next={url}')
+
+    def test_logout_ends_session(self):
+        """Выход удаляет сессию вместе со снимком пользователя"""
+        key = self.client.session.session_key
+        self.client.get(reverse('users:logout'))
+        self.assertFalse(Session.objects.filter(session_key=key).exists())
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(SESSION_WRITE_BEHIND=5)
+class WriteBehindTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        # поток записи не запускается: flush вызывает сам тест
+        patcher = mock.patch.object(sessions, '_flusher', object())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(sessions._pending.clear)
+        self.store = SessionStore()
+        self.store['step'] = 1
+        self.store.create()
+
+    def stored(self):
+        return Session.objects.get(
+            session_key=self.store.session_key).get_decoded()
+
+    def test_changes_reach_database_on_flush(self):
+        """Изменения сессии пишутся в базу при flush, а читаются из кеша"""
+        self.store['step'] = 2
+        self.store.save()
+        self.assertEqual(self.stored()['step'], 1)
+        self.assertEqual(
+            SessionStore(self.store.session_key)['step'], 2)
+        self.assertEqual(sessions.flush(), 1)
+        self.assertEqual(self.stored()['step'], 2)
+
+    def test_deleted_session_is_not_written_back(self):
+        """Удалённая сессия не возвращается в базу при flush"""
+        self.store['step'] = 2
+        self.store.save()
+        self.store.delete()
+        self.assertEqual(sessions.flush(), 0)
+        self.assertFalse(Session.objects.filter(
+            session_key=self.store.session_key).exists())
+
+    def test_session_deleted_during_flush_stays_deleted(self):
+        """Сессия, удалённая между чтением кеша и записью, не возвращается
+        в базу"""
+        self.store['step'] = 2
+        self.store.save()
+        cache_class = type(self.store._cache)
+        get_many = cache_class.get_many
+
+        def delete_meanwhile(cache, keys, *args, **kwargs):
+            found = get_many(cache, keys, *args, **kwargs)
+            Session.objects.filter(
+                session_key=self.store.session_key).delete()
+            return found
+
+        with mock.patch.object(cache_class, 'get_many', delete_meanwhile):
+            self.assertEqual(sessions.flush(), 0)
+        self.assertFalse(Session.objects.filter(
+            session_key=self.store.session_key).exists())
@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from core.cache import MmapCache
+
+WAYS: int = 4  # слотов в наборе тестового кеша
+INCR_PROCESSES: int = 4
+INCR_PER_PROCESS: int = 200
+
+
+def create_cache(path, **options):
+    options.setdefault('WAYS', WAYS)
+    options.setdefault('SLOTS', WAYS)
+    options.setdefault('SLOT_SIZE', 1024)
+    return MmapCache(path, {'TIMEOUT': None, 'OPTIONS': options})
+
+
+def increment(path):
+    cache = create_cache(path)
+    for _ in range(INCR_PER_PROCESS):
+        cache.incr('counter')
+
+
+class MmapCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache')
+        self.cache = create_cache(self.path)
+
+    def test_set_get_delete(self):
+        """Значения читаются, перезаписываются и удаляются"""
+        self.cache.set('key', {'value': 1})
+        self.cache.set('key', {'value': 2})
+        self.assertEqual(self.cache.get('key'), {'value': 2})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'other'))
+
+    def test_timeout(self):
+        """Просроченное значение не читается, touch продлевает срок"""
+        self.cache.set('short', 1, timeout=0.05)
+        self.cache.set('long', 1, timeout=0.05)
+        self.assertTrue(self.cache.touch('long', timeout=None))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertEqual(self.cache.get('long'), 1)
+
+    def test_lru_eviction(self):
+        """Из полного набора вытесняется давнее всех читавшийся ключ"""
+        for number in range(WAYS):
+            self.cache.set(f'key-{number}', number)
+        self.cache.get('key-0')
+        self.cache.set('new', 'new')
+        self.assertEqual(self.cache.get('key-0'), 0)
+        self.assertIsNone(self.cache.get('key-1'))
+        self.assertEqual(self.cache.get('new'), 'new')
+
+    def test_too_large_value_drops_old_one(self):
+        """Не влезающее в слот значение не хранится и сбрасывает старое"""
+        self.cache.set('key', 'old')
+        self.cache.set('key', os.urandom(4096))
+        self.assertIsNone(self.cache.get('key'))
+        self.cache.set('key', b'a' * 4096)
+        self.assertEqual(self.cache.get('key'), b'a' * 4096)
+
+    def test_shared_between_processes(self):
+        """Другие процессы видят значения, а incr не теряет прибавлений"""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment, args=(self.path,))
+            for _ in range(INCR_PROCESSES)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(
+            create_cache(self.path).get('counter'),
+            INCR_PROCESSES * INCR_PER_PROCESS,
+        )
+
+    def test_incr_missing_key(self):
+        """incr отсутствующего ключа — ValueError, как у других кешей"""
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_clear(self):
+        self.cache.set('key', 1)
+        self.cache.clear()
+        self.assertIsNone(self.cache.get('key'))
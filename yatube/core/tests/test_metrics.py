@@ -0,0 +1,101 @@
+import os
+import tempfile
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import MetricsFile, collect
+from posts.models import Post
+
+User = get_user_model()
+
+# ключей больше, чем влезает в начальный размер файла
+GROW_KEYS: int = 3000
+METRICS_TOKEN: str = 'metrics-token'
+
+
+class MetricsFileTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def open(self, name):
+        return MetricsFile(os.path.join(self.directory, f'{name}.metrics'))
+
+    def test_processes_are_summed(self):
+        """Значения файлов разных процессов складываются"""
+        first, second = self.open(1), self.open(2)
+        first.inc('requests{view="a"}')
+        second.inc('requests{view="a"}', 2)
+        second.inc('requests{view="b"}')
+        self.assertEqual(
+            dict(collect(self.directory)),
+            {'requests{view="a"}': 3, 'requests{view="b"}': 1})
+
+    def test_reopen_and_grow(self):
+        """Файл растёт под новые ключи и читается после перезапуска"""
+        metrics = self.open(1)
+        for number in range(GROW_KEYS):
+            metrics.inc(f'key{number}', number)
+        metrics.inc('key1')
+        reopened = self.open(1)
+        self.assertEqual(reopened.values['key1'], 2)
+        self.assertEqual(len(reopened.values), GROW_KEYS)
+
+
+class MetricsViewTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Пост')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(
+            METRICS_DIR=directory.name, METRICS_TOKEN=METRICS_TOKEN)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_metrics_by_view(self):
+        """/metrics отдаёт счётчики и гистограммы по именам представлений"""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION=f'Bearer {METRICS_TOKEN}')
+        text = response.content.decode()
+        self.assertIn(
+            'yatube_requests_total{view="posts:index",method="GET",'
+            'status="200"} 2.0', text)
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2.0',
+            text)
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket{view="posts:index",'
+            'le="+Inf"} 2.0', text)
+        self.assertIn('yatube_cache_hit_ratio{view="posts:index"}', text)
+
+    def test_only_allowed_ips(self):
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_closed_without_token_even_from_localhost(self):
+        """Без токена /metrics закрыт и для 127.0.0.1: за прокси на той же
+        машине с него приходят все запросы"""
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            with self.subTest(headers=headers):
+                response = self.client.get(
+                    reverse('metrics'), REMOTE_ADDR='127.0.0.1', **headers)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_explicitly_allowed_ip(self):
+        """Адрес, явно разрешённый в настройках, получает метрики"""
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
@@ -0,0 +1,68 @@
+import json
+import os
+import re
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+def parse_server_timing(value):
+    """{метрика: {параметр: значение}} из заголовка Server-Timing."""
+    metrics = {}
+    # запятая внутри desc в кавычках метрики не разделяет
+    for metric in re.split(r', (?=[\w-]+(?:;|$))', value):
+        name, *params = metric.split(';')
+        metrics[name] = dict(param.split('=', 1) for param in params)
+    return metrics
+
+
+class ServerTimingMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_header_and_log(self):
+        """Заголовок и строка лога содержат замеры страницы"""
+        url = reverse('posts:index')
+        with self.assertLogs('core.middleware', 'INFO') as logs:
+            response = self.client.get(url)
+        metrics = parse_server_timing(response['Server-Timing'])
+        self.assertEqual(metrics['view']['desc'], '"posts:index"')
+        self.assertGreater(float(metrics['tpl']['dur']), 0)
+        self.assertEqual(
+            set(metrics), {'db', 'tpl', 'cache', 'view', 'total'})
+        data = json.loads(logs.records[0].getMessage())
+        self.assertEqual(data['view'], 'posts:index')
+        self.assertEqual(data['path'], url)
+        self.assertGreater(data['queries'], 0)
+
+        # закешированная страница отдаётся без запросов и с попаданием
+        response = self.client.get(url)
+        metrics = parse_server_timing(response['Server-Timing'])
+        self.assertEqual(metrics['db']['desc'], '"0 queries"')
+        hits = metrics['cache']['desc'].strip('"').split()[0]
+        self.assertGreater(int(hits), 0)
+
+    def test_sampled_profile(self):
+        """При SERVER_TIMING_PROFILE_RATE=1 каждый запрос профилируется"""
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(
+                SERVER_TIMING_PROFILE_RATE=1,
+                SERVER_TIMING_PROFILE_DIR=directory,
+            ):
+                self.client.get(reverse('posts:index'))
+            names = os.listdir(directory)
+        self.assertEqual(len(names), 1)
+        self.assertTrue(names[0].startswith('posts-index-'))
@@ -0,0 +1,100 @@
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from core import replicas
+from core.replicas import REPLICA_KEY, WRITES_KEY, ReplicaRouter
+from posts.models import Post, UserStats
+
+User = get_user_model()
+
+
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        replicas.start_request(read_only=True)
+        self.addCleanup(replicas.finish_request)
+
+    def synced(self, behind=0, age=0):
+        cache.set(WRITES_KEY, 100 + behind)
+        cache.set(REPLICA_KEY.format('replica'), (100, time.time() - age))
+
+    def test_reads_go_to_synced_replica(self):
+        self.synced()
+        self.assertEqual(self.router.db_for_read(Post), 'replica')
+        self.assertEqual(self.router.db_for_read(Session), 'default')
+        # выбор базы для записи сам по себе чтение не переключает
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'replica')
+        replicas.track_writes(
+            lambda *args: None, 'UPDATE posts_post SET text = %s', (),
+            False, {})
+        # после записи запрос читает свои изменения из основной базы
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_unusable_replica(self):
+        """Ни разу не скопированная и устаревшая реплики не читаются"""
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.synced(age=3600)
+        replicas.start_request(read_only=True)
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+    def test_fresh_reads_need_all_writes(self):
+        """Страница для кеша считается по реплике без отставания"""
+        self.synced(behind=1)
+        with replicas.fresh_reads():
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'replica')
+        self.synced()
+        with replicas.fresh_reads():
+            self.assertEqual(self.router.db_for_read(Post), 'replica')
+
+
+class ReplicaMiddlewareTest(TestCase):
+    def test_write_pins_visitor(self):
+        """После записи посетитель получает куку чтения основной базы"""
+        user = User.objects.create_user(username='author')
+        post = Post.objects.create(author=user, text='Пост')
+        self.client.force_login(user)
+        response = self.client.post(
+            reverse('posts:add_comment', args=[post.id]), {'text': 'Да'})
+        self.assertIn('db_pin', response.cookies)
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotIn('db_pin', response.cookies)
+
+    def test_lookup_on_primary_does_not_pin(self):
+        """get_or_create, нашедший строку, не считается записью"""
+        user = User.objects.create_user(username='author')
+        replicas.start_request(read_only=True)
+        with connection.execute_wrapper(replicas.track_writes):
+            UserStats.objects.get_or_create(user=user)
+            self.assertFalse(replicas.finish_request())
+            replicas.start_request(read_only=True)
+            UserStats.objects.filter(user=user).update(posts_count=1)
+        self.assertTrue(replicas.finish_request())
+
+
+class BackupTest(SimpleTestCase):
+    def test_backup_copies_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            primary = os.path.join(directory, 'primary.sqlite3')
+            replica = os.path.join(directory, 'replica.sqlite3')
+            connection = sqlite3.connect(primary)
+            with connection:
+                connection.execute('CREATE TABLE item (id INTEGER)')
+                connection.execute('INSERT INTO item VALUES (1)')
+            connection.close()
+            replicas.backup(primary, replica)
+            connection = sqlite3.connect(replica)
+            rows = connection.execute('SELECT id FROM item').fetchall()
+            connection.close()
+        self.assertEqual(rows, [(1,)])
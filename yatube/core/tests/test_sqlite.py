@@ -0,0 +1,75 @@
+import os
+import sqlite3
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import SimpleTestCase, override_settings
+
+from core.sqlite import apply_pragmas, retry_locked
+
+
+class FlakyWrite:
+    """Запись, которой база первые failures раз отвечает блокировкой."""
+
+    def __init__(self, failures, message='database is locked'):
+        self.failures = failures
+        self.message = message
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise OperationalError(self.message)
+        return 'ok'
+
+
+@override_settings(SQLITE_WRITE_ATTEMPTS=3, SQLITE_RETRY_DELAY=0.01)
+class RetryLockedTest(SimpleTestCase):
+    def setUp(self):
+        self.pauses = []
+
+    def test_retries_with_growing_pauses(self):
+        write = FlakyWrite(failures=2)
+        # без случайной добавки: с ней соседние паузы могут совпасть
+        with mock.patch('core.sqlite.random.uniform', return_value=1):
+            self.assertEqual(
+                retry_locked(write, sleep=self.pauses.append), 'ok')
+        self.assertEqual(write.calls, 3)
+        self.assertEqual(self.pauses, [0.01, 0.02])
+
+    def test_gives_up_after_attempts(self):
+        write = FlakyWrite(failures=3)
+        with self.assertRaises(OperationalError):
+            retry_locked(write, sleep=self.pauses.append)
+        self.assertEqual(write.calls, 3)
+
+    def test_other_errors_are_not_retried(self):
+        write = FlakyWrite(failures=1, message='no such table: post')
+        with self.assertRaises(OperationalError):
+            retry_locked(write, sleep=self.pauses.append)
+        self.assertEqual(write.calls, 1)
+
+
+class PragmasTest(SimpleTestCase):
+    def test_file_database_switches_to_wal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            connection = sqlite3.connect(os.path.join(directory, 'db'))
+            apply_pragmas(
+                connection, {'journal_mode': 'WAL', 'synchronous': 'NORMAL'})
+            mode = connection.execute('PRAGMA journal_mode').fetchone()
+            synchronous = connection.execute('PRAGMA synchronous').fetchone()
+            connection.close()
+        self.assertEqual(mode, ('wal',))
+        self.assertEqual(synchronous, (1,))
+
+    def test_bench_sqlite_reports_both_profiles(self):
+        stdout = StringIO()
+        call_command(
+            'bench_sqlite', '--duration', '0.2', '--writers', '2',
+            '--readers', '1', stdout=stdout)
+        output = stdout.getvalue()
+        self.assertIn('по умолчанию', output)
+        self.assertIn('WAL', output)
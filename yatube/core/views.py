@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from .metrics import render as render_metrics
+
 
 def page_not_found(request, exception):
     return render(request,
@@ -18,3 +24,22 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def metrics_allowed(request):
+    """Запрос с токеном METRICS_TOKEN или с адреса из METRICS_ALLOWED_IPS."""
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics(request):
+    """Метрики для Prometheus; без токена или разрешённого адреса — 404."""
+    if not settings.METRICS_DIR or not metrics_allowed(request):
+        raise Http404
+    return HttpResponse(
+        render_metrics(settings.METRICS_DIR),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
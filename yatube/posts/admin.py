@@ -1,8 +1,94 @@
+from django.conf import settings
 from django.contrib import admin
+from django.core.exceptions import ValidationError
+
+from . import shards
 from .models import Comment, Group, Post
+from .search import build_match, matching_ids
+
+
+class ShardListFilter(admin.SimpleListFilter):
+    """База, строки которой показывает список; по умолчанию первый шард.
+
+    В основной базе остаются посты, ещё не перенесённые командой
+    rebalance_shards.
+    """
+
+    title = 'база'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        return [
+            (alias, alias)
+            for alias in [*settings.POST_SHARDS, shards.PRIMARY]
+        ]
+
+    def queryset(self, request, queryset):
+        # базу запроса выбирает ShardedAdmin.get_queryset
+        return queryset
+
+    def choices(self, changelist):
+        current = self.value() or settings.POST_SHARDS[0]
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': alias == current,
+                'query_string': changelist.get_query_string(
+                    {self.parameter_name: alias}),
+                'display': title,
+            }
+
+
+class ShardedAdmin(admin.ModelAdmin):
+    """Админка постов и комментариев.
 
+    С шардами список показывает одну базу, выбранную фильтром, а объект
+    по id ищется во всех. Пользователи и группы лежат в основной базе,
+    поэтому вместо JOIN с ними связи из related подгружаются отдельными
+    запросами.
+    """
 
-class PostAdmin(admin.ModelAdmin):
+    related = ()
+
+    def get_list_filter(self, request):
+        list_filter = super().get_list_filter(request)
+        if not shards.enabled():
+            return list_filter
+        return (ShardListFilter, *list_filter)
+
+    def get_list_select_related(self, request):
+        if not shards.enabled():
+            return super().get_list_select_related(request)
+        return ()
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if not shards.enabled():
+            return queryset
+        alias = request.GET.get(ShardListFilter.parameter_name)
+        if alias not in [*settings.POST_SHARDS, shards.PRIMARY]:
+            alias = settings.POST_SHARDS[0]
+        return queryset.using(alias).prefetch_related(*self.related)
+
+    def get_object(self, request, object_id, from_field=None):
+        if not shards.enabled():
+            return super().get_object(request, object_id, from_field)
+        field = (
+            self.model._meta.pk if from_field is None
+            else self.model._meta.get_field(from_field)
+        )
+        try:
+            object_id = field.to_python(object_id)
+        except (ValidationError, ValueError):
+            return None
+        queryset = self.get_queryset(request).filter(**{field.name: object_id})
+        return next((
+            obj
+            for alias in [*settings.POST_SHARDS, shards.PRIMARY]
+            for obj in queryset.using(alias)[:1]
+        ), None)
+
+
+class PostAdmin(ShardedAdmin):
     list_display = (
         'pk',
         'text',
@@ -14,6 +100,16 @@ class PostAdmin(admin.ModelAdmin):
     search_fields = ('text',)
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
+    related = ('author', 'group')
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE по тексту."""
+        if not search_term.strip():
+            return queryset, False
+        # в строке нет слов: пустой MATCH — синтаксическая ошибка FTS5
+        if not build_match(search_term):
+            return queryset.none(), False
+        return queryset.filter(id__in=matching_ids(search_term)), False
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -31,7 +127,7 @@ class GroupAdmin(admin.ModelAdmin):
     list_filter = ('title',)
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ShardedAdmin):
     list_display = (
         'id',
         'post',
@@ -44,6 +140,18 @@ class CommentAdmin(admin.ModelAdmin):
         'created',
         'author'
     )
+    related = ('post', 'author')
+
+    def has_add_permission(self, request):
+        # выбор поста в форме видит только основную базу
+        return not shards.enabled() and super().has_add_permission(request)
+
+    def get_readonly_fields(self, request, obj=None):
+        readonly_fields = super().get_readonly_fields(request, obj)
+        if not shards.enabled():
+            return readonly_fields
+        # комментарий не переносится к посту другого шарда
+        return (*readonly_fields, 'post')
 
 
 admin.site.register(Post, PostAdmin)
@@ -0,0 +1,234 @@
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date, parse_http_date_safe
+
+from core.replicas import fresh_reads, record_write
+
+from . import shards
+from .models import Post, User
+
+VERSION_KEY: str = 'version:{}'
+PAGE_KEY: str = 'page:{}'
+POST_AUTHOR_KEY: str = 'post-author:{}'
+LOCK_KEY: str = 'lock:{}'  # пересчёт страницы уже идёт
+LATEST_KEY: str = 'latest:{}'  # ключ последней версии страницы
+# области названий групп и имён авторов на страницах чужих областей:
+# на странице поста, в профайле, на странице группы
+GROUPS_SCOPE: str = 'groups'
+AUTHORS_SCOPE: str = 'authors'
+
+
+def initial_version():
+    """Стартовая версия области.
+
+    Берётся от текущего времени, чтобы после вытеснения ключа версии
+    из кеша не совпасть с версией уже закешированных страниц.
+    """
+    return int(time.time() * 1000)
+
+
+def get_versions(scopes):
+    """Текущие версии областей; недостающие заводятся заново."""
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, initial_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    """Сбрасывает все страницы, зависящие от областей scopes."""
+    # счётчик изменений растёт раньше версий: страницу под новой версией
+    # не посчитают по реплике без этого изменения
+    record_write()
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, initial_version(), None)
+    # до коммита страницу могли пересчитать по старым данным и положить
+    # под новой версией: после коммита области сбрасываются ещё раз
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump(*scopes))
+
+
+def user_scopes(user_id):
+    """Области страниц автора: его постов и его профайла."""
+    scopes = [f'user:{user_id}']
+    username = User.objects.filter(
+        pk=user_id
+    ).values_list('username', flat=True).first()
+    if username is not None:
+        scopes.append(f'profile:{username}')
+    return scopes
+
+
+def post_scopes(post):
+    """Области всех страниц, на которых выводится пост."""
+    scopes = ['posts', f'post:{post.pk}', *user_scopes(post.author_id)]
+    if post.group_id:
+        scopes.append(f'group:{post.group.slug}')
+    return scopes
+
+
+def post_author_scope(request, post_id):
+    """Область автора поста для страницы поста."""
+    key = POST_AUTHOR_KEY.format(post_id)
+    author_id = cache.get(key)
+    if author_id is None:
+        author_id = shards.for_post(
+            Post.objects.filter(pk=post_id), post_id
+        ).values_list('author_id', flat=True).first()
+        if author_id is not None:
+            cache.set(key, author_id, None)
+    return f'user:{author_id}'
+
+
+def get_page_digest(request, versions):
+    """Хеш адреса, посетителя и версий: ключ страницы в кеше и её ETag."""
+    user = request.user
+    if user.is_authenticated:
+        csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+        visitor = f'{user.pk}:{csrf_cookie}'
+    else:
+        visitor = 'anonymous'
+    raw = '|'.join(
+        [request.get_full_path(), visitor] + [str(v) for v in versions]
+    )
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def is_cacheable(request, response):
+    if response.status_code != 200 or response.cookies:
+        return False
+    # токен формы выдан под новую CSRF-куку: без неё страница бесполезна
+    return not (
+        request.META.get('CSRF_COOKIE_USED')
+        and settings.CSRF_COOKIE_NAME not in request.COOKIES
+    )
+
+
+def acquire(digest):
+    """Берёт право пересчитать страницу; False — его уже взяли."""
+    return cache.add(
+        LOCK_KEY.format(digest), True, settings.PAGE_CACHE_LOCK_TIMEOUT)
+
+
+def release(digest):
+    cache.delete(LOCK_KEY.format(digest))
+
+
+def refresh_early(expires, delta):
+    """Пора ли пересчитать страницу до истечения срока (XFetch).
+
+    Вероятность растёт к концу срока и со временем расчёта delta,
+    поэтому долгие страницы пересчитываются заранее, а одновременно
+    это делает лишь один из запросов.
+    """
+    gap = -delta * settings.PAGE_CACHE_EARLY_BETA * math.log(
+        1 - random.random())
+    return time.time() + gap >= expires
+
+
+def wait_for_page(request, digest):
+    """Страница, пока её пересчитывает другой запрос.
+
+    Сразу отдаётся предыдущая версия страницы, если она есть, иначе
+    новая ожидается не дольше PAGE_CACHE_WAIT секунд.
+    """
+    latest = cache.get(LATEST_KEY.format(get_page_digest(request, [])))
+    entry = cache.get(PAGE_KEY.format(latest)) if latest else None
+    deadline = time.monotonic() + settings.PAGE_CACHE_WAIT
+    while entry is None and time.monotonic() < deadline:
+        time.sleep(settings.PAGE_CACHE_POLL)
+        entry = cache.get(PAGE_KEY.format(digest))
+    return entry[0] if entry is not None else None
+
+
+def store_page(request, digest, render, timeout):
+    started = time.monotonic()
+    with fresh_reads():
+        response = render()
+    if is_cacheable(request, response):
+        delta = time.monotonic() - started
+        response['ETag'] = quote_etag(digest)
+        # у лент Last-Modified — дата последнего поста, он точнее
+        response.setdefault('Last-Modified', http_date())
+        cache.set(
+            PAGE_KEY.format(digest),
+            (response, time.time() + timeout, delta), timeout,
+        )
+        cache.set(
+            LATEST_KEY.format(get_page_digest(request, [])), digest, timeout)
+    return response
+
+
+def get_or_render(request, digest, render, timeout):
+    """Страница из кеша; пересчитывает её только один запрос."""
+    entry = cache.get(PAGE_KEY.format(digest))
+    if entry is not None:
+        response, expires, delta = entry
+        if not refresh_early(expires, delta) or not acquire(digest):
+            return response
+    elif not acquire(digest):
+        response = wait_for_page(request, digest)
+        if response is not None:
+            return response
+        # не дождались: считаем сами, но без права на пересчёт
+        return store_page(request, digest, render, timeout)
+    try:
+        return store_page(request, digest, render, timeout)
+    finally:
+        release(digest)
+
+
+def cache_versioned(*scopes, timeout=None):
+    """Кеширует страницу, пока не изменится ни одна из областей scopes.
+
+    Область — шаблон по аргументам view ('group:{slug}') или функция
+    (request, **kwargs) -> str. Версии областей повышаются сигналами
+    при изменении моделей, так что страница сбрасывается сразу.
+
+    Пересчитывает страницу один запрос, остальные тем временем получают
+    предыдущую версию или ждут новую (get_or_render).
+
+    ETag страницы — хеш её ключа, поэтому на запрос с If-None-Match
+    ответ 304 отдаётся до вызова view, по одним версиям из кеша.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            names = [
+                scope(request, **kwargs) if callable(scope)
+                else scope.format(**kwargs)
+                for scope in scopes
+            ]
+            digest = get_page_digest(request, get_versions(names))
+            response = get_conditional_response(request, quote_etag(digest))
+            if response is not None:
+                response['ETag'] = quote_etag(digest)
+                return response
+            response = get_or_render(
+                request, digest, lambda: view(request, *args, **kwargs),
+                timeout or settings.PAGE_CACHE_TIMEOUT,
+            )
+            return get_conditional_response(
+                request, response.get('ETag'),
+                parse_http_date_safe(response.get('Last-Modified')),
+                response,
+            )
+        return wrapper
+    return decorator
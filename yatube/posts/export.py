@@ -0,0 +1,180 @@
+import csv
+import heapq
+import json
+import time
+import zipfile
+from datetime import datetime
+from itertools import islice
+from operator import itemgetter
+
+from django.core.files.storage import default_storage
+
+from . import shards
+from .models import Comment, Post
+
+# поля выгрузки; её же читает команда import_posts
+EXPORT_FIELDS = (
+    'type', 'id', 'post', 'author', 'group', 'text', 'pub_date', 'created',
+    'image',
+)
+# поле выгрузки -> поле .values()
+POST_VALUES = {
+    'id': 'id',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'image': 'image',
+}
+COMMENT_VALUES = {
+    'id': 'id',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}
+CHUNK_SIZE: int = 2000  # строк за одно чтение из базы
+BLOCK_SIZE: int = 64 * 1024  # байт zip-архива за одну отдачу
+DATA_NAME: str = 'posts'  # имя файла с записями в архиве
+CONTENT_TYPES = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'zip': 'application/zip',
+}
+
+
+def user_content(user):
+    """Посты и комментарии пользователя."""
+    return (
+        shards.for_author(Post.objects.filter(author=user), user.pk),
+        # комментарии лежат в шардах чужих постов
+        shards.everywhere(Comment.objects.filter(author=user)),
+    )
+
+
+def group_content(group):
+    """Посты группы и комментарии к ним."""
+    return (
+        shards.everywhere(Post.objects.filter(group=group)),
+        shards.everywhere(Comment.objects.filter(post__group=group)),
+    )
+
+
+def ordered_by_id(queryset, *fields):
+    """Строки .values() всех шардов queryset по возрастанию id."""
+    return heapq.merge(*(
+        part.order_by('id').values(*fields).iterator(chunk_size=CHUNK_SIZE)
+        for part in shards.parts(queryset)
+    ), key=itemgetter('id'))
+
+
+def value_rows(queryset, fields):
+    """Строки .values(*fields) порциями, связанные поля — из основной
+    базы."""
+    rows = ordered_by_id(queryset, *shards.local_values(fields))
+    while True:
+        chunk = shards.fill_values(islice(rows, CHUNK_SIZE), fields)
+        if not chunk:
+            return
+        yield from chunk
+
+
+def records(posts, comments):
+    """Записи выгрузки по одной, без загрузки всех строк в память."""
+    for kind, queryset, fields in (
+        ('post', posts, POST_VALUES),
+        ('comment', comments, COMMENT_VALUES),
+    ):
+        for row in value_rows(queryset, fields.values()):
+            record = {'type': kind}
+            for name, lookup in fields.items():
+                value = row[lookup]
+                if isinstance(value, datetime):
+                    value = value.isoformat()
+                record[name] = value
+            yield record
+
+
+def jsonl_lines(rows):
+    for record in rows:
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+class Echo:
+    """Файл для csv.writer, который просто возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.DictWriter(Echo(), EXPORT_FIELDS)
+    yield writer.writeheader()
+    for record in rows:
+        yield writer.writerow(record)
+
+
+FORMATS = {
+    'jsonl': jsonl_lines,
+    'csv': csv_lines,
+}
+
+
+class ZipStream:
+    """Файл без seek для zipfile: копит записанное до отдачи."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offset = 0
+
+    def write(self, data):
+        self.buffer += data
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def zip_stream(lines, name, images):
+    """Zip-архив по частям: файл записей и картинки из media/posts/."""
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open(name, 'w') as entry:
+            for line in lines:
+                entry.write(line.encode())
+                if len(stream.buffer) >= BLOCK_SIZE:
+                    yield stream.pop()
+        seen = set()
+        for image in images:
+            if image in seen or not default_storage.exists(image):
+                continue
+            seen.add(image)
+            # картинки уже сжаты: кладём как есть
+            info = zipfile.ZipInfo(f'media/{image}', time.localtime()[:6])
+            with default_storage.open(image) as source, \
+                    archive.open(info, 'w') as entry:
+                for block in iter(lambda: source.read(BLOCK_SIZE), b''):
+                    entry.write(block)
+                    yield stream.pop()
+    yield stream.pop()
+
+
+def export(posts, comments, file_format, with_images=False):
+    """Выгрузка по частям: строки JSONL или CSV либо байты zip-архива."""
+    lines = FORMATS[file_format](records(posts, comments))
+    if not with_images:
+        return lines
+    images = (
+        row['image']
+        for row in ordered_by_id(posts.exclude(image=''), 'id', 'image')
+    )
+    return zip_stream(lines, f'{DATA_NAME}.{file_format}', images)
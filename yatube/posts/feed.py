@@ -0,0 +1,347 @@
+import heapq
+from collections import defaultdict
+from itertools import groupby, islice
+
+from django.conf import settings
+from django.db.models import Count, F, Q
+
+from . import shards
+from .models import FeedEntry, Follow, Post, UserStats
+
+
+def is_fanout_author(author_id):
+    """Рассылать ли посты автора по лентам при публикации."""
+    return not UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).exists()
+
+
+def fan_out(post):
+    """Кладёт новый пост в ленты всех подписчиков автора."""
+    if not is_fanout_author(post.author_id):
+        return
+    user_ids = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in user_ids),
+        batch_size=settings.FEED_BATCH_SIZE,
+    )
+
+
+def fan_out_many(posts):
+    """Кладёт пачку постов в ленты подписчиков их авторов.
+
+    posts — тройки (id поста, id автора, pub_date); записи, уже лежащие
+    в лентах, пропускаются.
+    """
+    post_ids = defaultdict(list)
+    for post_id, author_id, pub_date in posts:
+        post_ids[author_id].append((post_id, pub_date))
+    fanout_off = UserStats.objects.filter(
+        user_id__in=post_ids,
+        followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values_list('user_id', flat=True)
+    follows = Follow.objects.filter(
+        author_id__in=post_ids.keys() - set(fanout_off)
+    ).values_list('user_id', 'author_id')
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for user_id, author_id in follows.iterator()
+         for post_id, pub_date in post_ids[author_id]),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def latest(queryset):
+    """Последние FEED_MAX_ENTRIES постов: старше в ленте не хранятся."""
+    return queryset.order_by(
+        '-pub_date', '-id')[:settings.FEED_MAX_ENTRIES]
+
+
+def backfill(user_id, author_id):
+    """Дополняет ленту подписчика постами автора после подписки."""
+    if not is_fanout_author(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id)
+    if not shards.enabled():
+        posts = posts.exclude(feed_entries__user_id=user_id)
+    posts = latest(
+        shards.in_author_shard(posts, author_id)
+    ).values_list('id', 'pub_date')
+    # в шарде нет записей лент: уже разосланные посты пропускает вставка
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts.iterator()),
+        batch_size=settings.FEED_BATCH_SIZE,
+        ignore_conflicts=shards.enabled(),
+    )
+    trim(user_id)
+
+
+def catch_up(author_id):
+    """Раскладывает посты автора по лентам, когда подписчиков стало
+    ровно FEED_FANOUT_MAX_FOLLOWERS.
+
+    Выше порога посты автора не рассылались и новые подписчики не
+    дополнялись: их посты подмешивались при чтении. После спуска до
+    порога лента читается только из FeedEntry, и без этого посты автора
+    пропали бы из неё.
+    """
+    if not UserStats.objects.filter(
+        user_id=author_id,
+        followers_count=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).exists():
+        return
+    fan_out_many(latest(shards.in_author_shard(
+        Post.objects.filter(author_id=author_id), author_id
+    )).values_list('id', 'author_id', 'pub_date'))
+
+
+def prune(user_id, author_id):
+    """Убирает посты автора из ленты после отписки.
+
+    С шардами посты автора ищутся среди постов ленты в его шарде: лента
+    короче FEED_MAX_ENTRIES, а JOIN с постами другой базы невозможен.
+    """
+    entries = FeedEntry.objects.filter(user_id=user_id)
+    if not shards.enabled():
+        entries.filter(post__author_id=author_id).delete()
+        return
+    post_ids = list(shards.in_author_shard(Post.objects.filter(
+        author_id=author_id,
+        id__in=list(entries.values_list('post_id', flat=True)),
+    ), author_id).values_list('id', flat=True))
+    entries.filter(post_id__in=post_ids).delete()
+
+
+def trim(user_id):
+    """Удаляет из ленты записи старше FEED_MAX_ENTRIES последних.
+
+    Возвращает число удалённых записей.
+    """
+    edge = FeedEntry.objects.filter(
+        user_id=user_id
+    ).order_by('-pub_date', '-post_id').values_list(
+        'pub_date', 'post_id')[settings.FEED_MAX_ENTRIES:].first()
+    if edge is None:
+        return 0
+    pub_date, post_id = edge
+    deleted, _ = FeedEntry.objects.filter(
+        Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, post_id__lte=post_id),
+        user_id=user_id,
+    ).delete()
+    return deleted
+
+
+def trim_all():
+    """Обрезает ленты, в которых больше FEED_MAX_ENTRIES записей."""
+    user_ids = FeedEntry.objects.values('user_id').annotate(
+        entries=Count('id')
+    ).filter(
+        entries__gt=settings.FEED_MAX_ENTRIES
+    ).values_list('user_id', flat=True)
+    return sum(trim(user_id) for user_id in list(user_ids))
+
+
+def entry_posts(user):
+    """Посты из материализованной ленты пользователя.
+
+    Ключ пагинации feed_date, feed_post берётся из FeedEntry: сортировка
+    и курсор идут по индексу (user, -pub_date, -post).
+    """
+    return Post.objects.filter(feed_entries__user=user).annotate(
+        feed_date=F('feed_entries__pub_date'),
+        feed_post=F('feed_entries__post_id'),
+    )
+
+
+def read_posts(queryset):
+    """Посты, которые подмешиваются в ленту при чтении, с тем же ключом,
+    что у записей ленты."""
+    return queryset.annotate(feed_date=F('pub_date'), feed_post=F('id'))
+
+
+class FeedQuerySet:
+    """Лента подписок как один запрос постов по id из подзапросов.
+
+    Условие курсора, сортировка и предел среза уходят в подзапросы:
+    записи ленты по индексу (user, -pub_date, -post) и посты каждого
+    автора без рассылки по индексу (author, -pub_date, -id). Внешний
+    запрос сортирует не больше предела строк на подзапрос.
+    select_related, only и values относятся к внешнему запросу.
+    Поддерживается то, что нужно пагинаторам: filter, order_by, reverse,
+    count и срезы.
+    """
+
+    ordered = True
+
+    def __init__(self, sources, posts, descending=True, start=0, stop=None):
+        self.sources = sources
+        self.posts = posts
+        self.descending = descending
+        self.start = start
+        self.stop = stop
+        self._result_cache = None
+
+    def _clone(self, sources=None, posts=None, **kwargs):
+        options = {
+            'descending': self.descending,
+            'start': self.start,
+            'stop': self.stop,
+            **kwargs,
+        }
+        return type(self)(
+            sources if sources is not None else self.sources,
+            posts if posts is not None else self.posts,
+            **options,
+        )
+
+    def _sources(self, method, *args, **kwargs):
+        return [
+            getattr(source, method)(*args, **kwargs) for source in self.sources
+        ]
+
+    def filter(self, *args, **kwargs):
+        return self._clone(sources=self._sources('filter', *args, **kwargs))
+
+    def order_by(self, *fields):
+        return self._clone(
+            sources=self._sources('order_by', *fields),
+            descending=fields[0].startswith('-'),
+        )
+
+    def reverse(self):
+        return self._clone(
+            sources=self._sources('reverse'), descending=not self.descending)
+
+    def select_related(self, *fields):
+        return self._clone(posts=self.posts.select_related(*fields))
+
+    def only(self, *fields):
+        return self._clone(posts=self.posts.only(*fields))
+
+    def values(self, *fields):
+        return self._clone(posts=self.posts.values(*fields))
+
+    def build(self):
+        """Запрос постов среза."""
+        ids = Q()
+        for source in self.sources:
+            source = source.values('feed_post')
+            if self.stop is not None:
+                source = source[:self.stop]
+            ids |= Q(id__in=source)
+        ordering = ('-pub_date', '-id') if self.descending else (
+            'pub_date', 'id')
+        return self.posts.filter(ids).order_by(*ordering)[
+            self.start:self.stop]
+
+    @property
+    def query(self):
+        return self.build().query
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        return self.build().count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return list(self[key:key + 1])[0]
+        start = self.start + (key.start or 0)
+        stop = self.stop
+        if key.stop is not None:
+            stop = self.start + key.stop
+            if self.stop is not None:
+                stop = min(stop, self.stop)
+        return self._clone(start=start, stop=stop)
+
+    def _fetch(self):
+        if self._result_cache is None:
+            self._result_cache = list(self.build())
+        return self._result_cache
+
+    def __iter__(self):
+        return iter(self._fetch())
+
+    def __len__(self):
+        return len(self._fetch())
+
+    def __bool__(self):
+        return bool(self._fetch())
+
+
+class ShardedFeedQuerySet(FeedQuerySet):
+    """Лента подписок с шардами.
+
+    Записи лент лежат в основной базе, а посты — в шардах, поэтому
+    ключи (feed_date, feed_post) записей и постов авторов без рассылки
+    читаются каждый из своей базы и сливаются, а посты среза
+    подгружаются по id из их шардов.
+    """
+
+    @property
+    def query(self):
+        return self.sources[0].query
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        total = sum(
+            (source[:self.stop] if self.stop is not None else source).count()
+            for source in self.sources
+        )
+        if self.stop is not None:
+            total = min(total, self.stop)
+        return max(total - self.start, 0)
+
+    def keys(self):
+        """Ключи постов среза по порядку, без повторов."""
+        sources = []
+        for source in self.sources:
+            source = source.values_list('feed_date', 'feed_post')
+            if self.stop is not None:
+                source = source[:self.stop]
+            sources.append(list(source))
+        merged = heapq.merge(*sources, reverse=self.descending)
+        unique = (key for key, _ in groupby(merged))
+        return list(islice(unique, self.start, self.stop))
+
+    def _fetch(self):
+        if self._result_cache is None:
+            self._result_cache = shards.fetch_posts(
+                self.posts, [post_id for _, post_id in self.keys()])
+        return self._result_cache
+
+
+def entry_keys(user):
+    """Записи материализованной ленты с ключом постов ленты."""
+    return FeedEntry.objects.filter(user=user).annotate(
+        feed_date=F('pub_date'), feed_post=F('post'))
+
+
+def feed_posts(user):
+    """Посты ленты подписок для FeedCursorPaginator.
+
+    Разосланные посты читаются из материализованной ленты, посты
+    авторов с большим числом подписчиков подмешиваются при чтении.
+    """
+    fanout_off = Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS,
+    ).values_list('author_id', flat=True)
+    sources = [
+        read_posts(shards.in_author_shard(
+            Post.objects.filter(author_id=author_id), author_id))
+        for author_id in fanout_off
+    ]
+    if shards.enabled():
+        return ShardedFeedQuerySet(
+            [entry_keys(user), *sources], Post.objects.all())
+    if not sources:
+        return entry_posts(user)
+    return FeedQuerySet([entry_posts(user), *sources], Post.objects.all())
@@ -0,0 +1,123 @@
+from django.contrib.syndication.views import Feed
+from django.http import Http404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from . import shards
+from .cache import AUTHORS_SCOPE, cache_versioned
+from .models import Group, Post, User
+
+FEED_ITEMS: int = 20  # постов в ленте
+TITLE_WORDS: int = 8  # слов текста в заголовке записи
+ITEM_FIELDS = ('id', 'text', 'pub_date', 'author__username')
+
+
+class LatestPostsFeed(Feed):
+    """RSS последних постов: записи — строки .values(), без моделей."""
+
+    title = 'Yatube: последние посты'
+    description = 'Новые посты всех авторов'
+    item_guid_is_permalink = False
+
+    def link(self, obj):
+        return reverse('posts:index')
+
+    def get_posts(self, obj):
+        return shards.everywhere(Post.objects.all())
+
+    def items(self, obj):
+        rows = self.get_posts(obj).order_by('-pub_date', '-id').values(
+            *shards.local_values(ITEM_FIELDS))[:FEED_ITEMS]
+        return shards.fill_values(rows, ITEM_FIELDS)
+
+    def item_title(self, item):
+        return Truncator(item['text']).words(TITLE_WORDS)
+
+    def item_description(self, item):
+        return item['text']
+
+    def item_link(self, item):
+        return reverse('posts:post_detail', args=[item['id']])
+
+    def item_guid(self, item):
+        return str(item['id'])
+
+    def item_pubdate(self, item):
+        return item['pub_date']
+
+    def item_author_name(self, item):
+        return item['author__username']
+
+
+class GroupPostsFeed(LatestPostsFeed):
+    def get_object(self, request, slug):
+        group = Group.objects.filter(slug=slug).values(
+            'id', 'slug', 'title', 'description').first()
+        if group is None:
+            raise Http404('Группа не найдена')
+        return group
+
+    def title(self, obj):
+        return f'Yatube: {obj["title"]}'
+
+    def description(self, obj):
+        return obj['description']
+
+    def link(self, obj):
+        return reverse('posts:group_posts', args=[obj['slug']])
+
+    def get_posts(self, obj):
+        return shards.everywhere(Post.objects.filter(group_id=obj['id']))
+
+
+class ProfilePostsFeed(LatestPostsFeed):
+    def get_object(self, request, username):
+        author = User.objects.filter(username=username).values(
+            'id', 'username').first()
+        if author is None:
+            raise Http404('Автор не найден')
+        return author
+
+    def title(self, obj):
+        return f'Yatube: посты {obj["username"]}'
+
+    def description(self, obj):
+        return f'Новые посты автора {obj["username"]}'
+
+    def link(self, obj):
+        return reverse('posts:profile', args=[obj['username']])
+
+    def get_posts(self, obj):
+        return shards.for_author(
+            Post.objects.filter(author_id=obj['id']), obj['id'])
+
+
+class LatestPostsAtomFeed(LatestPostsFeed):
+    feed_type = Atom1Feed
+    subtitle = LatestPostsFeed.description
+
+
+class GroupPostsAtomFeed(GroupPostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+class ProfilePostsAtomFeed(ProfilePostsFeed):
+    feed_type = Atom1Feed
+
+    def subtitle(self, obj):
+        return self.description(obj)
+
+
+# ленты кешируются, пока в их области не появится новый пост
+latest_rss = cache_versioned('posts')(LatestPostsFeed())
+latest_atom = cache_versioned('posts')(LatestPostsAtomFeed())
+group_rss = cache_versioned(
+    'group:{slug}', AUTHORS_SCOPE)(GroupPostsFeed())
+group_atom = cache_versioned(
+    'group:{slug}', AUTHORS_SCOPE)(GroupPostsAtomFeed())
+profile_rss = cache_versioned('profile:{username}')(ProfilePostsFeed())
+profile_atom = cache_versioned('profile:{username}')(ProfilePostsAtomFeed())
@@ -1,4 +1,6 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+from .images import ImageIngestError, ingest
 from .models import Comment, Post
 
 
@@ -7,6 +9,22 @@ class PostForm(forms.ModelForm):
         super().__init__(*args, **kwargs)
         self.fields['group'].empty_label = 'Группа не выбрана'
 
+    def clean_image(self):
+        """Нормализует новую картинку и запоминает её размеры."""
+        image = self.cleaned_data.get('image')
+        if not image:
+            self.instance.image_width = None
+            self.instance.image_height = None
+            return image
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            image, size = ingest(image)
+        except ImageIngestError as error:
+            raise forms.ValidationError(str(error))
+        self.instance.image_width, self.instance.image_height = size
+        return image
+
     class Meta:
         model = Post
         fields = ['text', 'group', 'image']
@@ -0,0 +1,85 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+# расширение и MIME-тип файла для формата сохранения
+FORMATS = {
+    'JPEG': ('jpg', 'image/jpeg'),
+    'WEBP': ('webp', 'image/webp'),
+}
+
+_executor = None
+
+
+class ImageIngestError(Exception):
+    """Картинку не удалось нормализовать."""
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.POST_IMAGE_WORKERS)
+    return _executor
+
+
+def normalize(data, max_side, image_format, quality):
+    """Выполняется в процессе пула: нормализует байты картинки.
+
+    Поворачивает по EXIF, уменьшает до max_side по большей стороне и
+    сохраняет без метаданных. Возвращает (байты, ширина, высота).
+    """
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        output = BytesIO()
+        image.save(
+            output, image_format, quality=quality,
+            optimize=True, progressive=True,
+        )
+        return output.getvalue(), image.width, image.height
+
+
+def ingest(upload):
+    """Нормализует загруженную картинку в пуле процессов.
+
+    Возвращает новый файл и его размеры (ширина, высота).
+    """
+    image_format = settings.POST_IMAGE_FORMAT
+    extension, content_type = FORMATS[image_format]
+    upload.seek(0)
+    future = get_executor().submit(
+        normalize, upload.read(), settings.POST_IMAGE_MAX_SIDE,
+        image_format, settings.POST_IMAGE_QUALITY,
+    )
+    try:
+        data, width, height = future.result(
+            timeout=settings.POST_IMAGE_TIMEOUT)
+    except TimeoutError as error:
+        future.cancel()
+        raise ImageIngestError('Картинка обрабатывается слишком долго') \
+            from error
+    except Exception as error:
+        raise ImageIngestError('Не удалось обработать картинку') from error
+    name = f'{os.path.splitext(upload.name)[0]}.{extension}'
+    return SimpleUploadedFile(name, data, content_type), (width, height)
+
+
+def store(image):
+    """Кладёт в хранилище ещё не сохранённую картинку поля модели.
+
+    Возвращает True, если файл записан. Вызывается до транзакции:
+    повтор занятой базы не должен записывать файл ещё раз.
+    """
+    if not image or image._committed:
+        return False
+    image.save(image.name, image.file, save=False)
+    return True
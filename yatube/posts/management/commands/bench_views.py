@@ -0,0 +1,368 @@
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from http import HTTPStatus
+from http.client import HTTPConnection
+from http.cookies import SimpleCookie
+from importlib import import_module
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY,
+)
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.servers.basehttp import (
+    ThreadedWSGIServer, WSGIRequestHandler,
+)
+from django.db.models import Max, Min
+from django.urls import reverse
+
+from posts import shards
+from posts.models import Group, Post, User
+
+# сценарий: метод и то, чем заполняется адрес
+SCENARIOS = {
+    'index': ('GET', None),
+    'group_posts': ('GET', 'slug'),
+    'profile': ('GET', 'username'),
+    'post_detail': ('GET', 'post_id'),
+    'follow_index': ('GET', None),
+    'add_comment': ('POST', 'post_id'),
+    'post_create': ('POST', None),
+    'search': ('GET', None),
+    'feed_rss': ('GET', None),
+}
+DEFAULT_MIX = (
+    'index=30,group_posts=15,profile=15,post_detail=20,follow_index=10,'
+    'add_comment=5,post_create=5'
+)
+SAMPLE_SIZE: int = 1000  # постов, групп и авторов, к которым идут запросы
+PERCENTILES = (50, 95, 99)
+QUERIES = re.compile(r'db;desc="(\d+) queries"')
+# ожидаемый ответ: чтение отдаёт страницу, запись перенаправляет
+EXPECTED = {'GET': HTTPStatus.OK, 'POST': HTTPStatus.FOUND}
+TIMEOUT: int = 30
+SEARCH_WORDS = ('про', 'мир', 'дом', 'лес', 'кот')
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in SCENARIOS:
+            raise CommandError(
+                f'Неизвестный сценарий {name!r}; есть: '
+                f'{", ".join(SCENARIOS)}')
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f'Некорректный вес сценария {item!r}')
+    return mix
+
+
+def percentile(values, share):
+    """Процентиль по ближайшему рангу для отсортированного списка."""
+    index = min(round(share / 100 * (len(values) - 1)), len(values) - 1)
+    return values[index]
+
+
+def summarize(samples, elapsed):
+    """Сводка по замерам (задержка, число запросов к базе, ошибка)."""
+    latencies = sorted(sample[0] for sample in samples)
+    queries = [sample[1] for sample in samples if sample[1] is not None]
+    summary = {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample[2]),
+        'rps': round(len(samples) / elapsed, 1),
+        'queries': (
+            round(sum(queries) / len(queries), 2) if queries else None),
+    }
+    for share in PERCENTILES:
+        summary[f'p{share}_ms'] = (
+            round(percentile(latencies, share) * 1000, 2)
+            if latencies else None)
+    return summary
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server():
+    """Поднимает приложение из yatube.wsgi на свободном порту."""
+    from yatube.wsgi import application
+    server = ThreadedWSGIServer(('127.0.0.1', 0), QuietHandler)
+    server.set_app(application)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class VirtualUser:
+    """Пользователь нагрузки: своя сессия и CSRF-токен."""
+
+    def __init__(self, address, user):
+        self.address = address
+        store = import_module(settings.SESSION_ENGINE).SessionStore()
+        store[SESSION_KEY] = str(user.pk)
+        store[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        store[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        store.save()
+        self.cookies = {settings.SESSION_COOKIE_NAME: store.session_key}
+        # форма создания поста выдаёт CSRF-cookie; её же значение
+        # принимается и как поле формы
+        self.request('GET', reverse('posts:post_create'))
+        self.csrf_token = self.cookies.get(settings.CSRF_COOKIE_NAME, '')
+
+    def request(self, method, path, data=None):
+        """Возвращает (статус, секунды, число запросов к базе)."""
+        headers = {'Cookie': '; '.join(
+            f'{name}={value}' for name, value in self.cookies.items())}
+        body = None
+        if data is not None:
+            data = dict(data, csrfmiddlewaretoken=self.csrf_token)
+            body = urlencode(data)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            headers['Referer'] = f'http://{self.address[0]}/'
+        connection = HTTPConnection(*self.address, timeout=TIMEOUT)
+        started = time.perf_counter()
+        try:
+            connection.request(method, path, body, headers)
+            response = connection.getresponse()
+            response.read()
+        finally:
+            connection.close()
+        elapsed = time.perf_counter() - started
+        for header in response.headers.get_all('Set-Cookie') or ():
+            for name, morsel in SimpleCookie(header).items():
+                self.cookies[name] = morsel.value
+        match = QUERIES.search(response.getheader('Server-Timing', ''))
+        return (
+            response.status, elapsed, int(match.group(1)) if match else None)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер страниц posts: виртуальные пользователи '
+        'с сессиями параллельно запрашивают смесь сценариев. Выводит '
+        'p50/p95/p99, запросы в секунду и запросы к базе на запрос; '
+        'результаты сохраняются в JSON для сравнения запусков.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--server',
+            help='Адрес запущенного сервера, например http://127.0.0.1:8000; '
+                 'он должен работать с той же базой. По умолчанию '
+                 'приложение запускается в этом процессе',
+        )
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=(
+            f'Сценарии с весами через запятую; есть: {", ".join(SCENARIOS)}'
+        ))
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--users', type=int, default=50,
+            help='Сколько пользователей входит на сайт',
+        )
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Секунд замера на каждом размере данных',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=50,
+            help='Запросов до замера, которые не учитываются',
+        )
+        parser.add_argument(
+            '--sizes',
+            help='Числа постов через запятую: перед замером база '
+                 'дополняется командой seed до каждого из них',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--output', help='Файл JSON с результатами')
+        parser.add_argument(
+            '--compare', help='JSON прошлого запуска для сравнения')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.mix = parse_mix(options['mix'])
+        self.rng = random.Random(options['seed'])
+        server = None
+        if options['server']:
+            url = urlsplit(options['server'])
+            address = (url.hostname, url.port or 80)
+        else:
+            server = start_server()
+            # yatube.wsgi заново настраивает логи; строки о каждом
+            # запросе заглушили бы отчёт
+            logging.getLogger('core.middleware').setLevel(logging.WARNING)
+            address = server.server_address[:2]
+        sizes = [None]
+        if options['sizes']:
+            sizes = sorted(int(size) for size in options['sizes'].split(','))
+        runs = []
+        try:
+            for size in sizes:
+                if size is not None:
+                    self.grow(size)
+                runs.append(self.run(address))
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+        result = {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'server': options['server'] or 'in-process',
+            'concurrency': options['concurrency'],
+            'duration': options['duration'],
+            'mix': self.mix,
+            'runs': runs,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(result, file, ensure_ascii=False, indent=2)
+        if options['compare']:
+            with open(options['compare']) as file:
+                self.compare(json.load(file), result)
+
+    def grow(self, size):
+        """Дополняет базу командой seed до size постов."""
+        missing = size - shards.everywhere(Post.objects.all()).count()
+        if missing <= 0:
+            return
+        self.stdout.write(f'Дополнение базы до {size} постов')
+        call_command(
+            'seed', posts=missing, users=max(missing // 10, 2),
+            comments=missing * 3 // 2, prefix=f'bench-{size}',
+            seed=self.options['seed'], stdout=self.stdout)
+
+    def sample(self, model, field):
+        """До SAMPLE_SIZE значений field у случайных строк model."""
+        if model in shards.SHARDED_MODELS and shards.enabled():
+            # id из последовательности шардов идут не подряд
+            parts = shards.parts(shards.everywhere(model.objects.all()))
+            values = [
+                value for part in parts
+                for value in part.order_by('?').values_list(
+                    field, flat=True)[:SAMPLE_SIZE]
+            ]
+            return self.rng.sample(values, min(len(values), SAMPLE_SIZE))
+        bounds = model.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            return []
+        ids = range(bounds['low'], bounds['high'] + 1)
+        ids = self.rng.sample(ids, min(len(ids), SAMPLE_SIZE))
+        return list(model.objects.filter(
+            id__in=ids).values_list(field, flat=True))
+
+    def run(self, address):
+        self.targets = {
+            'slug': self.sample(Group, 'slug'),
+            'username': self.sample(User, 'username'),
+            'post_id': self.sample(Post, 'id'),
+        }
+        for kind, values in self.targets.items():
+            if not values and any(
+                    SCENARIOS[name][1] == kind for name in self.mix):
+                raise CommandError(
+                    'В базе нет данных для замера: запустите '
+                    'manage.py seed или укажите --sizes')
+        users = User.objects.filter(
+            is_active=True, username__in=self.targets['username'][
+                :self.options['users']])
+        self.clients = [VirtualUser(address, user) for user in users]
+        if not self.clients:
+            raise CommandError('Нет пользователей для входа на сайт')
+        self.samples = defaultdict(list)
+        self.lock = threading.Lock()
+        warmup = random.Random(self.options['seed'])
+        for number in range(self.options['warmup']):
+            self.make_request(
+                warmup, self.clients[number % len(self.clients)])
+        started = time.perf_counter()
+        deadline = started + self.options['duration']
+        threads = [
+            threading.Thread(target=self.worker, args=(number, deadline))
+            for number in range(self.options['concurrency'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        samples = self.samples
+        run = {
+            'posts': shards.everywhere(Post.objects.all()).count(),
+            'users': User.objects.count(),
+            'total': summarize(
+                [sample for values in samples.values() for sample in values],
+                elapsed),
+            'views': {
+                name: summarize(samples[name], elapsed)
+                for name in self.mix if samples[name]
+            },
+        }
+        self.report(run)
+        return run
+
+    def make_request(self, rng, client):
+        """Случайный по весам сценарий: (имя, (секунды, SQL, ошибка))."""
+        name = rng.choices(list(self.mix), list(self.mix.values()))[0]
+        method, kind = SCENARIOS[name]
+        args = [rng.choice(self.targets[kind])] if kind else []
+        path = reverse(f'posts:{name}', args=args)
+        data = None
+        if name == 'search':
+            path += '?' + urlencode({'q': rng.choice(SEARCH_WORDS)})
+        elif method == 'POST':
+            data = {'text': f'Нагрузочный замер {rng.random()}'}
+        try:
+            status, elapsed, queries = client.request(method, path, data)
+            error = status != EXPECTED[method]
+        except OSError:
+            elapsed, queries, error = TIMEOUT, None, True
+        return name, (elapsed, queries, error)
+
+    def worker(self, number, deadline):
+        rng = random.Random(self.options['seed'] + number)
+        client = self.clients[number % len(self.clients)]
+        while time.perf_counter() < deadline:
+            name, sample = self.make_request(rng, client)
+            with self.lock:
+                self.samples[name].append(sample)
+
+    def report(self, run):
+        self.stdout.write(
+            f'\nПостов: {run["posts"]}, пользователей: {run["users"]}')
+        self.stdout.write(
+            f'{"сценарий":<14}{"запросов":>9}{"ошибок":>8}{"rps":>9}'
+            f'{"p50 мс":>9}{"p95 мс":>9}{"p99 мс":>9}{"SQL":>7}')
+        for name, summary in [*run['views'].items(), ('всего', run['total'])]:
+            queries = summary['queries']
+            self.stdout.write(
+                f'{name:<14}{summary["requests"]:>9}{summary["errors"]:>8}'
+                f'{summary["rps"]:>9}{summary["p50_ms"]:>9}'
+                f'{summary["p95_ms"]:>9}{summary["p99_ms"]:>9}'
+                f'{"-" if queries is None else queries:>7}')
+
+    def compare(self, previous, current):
+        """Изменение p95 и rps относительно прошлого запуска."""
+        self.stdout.write('\nСравнение с прошлым запуском (p95, rps):')
+        for old, new in zip(previous['runs'], current['runs']):
+            self.stdout.write(f'Постов: {old["posts"]} -> {new["posts"]}')
+            for name, summary in [*new['views'].items(),
+                                  ('всего', new['total'])]:
+                before = (old['views'].get(name) if name != 'всего'
+                          else old['total'])
+                if not before or not before['p95_ms'] or not before['rps']:
+                    continue
+                p95 = summary['p95_ms'] / before['p95_ms'] - 1
+                rps = summary['rps'] / before['rps'] - 1
+                self.stdout.write(
+                    f'  {name:<14}p95 {p95:+.0%}  rps {rps:+.0%}')
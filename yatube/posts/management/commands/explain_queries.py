@@ -0,0 +1,157 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from posts.feed import entry_posts
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginators import CursorPaginator, FeedCursorPaginator
+from posts.views import COUNT_POSTS, with_related
+
+# индексы из миграций 0009_hot_query_indexes и 0013_feedentry_pub_date
+HOT_INDEXES = (
+    'post_pub_date_id_idx',
+    'post_author_pub_date_idx',
+    'post_group_pub_date_idx',
+    'comment_post_created_idx',
+    'follow_author_user_idx',
+    'feed_user_pub_date_idx',
+)
+BENCH_PREFIX: str = 'explain-'  # префикс имён пользователей и групп
+BATCH_SIZE: int = 500  # больше SQLite не примет в одной вставке
+
+
+class Rollback(Exception):
+    """Откатывает всё, что команда сделала с базой."""
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает планы и время горячих запросов постов с индексами '
+        'и без них. Все изменения базы откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Сколько постов временно добавить перед замерами',
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз выполнять каждый запрос при замере',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['seed']:
+                    self.seed(options['seed'])
+                self.report('С индексами', options['repeat'])
+                with connection.cursor() as cursor:
+                    for name in HOT_INDEXES:
+                        cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
+                self.report('Без индексов', options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count):
+        """Временные авторы, группы, посты, комментарии и подписки."""
+        rng = random.Random(count)
+        User.objects.bulk_create(
+            User(username=f'{BENCH_PREFIX}{number}')
+            for number in range(max(count // 100, 2))
+        )
+        authors = list(User.objects.filter(
+            username__startswith=BENCH_PREFIX).values_list('pk', flat=True))
+        Group.objects.bulk_create(
+            Group(title=f'Группа {number}', slug=f'{BENCH_PREFIX}{number}',
+                  description='')
+            for number in range(max(count // 1000, 2))
+        )
+        groups = list(Group.objects.filter(
+            slug__startswith=BENCH_PREFIX).values_list('pk', flat=True))
+        first_id = (Post.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0) + 1
+        Post.objects.bulk_create(
+            (Post(author_id=rng.choice(authors), group_id=rng.choice(groups),
+                  text=f'Пост {number}')
+             for number in range(count)),
+            batch_size=BATCH_SIZE,
+        )
+        # auto_now_add ставит всем постам одну дату: разносим их по году
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE posts_post SET pub_date = datetime(pub_date, "
+                "'-' || (abs(random()) %% 525600) || ' minutes') "
+                'WHERE id >= %s',
+                [first_id],
+            )
+        post_ids = list(Post.objects.filter(
+            id__gte=first_id).values_list('id', flat=True))
+        Comment.objects.bulk_create(
+            (Comment(post_id=rng.choice(post_ids),
+                     author_id=rng.choice(authors), text='Комментарий')
+             for _ in range(count // 10)),
+            batch_size=BATCH_SIZE,
+        )
+        edges = {
+            (rng.choice(authors), author)
+            for author in authors for _ in range(3)
+        }
+        Follow.objects.bulk_create(
+            (Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in edges if user_id != author_id),
+            batch_size=BATCH_SIZE,
+        )
+
+    def hot_queries(self):
+        """Запросы, которые выполняют страницы ленты."""
+        post = Post.objects.order_by('-pub_date', '-id').first()
+        if post is None:
+            return {}
+        paginator = CursorPaginator(Post.objects.all(), COUNT_POSTS)
+        ordered = paginator.object_list
+        reader = Follow.objects.values_list('user', flat=True).first()
+        queries = {
+            'index': with_related(ordered)[:COUNT_POSTS],
+            'index по курсору': ordered.filter(
+                Q(pub_date__lt=post.pub_date)
+                | Q(pub_date=post.pub_date, id__lt=post.pk)
+            )[:COUNT_POSTS],
+            'group_posts': ordered.filter(
+                group_id=post.group_id)[:COUNT_POSTS],
+            'profile': ordered.filter(
+                author_id=post.author_id)[:COUNT_POSTS],
+            'comments': Comment.objects.filter(post=post),
+            'followers': Follow.objects.filter(
+                author_id=post.author_id).values_list('user_id', flat=True),
+        }
+        if reader is not None:
+            queries['follow_index'] = entry_posts(User(pk=reader)).order_by(
+                *FeedCursorPaginator.ordering)[:COUNT_POSTS]
+        return queries
+
+    def report(self, title, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(title))
+        for name, queryset in self.hot_queries().items():
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            elapsed = (time.perf_counter() - started) / repeat * 1000
+            self.stdout.write(f'{name}: {elapsed:.2f} мс')
+            for line in self.explain(queryset, title):
+                self.stdout.write(f'    {line}')
+
+    def explain(self, queryset, title):
+        """План запроса.
+
+        Комментарий с заголовком делает текст запроса уникальным: иначе
+        sqlite3 возьмёт из кеша соединения план, готовый до DROP INDEX.
+        """
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN /* {title} */ {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
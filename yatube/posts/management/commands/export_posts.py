@@ -0,0 +1,52 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import FORMATS, export, group_content, user_content
+from posts.models import Group, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает посты и комментарии автора или группы в JSONL или CSV, '
+        'с --images — zip-архив вместе с картинками постов.'
+    )
+
+    def add_arguments(self, parser):
+        owner = parser.add_mutually_exclusive_group(required=True)
+        owner.add_argument('--user', help='Имя автора')
+        owner.add_argument('--group', help='Slug группы')
+        parser.add_argument(
+            '--format', choices=list(FORMATS), default='jsonl',
+            help='Формат записей',
+        )
+        parser.add_argument(
+            '--images', action='store_true',
+            help='Собрать zip-архив с записями и картинками постов',
+        )
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл выгрузки; по умолчанию — стандартный вывод',
+        )
+
+    def handle(self, *args, **options):
+        if options['user']:
+            owner = User.objects.filter(username=options['user']).first()
+            content = user_content
+        else:
+            owner = Group.objects.filter(slug=options['group']).first()
+            content = group_content
+        if owner is None:
+            raise CommandError('Автор или группа не найдены')
+        parts = export(
+            *content(owner), options['format'], options['images'])
+        if options['output'] == '-':
+            self.write(sys.stdout.buffer, parts)
+        else:
+            with open(options['output'], 'wb') as output:
+                self.write(output, parts)
+
+    def write(self, output, parts):
+        for part in parts:
+            output.write(part.encode() if isinstance(part, str) else part)
+        output.flush()
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import shards
+from posts.models import Post
+from posts.thumbnails import generate
+
+
+class Command(BaseCommand):
+    help = 'Создаёт недостающие миниатюры картинок у всех постов'
+
+    def handle(self, *args, **options):
+        posts = shards.everywhere(Post.objects.exclude(image=''))
+        count = 0
+        for part in shards.parts(posts):
+            for post_id, name in part.values_list('id', 'image').iterator():
+                generate(post_id, name)
+                count += 1
+        self.stdout.write(
+            self.style.SUCCESS(f'Обработано картинок: {count}'))
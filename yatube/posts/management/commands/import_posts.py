@@ -0,0 +1,341 @@
+import csv
+import json
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import feed, shards, stats, thumbnails
+from posts.cache import bump
+from posts.models import Comment, Follow, Group, Post, User
+
+BATCH_SIZE: int = 500  # больше SQLite не примет в одной вставке
+FORMATS = ('jsonl', 'csv')
+
+
+def batches(items, size):
+    """Делит итератор на списки по size элементов."""
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def read_records(path, file_format):
+    """Записи архива по одной: словари, битая строка — пустой словарь."""
+    with open(path, newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            for row in csv.DictReader(file):
+                yield {key: value for key, value in row.items() if value}
+            return
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            yield record if isinstance(record, dict) else {}
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'некорректная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+@contextmanager
+def keep_dates():
+    """Не даёт auto_now_add заменить даты из архива текущим временем."""
+    fields = [
+        Post._meta.get_field('pub_date'),
+        Comment._meta.get_field('created'),
+    ]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии и подписки из JSONL или CSV '
+        'пачками bulk_create. Каждая порция — отдельная транзакция '
+        'основной базы и шардов, после неё номер записи сохраняется для '
+        '--resume.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл архива .jsonl или .csv')
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файла; по умолчанию — по расширению',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=5000,
+            help='Сколько записей загружать в одной транзакции',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с записи, на которой остановился прошлый запуск',
+        )
+        parser.add_argument(
+            '--state',
+            help='Файл с номером следующей записи; по умолчанию '
+                 '<path>.progress',
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Заводить неизвестных авторов и группы, а не пропускать '
+                 'их записи',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1][1:]
+        if file_format not in FORMATS:
+            raise CommandError(f'Неизвестный формат файла: {file_format}')
+        state = options['state'] or f'{path}.progress'
+        done = 0
+        if os.path.exists(state):
+            if not options['resume']:
+                raise CommandError(
+                    f'Прошлый запуск не закончен ({state}): продолжите его '
+                    f'с --resume или удалите этот файл'
+                )
+            with open(state) as file:
+                done = int(file.read())
+            self.stdout.write(f'Продолжение с записи {done + 1}')
+        self.create_missing = options['create_missing']
+        self.user_ids = {}
+        self.group_ids = {}
+        counts = Counter()
+        started = time.perf_counter()
+        records = islice(read_records(path, file_format), done, None)
+        with keep_dates():
+            for chunk in batches(records, options['chunk_size']):
+                try:
+                    with shards.atomic():
+                        scopes = self.import_chunk(chunk, done, counts)
+                except IntegrityError as error:
+                    raise CommandError(
+                        f'Записи {done + 1}-{done + len(chunk)} не '
+                        f'загружены: {error}. Исправьте их и запустите '
+                        f'команду с --resume'
+                    )
+                bump(*scopes)
+                done += len(chunk)
+                with open(state, 'w') as file:
+                    file.write(str(done))
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'{done} записей, {sum(counts.values()) / elapsed:.0f} '
+                    f'записей/с')
+        if os.path.exists(state):
+            os.remove(state)
+        self.stdout.write(self.style.SUCCESS(
+            f'Постов: {counts["post"]}, комментариев: {counts["comment"]}, '
+            f'подписок: {counts["follow"]}, пропущено: {counts["skipped"]} '
+            f'за {time.perf_counter() - started:.1f} с'
+        ))
+
+    def resolve(self, ids, model, field, names, create):
+        """Дополняет кеш ids (имя -> id) недостающими именами."""
+        missing = list({name for name in names if name and name not in ids})
+        for batch in batches(missing, BATCH_SIZE):
+            ids.update(model.objects.filter(
+                **{f'{field}__in': batch}).values_list(field, 'pk'))
+        if self.create_missing:
+            for name in missing:
+                if name not in ids:
+                    ids[name] = create(name).pk
+
+    def import_chunk(self, chunk, first, counts):
+        """Загружает порцию записей; возвращает области кеша для сброса."""
+        self.resolve(
+            self.user_ids, User, 'username',
+            [r.get(key) for r in chunk for key in ('author', 'user')],
+            lambda name: User.objects.create_user(username=name),
+        )
+        self.resolve(
+            self.group_ids, Group, 'slug', [r.get('group') for r in chunk],
+            lambda name: Group.objects.create(
+                title=name, slug=name, description=''),
+        )
+        builders = {
+            'post': self.build_post,
+            'comment': self.build_comment,
+            'follow': self.build_follow,
+        }
+        built = {kind: [] for kind in builders}
+        for number, record in enumerate(chunk, first + 1):
+            kind = record.get('type')
+            try:
+                if kind not in builders:
+                    raise ValueError(f'неизвестный тип записи {kind!r}')
+                built[kind].append(builders[kind](record))
+            except KeyError as error:
+                self.skip(number, f'нет поля {error}', counts)
+            except ValueError as error:
+                self.skip(number, error, counts)
+        posts = self.save_posts(built['post'])
+        comments = self.save_comments(built['comment'], posts, counts)
+        follows = built['follow']
+        Follow.objects.bulk_create(
+            follows, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        counts.update(post=len(posts), follow=len(follows))
+        self.update_derived(posts, follows)
+        return self.scopes(posts, comments, follows)
+
+    def skip(self, number, reason, counts):
+        counts['skipped'] += 1
+        self.stderr.write(f'Запись {number} пропущена: {reason}')
+
+    def get_id(self, ids, name, title):
+        if name not in ids:
+            raise ValueError(f'{title} {name!r} не найден')
+        return ids[name]
+
+    def build_post(self, record):
+        group = record.get('group')
+        post = Post(
+            id=int(record['id']) if record.get('id') else None,
+            author_id=self.get_id(self.user_ids, record['author'], 'автор'),
+            group_id=(
+                self.get_id(self.group_ids, group, 'группа') if group
+                else None
+            ),
+            text=record['text'],
+            image=record.get('image', ''),
+            pub_date=parse_date(record.get('pub_date')),
+        )
+        if shards.enabled() and post.id and shards.is_sequence_id(post.id):
+            if shards.bucket_for(post) != post.id & shards.BUCKET_MASK:
+                raise ValueError(f'id {post.id} указывает на шард не автора')
+        return post
+
+    def build_comment(self, record):
+        return Comment(
+            post_id=int(record['post']),
+            author_id=self.get_id(self.user_ids, record['author'], 'автор'),
+            text=record['text'],
+            created=parse_date(record.get('created')),
+        )
+
+    def build_follow(self, record):
+        user_id = self.get_id(self.user_ids, record['user'], 'подписчик')
+        author_id = self.get_id(self.user_ids, record['author'], 'автор')
+        if user_id == author_id:
+            raise ValueError('подписка на самого себя')
+        return Follow(user_id=user_id, author_id=author_id)
+
+    def save_posts(self, posts):
+        """Вставляет посты; id без архивного берётся после наибольшего.
+
+        SQLite не возвращает id из bulk_create, а они нужны лентам и
+        комментариям, поэтому id назначаются заранее.
+        """
+        if shards.enabled():
+            return self.save_sharded_posts(posts)
+        last_id = max(
+            [Post.objects.aggregate(last=Max('id'))['last'] or 0]
+            + [post.id for post in posts if post.id]
+        )
+        for post in posts:
+            if not post.id:
+                last_id += 1
+                post.id = last_id
+        Post.objects.bulk_create(posts, batch_size=BATCH_SIZE)
+        return posts
+
+    def save_sharded_posts(self, posts):
+        """Вставляет посты в шарды их авторов.
+
+        Новые id выдаёт последовательность шардов. Уникальность id база
+        шарда проверяет только у себя, поэтому архивные id ищутся во всех
+        базах, а выданные последовательностью — сдвигают её.
+        """
+        archived = [post.id for post in posts if post.id]
+        for batch in batches(archived, BATCH_SIZE):
+            taken = self.existing_post_ids(batch)
+            if taken:
+                raise IntegrityError(
+                    f'посты с id {sorted(taken)} уже есть')
+        tickets = [
+            post_id >> shards.BUCKET_BITS for post_id in archived
+            if shards.is_sequence_id(post_id)
+        ]
+        if tickets:
+            shards.reserve_ticket(Post, max(tickets))
+        shards.bulk_create(Post, posts, BATCH_SIZE)
+        return posts
+
+    def existing_post_ids(self, post_ids):
+        """id из post_ids, посты с которыми уже есть в базе или шардах."""
+        return {
+            post_id
+            for alias in [shards.PRIMARY, *settings.POST_SHARDS]
+            for post_id in Post.objects.using(alias).filter(
+                id__in=post_ids).values_list('id', flat=True)
+        }
+
+    def save_comments(self, comments, posts, counts):
+        """Вставляет комментарии к существующим постам, прочие пропускает."""
+        post_ids = {post.id for post in posts}
+        wanted = list({comment.post_id for comment in comments} - post_ids)
+        for batch in batches(wanted, BATCH_SIZE):
+            post_ids.update(self.existing_post_ids(batch))
+        kept = [comment for comment in comments if comment.post_id in post_ids]
+        counts.update(comment=len(kept), skipped=len(comments) - len(kept))
+        shards.bulk_create(Comment, kept, BATCH_SIZE)
+        return kept
+
+    def update_derived(self, posts, follows):
+        """То, что при save() делают сигналы: счётчики, ленты, миниатюры.
+
+        Поисковый индекс обновляют триггеры базы.
+        """
+        user_ids = {post.author_id for post in posts}
+        for follow in follows:
+            user_ids.update((follow.user_id, follow.author_id))
+        for batch in batches(user_ids, BATCH_SIZE):
+            stats.refresh(batch)
+        for batch in batches(posts, BATCH_SIZE):
+            feed.fan_out_many(
+                (post.id, post.author_id, post.pub_date) for post in batch)
+        for follow in follows:
+            feed.backfill(follow.user_id, follow.author_id)
+        for post in posts:
+            if post.image:
+                thumbnails.schedule(post.id, post.image.name)
+
+    def scopes(self, posts, comments, follows):
+        usernames = {pk: name for name, pk in self.user_ids.items()}
+        slugs = {pk: slug for slug, pk in self.group_ids.items()}
+        user_ids = {post.author_id for post in posts}
+        for follow in follows:
+            user_ids.update((follow.user_id, follow.author_id))
+        scopes = {'posts'} if posts else set()
+        for user_id in user_ids:
+            scopes.update(
+                (f'user:{user_id}', f'profile:{usernames[user_id]}'))
+        scopes.update(
+            f'group:{slugs[post.group_id]}' for post in posts if post.group_id)
+        scopes.update(f'post:{comment.post_id}' for comment in comments)
+        return scopes
@@ -0,0 +1,99 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from posts import shards
+from posts.cache import bump, user_scopes
+from posts.models import Comment, Group, Post
+
+from .import_posts import BATCH_SIZE
+
+
+def move(posts, source, target):
+    """Переносит посты вместе с комментариями из source в target.
+
+    Сначала строки вставляются в target, потом удаляются из source,
+    поэтому после сбоя команду можно просто запустить снова. Удаление
+    идёт в обход сигналов: пост лишь переезжает, счётчики не меняются.
+    """
+    post_ids = [post.pk for post in posts]
+    comments = list(Comment.objects.using(source).filter(post_id__in=post_ids))
+    with transaction.atomic(using=target):
+        Post.objects.using(target).bulk_create(posts, ignore_conflicts=True)
+        Comment.objects.using(target).bulk_create(
+            comments, ignore_conflicts=True)
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    with transaction.atomic(using=source), \
+            connections[source].cursor() as cursor:
+        # записи лент остаются: id поста при переносе не меняется
+        for model, column in ((Comment, 'post_id'), (Post, 'id')):
+            cursor.execute(
+                f'DELETE FROM {model._meta.db_table} '
+                f'WHERE {column} IN ({placeholders})', post_ids)
+    return len(comments)
+
+
+def misplaced(source, chunk_size):
+    """Пачки постов source, чей шард по автору другой: (шард, посты)."""
+    last_id = 0
+    while True:
+        posts = list(Post.objects.using(source).filter(
+            id__gt=last_id).order_by('id')[:chunk_size])
+        if not posts:
+            return
+        last_id = posts[-1].pk
+        targets = defaultdict(list)
+        for post in posts:
+            target = shards.shard_for_author(post.author_id)
+            if target != source:
+                targets[target].append(post)
+        yield from targets.items()
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит посты и комментарии в шарды их авторов: после '
+        'включения шардирования или смены числа шардов POST_SHARDS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=BATCH_SIZE,
+            help='Сколько постов переносить за один проход',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, сколько постов переедет',
+        )
+
+    def handle(self, *args, **options):
+        if not shards.enabled():
+            raise CommandError('Шардирование выключено: POST_SHARDS пуст')
+        chunk_size = min(options['chunk_size'], BATCH_SIZE)
+        moved = Counter()
+        comments = 0
+        author_ids = set()
+        group_ids = set()
+        for source in [shards.PRIMARY, *settings.POST_SHARDS]:
+            for target, batch in misplaced(source, chunk_size):
+                moved[source, target] += len(batch)
+                author_ids.update(post.author_id for post in batch)
+                group_ids.update(post.group_id for post in batch)
+                if not options['dry_run']:
+                    comments += move(batch, source, target)
+        for (source, target), count in sorted(moved.items()):
+            self.stdout.write(f'{source} -> {target}: {count}')
+        if options['dry_run']:
+            return
+        slugs = Group.objects.filter(
+            pk__in=group_ids).values_list('slug', flat=True)
+        bump(
+            'posts', *(f'group:{slug}' for slug in slugs),
+            *(scope for author_id in author_ids
+              for scope in user_scopes(author_id)),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено постов: {sum(moved.values())}, '
+            f'комментариев: {comments}'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Сверяет счётчики постов и подписок пользователей с базой'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Сколько пользователей сверять за один проход',
+        )
+
+    def handle(self, *args, **options):
+        fixed = reconcile(options['chunk_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Исправлено счётчиков: {fixed}'))
@@ -0,0 +1,378 @@
+import random
+import time
+from array import array
+from bisect import bisect
+from datetime import datetime, timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from posts import feed, shards, thumbnails
+from posts.cache import bump
+from posts.management.commands.import_posts import (
+    BATCH_SIZE, batches, keep_dates,
+)
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+SYLLABLES = (
+    'ба', 'ве', 'ги', 'до', 'жу', 'за', 'ки', 'ла', 'ме', 'но', 'по', 'ру',
+    'са', 'то', 'ух', 'фе', 'хо', 'це', 'ча', 'ши', 'ют', 'ян', 'ск', 'ст',
+    'про', 'пре', 'вер', 'мир', 'дом', 'лес', 'кот', 'ход',
+)
+VOCABULARY_SIZE: int = 5000  # слов в словаре текстов
+VOCABULARY_SEED: int = 0  # словарь одинаков при любом --seed
+SENTENCE_WORDS: int = 12  # средняя длина предложения
+# логнормальные длины текстов в словах: медиана exp(mu)
+POST_WORDS = (3.3, 1.0)
+COMMENT_WORDS = (2.3, 0.8)
+MAX_WORDS: int = 1000
+COMMENT_DELAY_HOURS: int = 48  # средняя задержка комментария после поста
+GROUP_SHARE: float = 0.7  # доля постов в группах
+IMAGE_VARIANTS: int = 8  # разных картинок на все посты с картинками
+IMAGE_SIZE = (960, 640)
+
+
+def zipf_weights(count, alpha):
+    """Накопленные веса степенного закона для ранга 1..count."""
+    return array('d', accumulate(
+        1 / rank ** alpha for rank in range(1, count + 1)))
+
+
+def make_vocabulary():
+    rng = random.Random(VOCABULARY_SEED)
+    words = set()
+    while len(words) < VOCABULARY_SIZE:
+        words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(1, 4))))
+    return sorted(words)
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками для нагрузочных замеров. Одинаковые '
+        '--seed и --end дают одинаковые данные.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows', type=float, default=10,
+            help='Сколько авторов в среднем читает пользователь',
+        )
+        parser.add_argument(
+            '--images', type=float, default=0,
+            help='Доля постов с картинкой',
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.0,
+            help='Показатель степенного закона популярности авторов, '
+                 'активности и обсуждаемости постов',
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--end',
+            help='Дата последнего поста YYYY-MM-DD; по умолчанию сегодня',
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до --end распределены посты',
+        )
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Начало имён пользователей и слагов групп',
+        )
+        parser.add_argument(
+            '--password', default='seed-password',
+            help='Пароль всех созданных пользователей',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=20000,
+            help='Сколько строк вставлять в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username=f'{prefix}-0').exists():
+            raise CommandError(
+                f'Данные с префиксом {prefix!r} уже есть: выберите другой '
+                f'--prefix')
+        if options['users'] < 2:
+            raise CommandError('Нужно хотя бы два пользователя')
+        self.options = options
+        self.chunk_size = options['chunk_size']
+        self.rng = random.Random(options['seed'])
+        self.words = make_vocabulary()
+        self.word_weights = zipf_weights(len(self.words), 1.0)
+        end = timezone.now().replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        if options['end']:
+            end = timezone.make_aware(
+                datetime.strptime(options['end'], '%Y-%m-%d'))
+        self.start = end - timedelta(days=options['days'])
+        self.end = end
+        started = time.perf_counter()
+        with keep_dates():
+            user_ids = self.create_users()
+            group_ids = self.create_groups()
+            self.create_follows(user_ids)
+            post_dates = self.create_posts(user_ids, group_ids)
+            self.create_comments(user_ids, post_dates)
+            self.create_stats(user_ids)
+            self.fan_out()
+        bump('posts')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с'))
+
+    def report(self, name, count, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'{name}: {count} за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-9):.0f} строк/с)')
+
+    def next_id(self, model):
+        return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+    def save(self, model, objects):
+        """Вставляет объекты порциями по транзакции на порцию; посты и
+        комментарии — в их шарды."""
+        for chunk in batches(objects, self.chunk_size):
+            if model in shards.SHARDED_MODELS:
+                shards.bulk_create(model, chunk, BATCH_SIZE)
+            else:
+                model.objects.bulk_create(chunk, batch_size=BATCH_SIZE)
+
+    def ranked(self, count):
+        """Случайная перестановка 0..count-1 и веса рангов: популярность
+        достаётся не первым id, а случайным."""
+        order = array('l', range(count))
+        self.rng.shuffle(order)
+        return order, zipf_weights(count, self.options['alpha'])
+
+    def pick(self, order, weights):
+        """Элемент перестановки order, выбранный по весам рангов."""
+        rank = bisect(weights, self.rng.random() * weights[-1])
+        return order[min(rank, len(order) - 1)]
+
+    def text(self, mu, sigma):
+        count = min(max(int(self.rng.lognormvariate(mu, sigma)), 1),
+                    MAX_WORDS)
+        words = self.rng.choices(
+            self.words, cum_weights=self.word_weights, k=count)
+        sentences = []
+        start = 0
+        while start < count:
+            end = start + max(
+                int(self.rng.expovariate(1 / SENTENCE_WORDS)), 1)
+            sentences.append(' '.join(words[start:end]).capitalize() + '.')
+            start = end
+        return ' '.join(sentences)
+
+    def create_users(self):
+        started = time.perf_counter()
+        first_id = self.next_id(User)
+        count = self.options['users']
+        # хеш пароля медленный, поэтому он один на всех
+        password = make_password(
+            self.options['password'], salt=self.options['prefix'])
+        self.save(User, (
+            User(
+                id=first_id + number,
+                username=f'{self.options["prefix"]}-{number}',
+                password=password,
+                date_joined=self.start,
+            )
+            for number in range(count)
+        ))
+        self.report('Пользователей', count, started)
+        return range(first_id, first_id + count)
+
+    def create_groups(self):
+        started = time.perf_counter()
+        first_id = self.next_id(Group)
+        count = self.options['groups']
+        prefix = self.options['prefix']
+        self.save(Group, (
+            Group(
+                id=first_id + number,
+                title=f'Группа {prefix} {number}',
+                slug=f'{prefix}-{number}',
+                description=self.text(*COMMENT_WORDS),
+            )
+            for number in range(count)
+        ))
+        self.report('Групп', count, started)
+        return range(first_id, first_id + count)
+
+    def create_follows(self, user_ids):
+        """Подписки: число подписчиков автора распределено по степенному
+        закону, число подписок пользователя — около --follows."""
+        started = time.perf_counter()
+        count = len(user_ids)
+        authors, weights = self.ranked(count)
+        mean = min(self.options['follows'], count - 1)
+        self.followers = array('l', bytes(count * array('l').itemsize))
+        self.following = array('l', bytes(count * array('l').itemsize))
+        total = 0
+
+        def follows():
+            nonlocal total
+            for user in range(count):
+                wanted = min(int(self.rng.expovariate(1 / mean)) if mean
+                             else 0, count - 1)
+                chosen = set()
+                # у популярных авторов повторы часты: попыток с запасом
+                for _ in range(wanted * 4):
+                    if len(chosen) == wanted:
+                        break
+                    author = self.pick(authors, weights)
+                    if author != user:
+                        chosen.add(author)
+                for author in sorted(chosen):
+                    self.followers[author] += 1
+                    yield Follow(
+                        user_id=user_ids[user], author_id=user_ids[author])
+                self.following[user] = len(chosen)
+                total += len(chosen)
+
+        self.save(Follow, follows())
+        self.report('Подписок', total, started)
+
+    def create_posts(self, user_ids, group_ids):
+        """Посты по возрастанию даты: промежутки между ними случайны."""
+        started = time.perf_counter()
+        count = self.options['posts']
+        sharded = shards.enabled()
+        # с шардами номера постов берутся из последовательности разом
+        first_id = (
+            shards.next_ticket(Post, count) if sharded and count
+            else self.next_id(Post))
+        authors, author_weights = self.ranked(len(user_ids))
+        groups, group_weights = (
+            self.ranked(len(group_ids)) if group_ids else (None, None))
+        self.posts = array('l', bytes(len(user_ids) * array('l').itemsize))
+        images = self.create_images() if self.options['images'] else []
+        mean_gap = (self.end - self.start).total_seconds() / max(count, 1)
+        # id и даты постов нужны комментариям, даты — в секундах от
+        # начала периода
+        self.post_ids = array('q')
+        dates = array('d')
+        image_posts = {}
+
+        def posts():
+            moment = 0.0
+            for number in range(count):
+                moment += self.rng.expovariate(1 / mean_gap)
+                dates.append(moment)
+                author = self.pick(authors, author_weights)
+                self.posts[author] += 1
+                group_id = None
+                if groups is not None and self.rng.random() < GROUP_SHARE:
+                    group_id = group_ids[self.pick(groups, group_weights)]
+                image = {}
+                if images and self.rng.random() < self.options['images']:
+                    name, width, height = self.rng.choice(images)
+                    image = {
+                        'image': name,
+                        'image_width': width,
+                        'image_height': height,
+                    }
+                post = Post(
+                    author_id=user_ids[author],
+                    group_id=group_id,
+                    text=self.text(*POST_WORDS),
+                    pub_date=self.start + timedelta(seconds=moment),
+                    **image,
+                )
+                post.id = (
+                    shards.id_for(post, first_id + number) if sharded
+                    else first_id + number)
+                self.post_ids.append(post.id)
+                if image:
+                    image_posts.setdefault(image['image'], post.id)
+                yield post
+
+        self.save(Post, posts())
+        for name, post_id in image_posts.items():
+            thumbnails.generate(post_id, name)
+        self.report('Постов', count, started)
+        return dates
+
+    def create_images(self):
+        """Несколько картинок, общих для всех постов: миллион файлов не
+        нужен, чтобы нагрузить миниатюры и шаблоны."""
+        images = []
+        for number in range(IMAGE_VARIANTS):
+            color = tuple(self.rng.randrange(256) for _ in range(3))
+            image = Image.new('RGB', IMAGE_SIZE, color)
+            draw = ImageDraw.Draw(image)
+            for _ in range(10):
+                x, y = (self.rng.randrange(side) for side in IMAGE_SIZE)
+                draw.ellipse(
+                    (x, y, x + IMAGE_SIZE[1] // 4, y + IMAGE_SIZE[1] // 4),
+                    fill=tuple(self.rng.randrange(256) for _ in range(3)))
+            output = BytesIO()
+            image.save(output, 'JPEG', quality=80)
+            name = default_storage.save(
+                f'posts/{self.options["prefix"]}-{number}.jpg',
+                ContentFile(output.getvalue()))
+            images.append((name, *IMAGE_SIZE))
+        return images
+
+    def create_comments(self, user_ids, post_dates):
+        """Комментарии: обсуждаемость постов распределена по степенному
+        закону, комментарий пишется вскоре после поста."""
+        started = time.perf_counter()
+        count = self.options['comments']
+        if not post_dates:
+            return
+        posts, weights = self.ranked(len(post_dates))
+        limit = (self.end - self.start).total_seconds()
+        self.save(Comment, (
+            Comment(
+                post_id=self.post_ids[post],
+                author_id=self.rng.choice(user_ids),
+                text=self.text(*COMMENT_WORDS),
+                created=self.start + timedelta(seconds=min(
+                    post_dates[post] + self.rng.expovariate(
+                        1 / (COMMENT_DELAY_HOURS * 3600)),
+                    max(limit, post_dates[post]))),
+            )
+            for post in (self.pick(posts, weights) for _ in range(count))
+        ))
+        self.report('Комментариев', count, started)
+
+    def create_stats(self, user_ids):
+        """Счётчики профилей по уже подсчитанным при генерации числам."""
+        self.save(UserStats, (
+            UserStats(
+                user_id=user_id,
+                posts_count=self.posts[index],
+                followers_count=self.followers[index],
+                following_count=self.following[index],
+            )
+            for index, user_id in enumerate(user_ids)
+        ))
+
+    def fan_out(self):
+        """Раскладывает посты по лентам подписчиков, как при публикации."""
+        started = time.perf_counter()
+        if not self.post_ids:
+            return
+        posts = shards.everywhere(
+            Post.objects.filter(id__gte=self.post_ids[0]))
+        for part in shards.parts(posts):
+            rows = part.order_by('id').values_list(
+                'id', 'author_id', 'pub_date')
+            for chunk in batches(rows.iterator(), self.chunk_size):
+                feed.fan_out_many(chunk)
+        self.report('Постов разослано по лентам', len(self.post_ids), started)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from posts.feed import trim_all
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из лент подписок записи старше FEED_MAX_ENTRIES '
+        'последних'
+    )
+
+    def handle(self, *args, **options):
+        deleted = trim_all()
+        self.stdout.write(
+            self.style.SUCCESS(f'Удалено записей лент: {deleted}'))
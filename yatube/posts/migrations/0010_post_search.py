@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:48
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """Полнотекстовый индекс FTS5 по тексту постов.
+
+    Триггеры синхронизации ставит posts.search.install_triggers после
+    каждого migrate.
+    """
+
+    dependencies = [
+        ('posts', '0009_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+                "text, content='posts_post', content_rowid='id')",
+                "INSERT INTO posts_post_fts(posts_post_fts) "
+                "VALUES ('rebuild')",
+            ],
+            reverse_sql=[
+                'DROP TRIGGER IF EXISTS posts_post_fts_ai',
+                'DROP TRIGGER IF EXISTS posts_post_fts_ad',
+                'DROP TRIGGER IF EXISTS posts_post_fts_au',
+                'DROP TABLE posts_post_fts',
+            ],
+        ),
+    ]
@@ -16,6 +16,17 @@ class Group(models.Model):
         return self.title
 
 
+class RoutedQuerySet(models.QuerySet):
+    """create() без using() выбирает базу по самому объекту, как save():
+    с шардами пост попадает в шард своего автора."""
+
+    def create(self, **kwargs):
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Текст поста',
@@ -42,12 +53,36 @@ class Post(models.Model):
         verbose_name='Картинка',
         help_text='Картина для поста.'
     )
+    image_width = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Ширина картинки',
+    )
+    image_height = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name='Высота картинки',
+    )
+
+    objects = RoutedQuerySet.as_manager()
 
     def __str__(self):
         return self.text[:COUNT_OF_CHAR]
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='post_pub_date_id_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'),
+        ]
 
 
 class Comment(models.Model):
@@ -64,8 +99,14 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = RoutedQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(
+                fields=['post', '-created'], name='comment_post_created_idx'),
+        ]
 
 
 class Follow(models.Model):
@@ -86,3 +127,57 @@ class Follow(models.Model):
                 fields=['user', 'author'],
                 name='user_and_author_unique_together')
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='follow_author_user_idx'),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Запись ленты подписок: пост автора, разосланный подписчику."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+    )
+    # с шардами посты лежат не в основной базе, где хранятся ленты
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        db_constraint=False,
+    )
+    # копия pub_date поста: лента листается по индексу без JOIN
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='user_and_post_unique_together')
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx'),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые выводятся в шапке профайла."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+
+class IdSequence(models.Model):
+    """Последовательность id постов или комментариев, общая для шардов."""
+    name = models.CharField(max_length=100, primary_key=True)
+    first = models.BigIntegerField()
+    last = models.BigIntegerField()
@@ -0,0 +1,216 @@
+import base64
+import binascii
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .cache import get_versions
+
+CURSOR_AFTER: str = 'a'  # страница после курсора
+CURSOR_BEFORE: str = 'b'  # страница перед курсором
+COUNT_KEY: str = 'count:{}'
+PAGES_ON_EACH_SIDE: int = 3  # номера страниц вокруг текущей
+ELLIPSIS: str = '…'
+
+
+def encode_cursor(direction, key):
+    """Непрозрачный токен курсора: направление и значения ключа."""
+    raw = '|'.join([direction, *(str(value) for value in key)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (direction, значения ключа) или None для битого токена."""
+    try:
+        padding = '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(token + padding).decode()
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    direction, *values = raw.split('|')
+    if direction not in (CURSOR_AFTER, CURSOR_BEFORE):
+        return None
+    return direction, values
+
+
+class CursorPage(Page):
+    """Страница, выбранная по курсору: без номера и без COUNT(*)."""
+
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = None
+        self.previous_cursor = None
+        if has_next:
+            self.next_cursor = paginator.encode(CURSOR_AFTER, self[-1])
+        if has_previous and object_list:
+            self.previous_cursor = paginator.encode(CURSOR_BEFORE, self[0])
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор постов по ключу (pub_date, id).
+
+    Номерные страницы работают как раньше, а страницы по курсору
+    выбираются условием по ключу без COUNT(*) и OFFSET.
+
+    Если передана область кеша scope, число постов хранится в кеше до
+    смены её версии. Без области COUNT(*) ограничен
+    PAGINATOR_COUNT_LIMIT строками, и при большем числе постов
+    count — оценка снизу, а count_is_estimate истинно.
+    """
+
+    ordering = ('-pub_date', '-id')
+
+    def __init__(self, object_list, per_page, scope=None, **kwargs):
+        object_list = object_list.order_by(*self.ordering)
+        super().__init__(object_list, per_page, **kwargs)
+        self.scope = scope
+        self.count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        if self.scope is None:
+            return self._count_limited()
+        sql, params = self.object_list.query.sql_with_params()
+        raw = '|'.join(
+            [sql, repr(params), *map(str, get_versions([self.scope]))])
+        key = COUNT_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, settings.PAGE_CACHE_TIMEOUT)
+        return count
+
+    def _count_limited(self):
+        limit = settings.PAGINATOR_COUNT_LIMIT
+        count = self.object_list[:limit + 1].count()
+        if count > limit:
+            self.count_is_estimate = True
+            return limit
+        return count
+
+    def page_window(self, number):
+        """Номера страниц: первая, последняя и по три вокруг текущей."""
+        last = self.num_pages
+        window = range(
+            max(number - PAGES_ON_EACH_SIDE, 1),
+            min(number + PAGES_ON_EACH_SIDE, last) + 1,
+        )
+        pages = []
+        if window[0] > 1:
+            pages.append(1)
+            if window[0] > 2:
+                pages.append(ELLIPSIS)
+        pages.extend(window)
+        if self.count_is_estimate:
+            # за оценкой есть ещё страницы, но последняя неизвестна
+            pages.append(ELLIPSIS)
+        elif window[-1] < last:
+            if window[-1] < last - 1:
+                pages.append(ELLIPSIS)
+            pages.append(last)
+        return pages
+
+    def get_key(self, obj):
+        return obj.pub_date.isoformat(), obj.pk
+
+    def parse_key(self, values):
+        pub_date, pk = values
+        pub_date = parse_datetime(pub_date)
+        if pub_date is None:
+            raise ValueError('Некорректная дата в курсоре')
+        return pub_date, int(pk)
+
+    def key_filter(self, key, lookup):
+        """Условие «ключ строки lookup key» по полям ordering.
+
+        Лишнее условие на дату с равенством даёт SQLite границу
+        диапазона в индексе: без него OR читает индекс с начала.
+        """
+        date_field, id_field = (field.lstrip('-') for field in self.ordering)
+        pub_date, pk = key
+        return Q(**{f'{date_field}__{lookup}e': pub_date}) & (
+            Q(**{f'{date_field}__{lookup}': pub_date})
+            | Q(**{date_field: pub_date, f'{id_field}__{lookup}': pk})
+        )
+
+    def after(self, queryset, key):
+        return queryset.filter(self.key_filter(key, 'lt'))
+
+    def before(self, queryset, key):
+        return queryset.filter(self.key_filter(key, 'gt'))
+
+    def encode(self, direction, obj):
+        return encode_cursor(direction, self.get_key(obj))
+
+    def page(self, number):
+        """Номерная страница со ссылками на соседей по курсору."""
+        page = super().page(number)
+        page.page_window = self.page_window(page.number)
+        page.next_cursor = None
+        page.previous_cursor = None
+        if page.has_next() or self.count_is_estimate and len(page):
+            page.next_cursor = self.encode(CURSOR_AFTER, page[-1])
+        if page.has_previous():
+            page.previous_cursor = self.encode(CURSOR_BEFORE, page[0])
+        return page
+
+    def get_cursor_page(self, token):
+        """Страница по курсору; пустой или битый курсор — первая."""
+        cursor = decode_cursor(token) if token else None
+        if cursor is None:
+            return self._first_page()
+        direction, values = cursor
+        try:
+            key = self.parse_key(values)
+        except ValueError:
+            return self._first_page()
+        if direction == CURSOR_AFTER:
+            rows = list(
+                self.after(self.object_list, key)[:self.per_page + 1])
+            return CursorPage(
+                rows[:self.per_page], self,
+                has_next=len(rows) > self.per_page, has_previous=True,
+            )
+        rows = list(
+            self.before(self.object_list.reverse(), key)[:self.per_page + 1])
+        if len(rows) <= self.per_page:
+            return self._first_page()
+        return CursorPage(
+            rows[:self.per_page][::-1], self,
+            has_next=True, has_previous=True,
+        )
+
+    def _first_page(self):
+        rows = list(self.object_list[:self.per_page + 1])
+        return CursorPage(
+            rows[:self.per_page], self,
+            has_next=len(rows) > self.per_page, has_previous=False,
+        )
+
+
+class FeedCursorPaginator(CursorPaginator):
+    """Лента подписок по ключу записи ленты (feed_date, feed_post).
+
+    Ключ совпадает с (pub_date, id) поста, но сортировка и условие
+    курсора идут по столбцам FeedEntry и индексу
+    (user, -pub_date, -post).
+    """
+
+    ordering = ('-feed_date', '-feed_post')
@@ -0,0 +1,117 @@
+import re
+
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+from .paginators import CursorPaginator
+
+FTS_TABLE: str = 'posts_post_fts'
+# маркеры совпадений в сниппете: заменяются на <mark> после экранирования
+MARK_START: str = '\x02'
+MARK_END: str = '\x03'
+SNIPPET_TOKENS: int = 24  # длина сниппета в словах
+
+# внешний контент FTS5 синхронизируется с posts_post триггерами; SQLite
+# теряет их при пересоздании таблицы в миграциях, поэтому они ставятся
+# заново после каждого migrate
+FTS_TRIGGERS = (
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai
+    AFTER INSERT ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad
+    AFTER DELETE ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF text ON posts_post BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+    END''',
+)
+
+
+def install_triggers(connection):
+    """Ставит триггеры синхронизации, если индекс уже создан."""
+    if connection.vendor != 'sqlite':
+        return
+    if FTS_TABLE not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        for sql in FTS_TRIGGERS:
+            cursor.execute(sql)
+
+
+def build_match(query):
+    """Запрос FTS5 из пользовательской строки: все слова как префиксы."""
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def matching_ids(query):
+    """Подзапрос id постов, подходящих под строку поиска."""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (build_match(query),),
+    )
+
+
+def search_posts(query):
+    """Посты по строке поиска с рангом bm25 и сниппетом."""
+    match = build_match(query)
+    if not match:
+        return Post.objects.none()
+    return Post.objects.extra(
+        tables=[FTS_TABLE],
+        where=[
+            f'{FTS_TABLE}.rowid = posts_post.id',
+            f'{FTS_TABLE} MATCH %s',
+        ],
+        params=[match],
+        select={
+            'rank': f'bm25({FTS_TABLE})',
+            'snippet': (
+                f"snippet({FTS_TABLE}, 0, '{MARK_START}', '{MARK_END}', "
+                f"'…', {SNIPPET_TOKENS})"
+            ),
+        },
+    )
+
+
+class SearchPaginator(CursorPaginator):
+    """Курсор по рангу: сначала лучшие совпадения, при равенстве новые.
+
+    У каждого шарда свой индекс, и bm25 считается по его постам, так что
+    при слиянии шардов ранги сравнимы лишь приближённо.
+    """
+
+    ordering = ('rank', '-id')
+
+    def get_key(self, obj):
+        return repr(obj.rank), obj.pk
+
+    def parse_key(self, values):
+        rank, pk = values
+        return float(rank), int(pk)
+
+    def after(self, queryset, key):
+        rank, pk = key
+        return queryset.extra(
+            where=[
+                f'(bm25({FTS_TABLE}) > %s OR '
+                f'(bm25({FTS_TABLE}) = %s AND posts_post.id < %s))'
+            ],
+            params=[rank, rank, pk],
+        )
+
+    def before(self, queryset, key):
+        rank, pk = key
+        return queryset.extra(
+            where=[
+                f'(bm25({FTS_TABLE}) < %s OR '
+                f'(bm25({FTS_TABLE}) = %s AND posts_post.id > %s))'
+            ],
+            params=[rank, rank, pk],
+        )
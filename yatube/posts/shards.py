@@ -0,0 +1,545 @@
+import hashlib
+import heapq
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.db.models import F, Max, prefetch_related_objects
+
+from .models import Comment, Group, IdSequence, Post, User
+
+PRIMARY: str = DEFAULT_DB_ALIAS
+BUCKET_BITS: int = 10  # младшие биты id поста — его виртуальный шард
+BUCKETS: int = 1 << BUCKET_BITS  # виртуальных шардов, не меньше шардов
+BUCKET_MASK: int = BUCKETS - 1
+LOCATION_KEY: str = 'post-shard:{}:{}'  # шард поста, созданного до шардов
+SHARDED_MODELS = (Post, Comment)
+# поля .values() из таблиц основной базы: (столбец в шарде, модель, поле)
+PRIMARY_VALUES = {
+    'author__username': ('author_id', User, 'username'),
+    'group__slug': ('group_id', Group, 'slug'),
+}
+
+# первые номера последовательностей: id меньше — созданы до шардов
+_first_tickets = {}
+
+
+def enabled():
+    return bool(settings.POST_SHARDS)
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping, Veach): номер от 0 до buckets - 1.
+
+    При добавлении шарда на него переезжает лишь 1/N ключей, остальные
+    остаются на месте.
+    """
+    shard, candidate = -1, 0
+    while candidate < buckets:
+        shard = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((shard + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return shard
+
+
+def bucket_for_author(author_id):
+    digest = hashlib.md5(str(author_id).encode()).digest()
+    return int.from_bytes(digest[:8], 'big') & BUCKET_MASK
+
+
+def shard_for_bucket(bucket):
+    shards = settings.POST_SHARDS
+    return shards[jump_hash(bucket, len(shards))]
+
+
+def shard_for_author(author_id):
+    """Шард постов автора и комментариев к ним."""
+    return shard_for_bucket(bucket_for_author(author_id))
+
+
+def first_ticket(model):
+    """Первый номер последовательности model или None, пока её нет."""
+    label = model._meta.label_lower
+    if label not in _first_tickets:
+        first = IdSequence.objects.using(PRIMARY).filter(
+            name=label).values_list('first', flat=True).first()
+        if first is None:
+            return None
+        _first_tickets[label] = first
+    return _first_tickets[label]
+
+
+def next_ticket(model, count=1):
+    """Первый из count следующих номеров общей для всех шардов
+    последовательности.
+
+    Последовательность лежит в основной базе и начинается выше всех id,
+    созданных до шардирования, поэтому новые id с ними не совпадут.
+    """
+    label = model._meta.label_lower
+    sequences = IdSequence.objects.using(PRIMARY)
+
+    def take():
+        if not sequences.filter(name=label).update(last=F('last') + count):
+            return None
+        last = sequences.values_list('last', flat=True).get(name=label)
+        return last - count + 1
+
+    with transaction.atomic(using=PRIMARY):
+        ticket = take()
+        if ticket is not None:
+            return ticket
+        last_id = max(
+            model.objects.using(alias).aggregate(Max('id'))['id__max'] or 0
+            for alias in [PRIMARY, *settings.POST_SHARDS]
+        )
+        first = (last_id >> BUCKET_BITS) + 1
+        try:
+            with transaction.atomic(using=PRIMARY):
+                sequences.create(
+                    name=label, first=first, last=first + count - 1)
+            return first
+        except IntegrityError:
+            # последовательность тем временем создал другой процесс
+            return take()
+
+
+def reserve_ticket(model, ticket):
+    """Сдвигает последовательность за ticket, занятый готовым id
+    (например, из архива), чтобы новые id с ним не совпали."""
+    IdSequence.objects.using(PRIMARY).filter(
+        name=model._meta.label_lower, last__lt=ticket).update(last=ticket)
+
+
+def bucket_for(instance):
+    """Виртуальный шард поста или комментария.
+
+    По id поста его шард находится без запросов; комментарий лежит в
+    шарде своего поста и берёт его виртуальный шард.
+    """
+    if isinstance(instance, Post):
+        return bucket_for_author(instance.author_id)
+    return instance.post_id & BUCKET_MASK
+
+
+def id_for(instance, ticket):
+    """id поста или комментария: номер ticket и виртуальный шард."""
+    return ticket << BUCKET_BITS | bucket_for(instance)
+
+
+def new_id(instance):
+    """id нового поста или комментария."""
+    return id_for(instance, next_ticket(type(instance)))
+
+
+def assign_ids(instances):
+    """Даёт id пачке новых постов или комментариев одним обращением к
+    последовательности, как new_id каждому."""
+    if not instances:
+        return
+    first = next_ticket(type(instances[0]), len(instances))
+    for ticket, instance in enumerate(instances, first):
+        instance.pk = id_for(instance, ticket)
+
+
+def is_sequence_id(post_id):
+    """Выдан ли id поста последовательностью, то есть шард в нём."""
+    first = first_ticket(Post)
+    return first is not None and post_id >> BUCKET_BITS >= first
+
+
+def shard_for_post(post_id):
+    """Шард поста по его id.
+
+    Пост, созданный до шардирования, ищется по всем шардам, найденный
+    шард запоминается в кеше; ещё не перенесённый командой
+    rebalance_shards пост читается из основной базы.
+    """
+    if is_sequence_id(post_id):
+        return shard_for_bucket(post_id & BUCKET_MASK)
+    shards = settings.POST_SHARDS
+    # ключ зависит от набора шардов: после его смены посты переезжают
+    key = LOCATION_KEY.format(','.join(shards), post_id)
+    alias = cache.get(key)
+    if alias is None:
+        alias = next((
+            alias for alias in shards
+            if Post.objects.using(alias).filter(pk=post_id).exists()
+        ), None)
+        if alias is None:
+            return PRIMARY
+        cache.set(key, alias, None)
+    return alias
+
+
+@contextmanager
+def atomic():
+    """Транзакции основной базы и всех шардов."""
+    with ExitStack() as stack:
+        for alias in [PRIMARY, *settings.POST_SHARDS]:
+            stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+def related_paths(related, prefix=''):
+    """Пути prefetch_related для дерева select_related."""
+    for name, children in related.items():
+        if children:
+            yield from related_paths(children, f'{prefix}{name}__')
+        else:
+            yield prefix + name
+
+
+def split_related(queryset):
+    """Queryset без JOIN и пути связанных объектов для подгрузки.
+
+    Пользователи и группы лежат в основной базе, а в таблицах шарда их
+    нет, так что JOIN с ними ничего не найдёт. Поля связанных таблиц
+    из only() тоже убираются.
+    """
+    if queryset._fields is not None:
+        # строки .values(): связанные поля дописывает fill_values
+        return queryset, []
+    related = queryset.query.select_related
+    paths = list(related_paths(related)) if isinstance(related, dict) else []
+    fields, defer = queryset.query.deferred_loading
+    queryset = queryset.select_related(None)
+    if fields and not defer:
+        queryset = queryset.defer(None).only(
+            *(field for field in fields if '__' not in field))
+    return queryset, paths
+
+
+def unjoined(queryset):
+    """Тот же queryset для шарда: связанные объекты — через prefetch."""
+    queryset, paths = split_related(queryset)
+    return queryset.prefetch_related(*paths)
+
+
+class Descending:
+    """Значение ключа слияния в обратном порядке."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def merge_key(ordering):
+    """Ключ слияния строк по полям order_by: моделей или .values()."""
+    fields = [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+    def key(row):
+        get = row.__getitem__ if isinstance(row, dict) else partial(
+            getattr, row)
+        return tuple(
+            Descending(get(name)) if descending else get(name)
+            for name, descending in fields
+        )
+    return key
+
+
+class ShardedQuerySet:
+    """Записи нескольких шардов как один queryset.
+
+    Срез [start:stop] собирается слиянием первых stop строк каждого
+    шарда в порядке ordering, а автор и группа подгружаются из основной
+    базы одним запросом на весь срез. Поддерживается то, что нужно
+    пагинаторам и выгрузке: filter, exclude, extra, values, order_by,
+    reverse, count и срезы.
+    """
+
+    ordered = True
+    default_ordering = ('-pub_date', '-id')
+
+    def __init__(self, querysets, ordering=default_ordering, start=0,
+                 stop=None):
+        self.querysets = querysets
+        self.ordering = ordering
+        self.start = start
+        self.stop = stop
+        self._result_cache = None
+
+    @classmethod
+    def of(cls, querysets):
+        return cls([
+            queryset.order_by(*cls.default_ordering)
+            for queryset in querysets
+        ])
+
+    def _clone(self, method, *args, **kwargs):
+        return ShardedQuerySet(
+            [getattr(queryset, method)(*args, **kwargs)
+             for queryset in self.querysets],
+            self.ordering, self.start, self.stop,
+        )
+
+    @property
+    def query(self):
+        # запрос у всех шардов одинаков, он годится для ключа кеша
+        return self.querysets[0].query
+
+    def filter(self, *args, **kwargs):
+        return self._clone('filter', *args, **kwargs)
+
+    def exclude(self, *args, **kwargs):
+        return self._clone('exclude', *args, **kwargs)
+
+    def extra(self, *args, **kwargs):
+        return self._clone('extra', *args, **kwargs)
+
+    def values(self, *fields):
+        return self._clone('values', *fields)
+
+    def select_related(self, *fields):
+        return self._clone('select_related', *fields)
+
+    def only(self, *fields):
+        return self._clone('only', *fields)
+
+    def order_by(self, *fields):
+        clone = self._clone('order_by', *fields)
+        clone.ordering = fields
+        return clone
+
+    def reverse(self):
+        clone = self._clone('reverse')
+        clone.ordering = tuple(
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        )
+        return clone
+
+    def count(self):
+        if self._result_cache is not None:
+            return len(self._result_cache)
+        limit = self.stop
+        total = sum(
+            (queryset[:limit] if limit is not None else queryset).count()
+            for queryset in self.querysets
+        )
+        if limit is not None:
+            total = min(total, limit)
+        return max(total - self.start, 0)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return list(self[key:key + 1])[0]
+        start = self.start + (key.start or 0)
+        stop = self.stop
+        if key.stop is not None:
+            stop = self.start + key.stop
+            if self.stop is not None:
+                stop = min(stop, self.stop)
+        return ShardedQuerySet(self.querysets, self.ordering, start, stop)
+
+    def _fetch(self):
+        if self._result_cache is None:
+            shards = []
+            paths = []
+            for queryset in self.querysets:
+                queryset, paths = split_related(queryset)
+                if self.stop is not None:
+                    queryset = queryset[:self.stop]
+                shards.append(list(queryset))
+            merged = heapq.merge(*shards, key=merge_key(self.ordering))
+            posts = list(islice(merged, self.start, self.stop))
+            prefetch_related_objects(posts, *paths)
+            self._result_cache = posts
+        return self._result_cache
+
+    def __iter__(self):
+        return iter(self._fetch())
+
+    def __len__(self):
+        return len(self._fetch())
+
+    def __bool__(self):
+        return bool(self._fetch())
+
+
+def everywhere(queryset):
+    """Посты queryset со всех шардов."""
+    if not enabled():
+        return queryset
+    return ShardedQuerySet.of(
+        queryset.using(alias) for alias in settings.POST_SHARDS)
+
+
+def for_author(queryset, author_id):
+    """Посты автора из его шарда."""
+    if not enabled():
+        return queryset
+    return ShardedQuerySet.of([queryset.using(shard_for_author(author_id))])
+
+
+def for_posts(queryset, post_ids):
+    """Queryset постов или комментариев из шардов постов post_ids."""
+    if not enabled():
+        return queryset
+    aliases = sorted({shard_for_post(post_id) for post_id in post_ids})
+    return ShardedQuerySet.of(
+        [queryset.using(alias) for alias in aliases] or [queryset.none()])
+
+
+def in_author_shard(queryset, author_id):
+    """Queryset постов автора в его шарде, без слияния шардов."""
+    if not enabled():
+        return queryset
+    return queryset.using(shard_for_author(author_id))
+
+
+def fetch_posts(queryset, post_ids):
+    """Посты queryset с id из post_ids в порядке списка, из шардов, где
+    они лежат; автор и группа — одним запросом из основной базы."""
+    aliases = defaultdict(list)
+    for post_id in post_ids:
+        aliases[shard_for_post(post_id)].append(post_id)
+    found = {}
+    paths = []
+    for alias, ids in aliases.items():
+        shard_queryset, paths = split_related(
+            queryset.using(alias).filter(id__in=ids))
+        for row in shard_queryset:
+            found[row['id'] if isinstance(row, dict) else row.pk] = row
+    posts = [found[post_id] for post_id in post_ids if post_id in found]
+    prefetch_related_objects(posts, *paths)
+    return posts
+
+
+def for_post(queryset, post_id):
+    """Queryset постов или комментариев в шарде поста post_id."""
+    if not enabled():
+        return queryset
+    return unjoined(queryset.using(shard_for_post(post_id)))
+
+
+def parts(queryset):
+    """Querysets отдельных баз, из которых собран queryset."""
+    if isinstance(queryset, ShardedQuerySet):
+        return queryset.querysets
+    return [queryset]
+
+
+def local_values(fields):
+    """Поля для .values() в шарде: вместо полей пользователей и групп —
+    их id, поля основной базы потом дописывает fill_values."""
+    if not enabled():
+        return set(fields)
+    return {
+        PRIMARY_VALUES[field][0] if field in PRIMARY_VALUES else field
+        for field in fields
+    }
+
+
+def fill_values(rows, fields):
+    """Дописывает в строки шардов поля пользователей и групп из
+    основной базы, по запросу на таблицу."""
+    rows = list(rows)
+    if not enabled():
+        return rows
+    for field in fields:
+        if field not in PRIMARY_VALUES:
+            continue
+        column, model, name = PRIMARY_VALUES[field]
+        ids = {row[column] for row in rows} - {None}
+        names = dict(model.objects.using(PRIMARY).filter(
+            pk__in=ids).values_list('pk', name)) if ids else {}
+        for row in rows:
+            row[field] = names.get(row[column])
+    return rows
+
+
+def shard_for(instance):
+    """Шард, в который роутер пишет пост или комментарий."""
+    if isinstance(instance, Post):
+        return shard_for_author(instance.author_id)
+    return shard_for_post(instance.post_id)
+
+
+def bulk_create(model, objects, batch_size):
+    """bulk_create постов или комментариев.
+
+    С шардами объекты без id получают их из последовательности, как при
+    save(), и вставляются в свои шарды.
+    """
+    if not enabled():
+        model.objects.bulk_create(objects, batch_size=batch_size)
+        return
+    assign_ids([obj for obj in objects if obj.pk is None])
+    shard_objects = defaultdict(list)
+    for obj in objects:
+        shard_objects[shard_for(obj)].append(obj)
+    for alias, chunk in shard_objects.items():
+        model.objects.using(alias).bulk_create(chunk, batch_size=batch_size)
+
+
+def delete_user_rows(user_id):
+    """Удаляет посты и комментарии пользователя во всех шардах.
+
+    Ключи в шардах не проверяются, и каскад из основной базы до них не
+    доходит; комментарии под чужими постами лежат в шардах этих постов.
+    """
+    for alias in settings.POST_SHARDS:
+        Comment.objects.using(alias).filter(author_id=user_id).delete()
+        Post.objects.using(alias).filter(author_id=user_id).delete()
+
+
+def detach_group(group_id):
+    """Отвязывает посты шардов от удаляемой группы, как SET_NULL."""
+    for alias in settings.POST_SHARDS:
+        Post.objects.using(alias).filter(group_id=group_id).update(group=None)
+
+
+def disable_foreign_keys(sender, connection, **kwargs):
+    """Ключи на пользователей и группы в шарде не проверяются: их
+    строки лежат в основной базе."""
+    if connection.alias in settings.POST_SHARDS and (
+            connection.vendor == 'sqlite'):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA foreign_keys = OFF')
+
+
+class ShardRouter:
+    """Посты и комментарии — в шард автора поста, остальное решают
+    следующие роутеры.
+
+    Без подсказки instance чтение идёт в основную базу: списки по
+    шардам собирают everywhere, for_author и for_post.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not enabled() or model not in SHARDED_MODELS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and (
+                instance._state.db in settings.POST_SHARDS):
+            return instance._state.db
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not enabled() or model not in SHARDED_MODELS:
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if instance._state.db in settings.POST_SHARDS:
+            return instance._state.db
+        if isinstance(instance, Post):
+            return shard_for_author(instance.author_id)
+        if isinstance(instance, Comment):
+            if Comment.post.is_cached(instance) and (
+                    instance.post._state.db in settings.POST_SHARDS):
+                return instance.post._state.db
+            return shard_for_post(instance.post_id)
+        return None
@@ -0,0 +1,193 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from . import feed, shards, stats, thumbnails
+from .cache import (
+    AUTHORS_SCOPE, GROUPS_SCOPE, bump, post_scopes, user_scopes,
+)
+from .models import Comment, FeedEntry, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+# поля пользователя, которые выводятся на страницах постов
+AUTHOR_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def is_login_only(update_fields):
+    """Сохраняется только время входа: страницы от него не зависят."""
+    return bool(update_fields) and set(update_fields) == {'last_login'}
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, posts_count=1)
+    elif instance._old_author_id not in (None, instance.author_id):
+        stats.change(instance._old_author_id, posts_count=-1)
+        stats.change(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    stats.change(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, followers_count=1)
+        stats.change(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    stats.change(instance.author_id, followers_count=-1)
+    stats.change(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out(instance)
+    elif instance._old_author_id not in (None, instance.author_id):
+        # пост сменил автора: из лент его прежних подписчиков он уходит
+        FeedEntry.objects.filter(post=instance).delete()
+        feed.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def delete_sharded_feed_entries(sender, instance, **kwargs):
+    # каскад из шарда не доходит до записей лент в основной базе
+    if shards.enabled():
+        FeedEntry.objects.filter(post_id=instance.pk).delete()
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_feed(sender, instance, **kwargs):
+    feed.prune(instance.user_id, instance.author_id)
+    feed.catch_up(instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_values(sender, instance, **kwargs):
+    instance._old_author_id = None
+    instance._old_group_id = None
+    instance._old_image = None
+    if instance.pk:
+        (instance._old_author_id, instance._old_group_id,
+         instance._old_image) = shards.for_post(
+            Post.objects.filter(pk=instance.pk), instance.pk
+        ).values_list('author_id', 'group_id', 'image').first() or (
+            None, None, None)
+
+
+@receiver(pre_save, sender=Group)
+def remember_old_slug(sender, instance, **kwargs):
+    instance._old_slug = None
+    if instance.pk:
+        instance._old_slug = Group.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(pre_save, sender=User)
+def remember_old_names(sender, instance, update_fields=None, **kwargs):
+    instance._old_names = None
+    if instance.pk and not is_login_only(update_fields):
+        instance._old_names = User.objects.filter(
+            pk=instance.pk).values_list(*AUTHOR_FIELDS).first()
+
+
+@receiver(pre_save, sender=Post)
+@receiver(pre_save, sender=Comment)
+def assign_shard_id(sender, instance, **kwargs):
+    if instance.pk is None and shards.enabled():
+        instance.pk = shards.new_id(instance)
+
+
+@receiver(pre_delete, sender=User)
+def delete_sharded_user_rows(sender, instance, **kwargs):
+    if shards.enabled():
+        shards.delete_user_rows(instance.pk)
+
+
+@receiver(pre_delete, sender=Group)
+def detach_sharded_group(sender, instance, **kwargs):
+    if shards.enabled():
+        shards.detach_group(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, **kwargs):
+    if instance.image and instance.image.name != instance._old_image:
+        thumbnails.schedule(instance.pk, instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_pages(sender, instance, **kwargs):
+    scopes = post_scopes(instance)
+    old_author_id = getattr(instance, '_old_author_id', None)
+    if old_author_id not in (None, instance.author_id):
+        scopes.extend(user_scopes(old_author_id))
+    old_group_id = getattr(instance, '_old_group_id', None)
+    if old_group_id and old_group_id != instance.group_id:
+        old_group_slug = Group.objects.filter(
+            pk=old_group_id
+        ).values_list('slug', flat=True).first()
+        if old_group_slug:
+            scopes.append(f'group:{old_group_slug}')
+    bump(*scopes)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_pages(sender, instance, **kwargs):
+    bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_pages(sender, instance, **kwargs):
+    # счётчики подписчиков автора и подписок подписчика
+    bump(*user_scopes(instance.author_id), *user_scopes(instance.user_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group_pages(sender, instance, **kwargs):
+    scopes = ['posts', GROUPS_SCOPE, f'group:{instance.slug}']
+    old_slug = getattr(instance, '_old_slug', None)
+    if old_slug and old_slug != instance.slug:
+        scopes.append(f'group:{old_slug}')
+    bump(*scopes)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_user_pages(sender, instance, update_fields=None, **kwargs):
+    if is_login_only(update_fields):
+        return
+    scopes = ['posts', f'user:{instance.pk}', f'profile:{instance.username}']
+    old_names = getattr(instance, '_old_names', None)
+    names = tuple(getattr(instance, field) for field in AUTHOR_FIELDS)
+    if old_names and old_names != names:
+        scopes.append(AUTHORS_SCOPE)
+        old_username = old_names[0]
+        if old_username != instance.username:
+            scopes.append(f'profile:{old_username}')
+    bump(*scopes)
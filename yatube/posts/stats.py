@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import shards
+from .models import Follow, Post, User, UserStats
+
+# счётчик UserStats: (модель, поле пользователя в ней)
+COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def count_subquery(model, field):
+    counts = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(count=Count('pk')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def shard_post_counts(user_ids):
+    """Число постов авторов user_ids, сложенное по шардам."""
+    counts = {}
+    for alias in settings.POST_SHARDS:
+        rows = Post.objects.using(alias).filter(
+            author_id__in=user_ids
+        ).order_by().values('author_id').annotate(count=Count('pk'))
+        for row in rows:
+            counts[row['author_id']] = (
+                counts.get(row['author_id'], 0) + row['count'])
+    return counts
+
+
+def actual_stats(user_ids):
+    """Точные значения счётчиков для пользователей user_ids.
+
+    С шардами посты считаются в каждом шарде отдельно: подзапрос в
+    основной базе их не видит.
+    """
+    sharded = shards.enabled()
+    counters = {
+        name: (model, field) for name, (model, field) in COUNTERS.items()
+        if not (sharded and model is Post)
+    }
+    rows = User.objects.filter(pk__in=user_ids).annotate(**{
+        name: count_subquery(model, field)
+        for name, (model, field) in counters.items()
+    }).values('pk', *counters)
+    if not sharded:
+        return rows
+    counts = shard_post_counts(user_ids)
+    return [
+        {**row, 'posts_count': counts.get(row['pk'], 0)} for row in rows
+    ]
+
+
+def create_stats(user_id):
+    """Заводит счётчики пользователя по данным в базе."""
+    for row in actual_stats([user_id]):
+        row.pop('pk')
+        stats, _ = UserStats.objects.update_or_create(
+            user_id=user_id, defaults=row)
+        return stats
+
+
+def refresh(user_ids):
+    """Пересчитывает счётчики пользователей user_ids по базе."""
+    for row in actual_stats(user_ids):
+        user_id = row.pop('pk')
+        UserStats.objects.update_or_create(user_id=user_id, defaults=row)
+
+
+def change(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя на deltas.
+
+    Отсутствующая строка не создаётся: get_stats заведёт её при чтении
+    уже с точными значениями.
+    """
+    UserStats.objects.filter(user_id=user_id).update(**{
+        name: F(name) + delta for name, delta in deltas.items()
+    })
+
+
+def get_stats(user):
+    """Счётчики пользователя; заводит их, если строки ещё нет."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return create_stats(user.pk)
+
+
+def reconcile(chunk_size):
+    """Сверяет счётчики с базой порциями по chunk_size пользователей.
+
+    Возвращает число исправленных записей.
+    """
+    fixed = 0
+    last_pk = 0
+    while True:
+        user_ids = list(User.objects.filter(
+            pk__gt=last_pk
+        ).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not user_ids:
+            return fixed
+        last_pk = user_ids[-1]
+        stored = {
+            row['user_id']: row for row in UserStats.objects.filter(
+                user_id__in=user_ids).values('user_id', *COUNTERS)
+        }
+        for row in actual_stats(user_ids):
+            user_id = row.pop('pk')
+            current = stored.get(user_id, {})
+            if all(current.get(name) == row[name] for name in COUNTERS):
+                continue
+            UserStats.objects.update_or_create(user_id=user_id, defaults=row)
+            fixed += 1
@@ -0,0 +1,26 @@
+from django import template
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+
+from posts.search import MARK_END, MARK_START
+from posts.thumbnails import get_ready_thumbnail
+
+register = template.Library()
+
+
+@register.filter
+def highlight(snippet):
+    """Экранирует сниппет поиска и выделяет совпадения тегом <mark>."""
+    escaped = conditional_escape(snippet)
+    return mark_safe(
+        escaped.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    )
+
+
+@register.inclusion_tag('includes/thumbnail.html')
+def post_thumbnail(image, alias='card'):
+    """Миниатюра картинки поста или заглушка, пока она не готова."""
+    return {
+        'image': image,
+        'thumbnail': get_ready_thumbnail(image, alias),
+    }
@@ -0,0 +1,168 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import LiveServerTestCase, TestCase
+
+from posts.models import Comment, FeedEntry, Follow, Group, Post, UserStats
+from posts.search import search_posts
+from posts.stats import reconcile
+
+User = get_user_model()
+
+
+class ImportPostsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, lines):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines))
+        return path
+
+    def write_jsonl(self, records):
+        return self.write(
+            'archive.jsonl',
+            [json.dumps(record, ensure_ascii=False) for record in records])
+
+    def import_posts(self, path, *args):
+        call_command(
+            'import_posts', path, *args, stdout=StringIO(), stderr=StringIO())
+
+    def test_import_jsonl(self):
+        """Посты, комментарии и подписки загружаются вместе с лентой"""
+        path = self.write_jsonl([
+            {'type': 'follow', 'user': 'reader', 'author': 'author'},
+            {'type': 'post', 'id': 100, 'author': 'author', 'group': 'group',
+             'text': 'Архивный пост', 'pub_date': '2015-05-01T10:00:00'},
+            {'type': 'comment', 'post': 100, 'author': 'reader',
+             'text': 'Архивный комментарий'},
+            {'type': 'post', 'author': 'nobody', 'text': 'Пропущен'},
+            {'type': 'comment', 'post': 999, 'author': 'reader', 'text': '-'},
+        ])
+        self.import_posts(path)
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date.year, 2015)
+        self.assertEqual(post.comments.get().text, 'Архивный комментарий')
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists())
+        self.assertEqual(list(search_posts('архивный')), [post])
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual((stats.posts_count, stats.followers_count), (1, 1))
+        self.assertFalse(os.path.exists(f'{path}.progress'))
+
+    def test_import_csv_and_create_missing(self):
+        """CSV с неизвестными автором и группой при --create-missing"""
+        path = self.write('archive.csv', [
+            'type,author,group,text',
+            'post,newcomer,new-group,Пост новичка',
+        ])
+        self.import_posts(path, '--create-missing')
+        post = Post.objects.get(text='Пост новичка')
+        self.assertEqual(post.author.username, 'newcomer')
+        self.assertEqual(post.group.slug, 'new-group')
+
+    def test_resume(self):
+        """После сбоя загрузка продолжается с непрошедшей порции"""
+        Post.objects.create(pk=5, author=self.author, text='Уже есть')
+        records = [
+            {'type': 'post', 'author': 'author', 'text': 'Первый'},
+            {'type': 'post', 'id': 5, 'author': 'author', 'text': 'Занят'},
+        ]
+        path = self.write_jsonl(records)
+        with self.assertRaises(CommandError):
+            self.import_posts(path, '--chunk-size', '1')
+        with self.assertRaises(CommandError):
+            self.import_posts(path)
+        records[1]['id'] = 50
+        path = self.write_jsonl(records)
+        self.import_posts(path, '--chunk-size', '1', '--resume')
+        self.assertEqual(Post.objects.filter(text='Первый').count(), 1)
+        self.assertTrue(Post.objects.filter(pk=50, text='Занят').exists())
+
+
+class ExportPostsTest(TestCase):
+    def test_export_round_trip(self):
+        """Выгрузку автора можно загрузить обратно командой import_posts"""
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, text='Пост')
+        Comment.objects.create(post=post, author=author, text='Комментарий')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'export.jsonl')
+        call_command('export_posts', '--user', 'author', '--output', path)
+        Post.objects.all().delete()
+        call_command(
+            'import_posts', path, stdout=StringIO(), stderr=StringIO())
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual(post.comments.get().text, 'Комментарий')
+
+
+class SeedTest(TestCase):
+    def seed(self, *args):
+        call_command(
+            'seed', '--users', '30', '--groups', '3', '--posts', '60',
+            '--comments', '40', '--follows', '5', '--end', '2024-01-01',
+            *args, stdout=StringIO())
+
+    def test_seed(self):
+        """Созданные строки согласованы со счётчиками и лентами"""
+        self.seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 40)
+        self.assertEqual(reconcile(100), 0)
+        follow = Follow.objects.filter(author__posts__isnull=False).first()
+        self.assertTrue(FeedEntry.objects.filter(
+            user_id=follow.user_id,
+            post__author_id=follow.author_id).exists())
+        with self.assertRaises(CommandError):
+            self.seed()
+
+    def test_deterministic(self):
+        """Одинаковый --seed даёт одинаковые данные"""
+        texts = []
+        for prefix in ('first', 'second'):
+            self.seed('--prefix', prefix)
+            texts.append(list(Post.objects.filter(
+                author__username__startswith=prefix
+            ).order_by('id').values_list('text', 'pub_date')))
+        self.assertEqual(texts[0], texts[1])
+
+
+class BenchViewsTest(LiveServerTestCase):
+    def test_bench_report(self):
+        """Замер проходит все сценарии без ошибок и пишет JSON"""
+        call_command(
+            'seed', '--users', '10', '--posts', '20', '--comments', '5',
+            stdout=StringIO())
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'bench.json')
+        call_command(
+            'bench_views', '--server', self.live_server_url,
+            '--duration', '0.5', '--warmup', '0', '--concurrency', '2',
+            '--output', path, stdout=StringIO())
+        with open(path) as file:
+            run = json.load(file)['runs'][0]
+        self.assertEqual(run['total']['errors'], 0)
+        self.assertGreater(run['total']['requests'], 0)
+        self.assertIsNotNone(run['total']['p95_ms'])
@@ -1,17 +1,27 @@
+import os
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
 
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, override_settings, TestCase
+from django.db import OperationalError
+from django.test import (
+    Client, override_settings, TestCase, TransactionTestCase,
+)
 from django.urls import reverse
 from http import HTTPStatus
+from PIL import Image
+from posts import stats
 from posts.forms import PostForm
+from posts.images import ingest
 from ..models import Comment, Group, Post
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+EXIF_ORIENTATION: int = 0x0112  # тег поворота в EXIF
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -88,10 +98,39 @@ class PostCreateFormTests(TestCase):
                 text='Тестовый текст о важном',
                 author=self.user,
                 group=self.group.id,
-                image=self.post.image
+                image='posts/small.jpg',
+                image_width=1,
+                image_height=1,
             ).exists()
         )
 
+    def test_create_post_normalizes_image(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет EXIF"""
+        exif = Image.Exif()
+        exif[EXIF_ORIENTATION] = 6  # повёрнута на 90° по часовой
+        source = BytesIO()
+        Image.new('RGB', (3000, 1000), 'red').save(
+            source, 'JPEG', exif=exif.tobytes())
+        uploaded = SimpleUploadedFile(
+            name='photo.jpeg',
+            content=source.getvalue(),
+            content_type='image/jpeg',
+        )
+        self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с фото', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Пост с фото')
+        max_side = settings.POST_IMAGE_MAX_SIDE
+        self.assertEqual(
+            (post.image_width, post.image_height),
+            (max_side // 3, max_side),
+        )
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (max_side // 3, max_side))
+            self.assertEqual(image.format, 'JPEG')
+            self.assertNotIn(EXIF_ORIENTATION, image.getexif())
+
     def test_post_edit(self):
         """Валидная форма изменяет пост в базе данных"""
         post_count = Post.objects.count()
@@ -163,3 +202,41 @@ class PostCreateFormTests(TestCase):
             text='Класс. Жду продолжения'
         ).exists())
         self.assertEqual(Comment.objects.count(), comment_count + 1)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, SQLITE_RETRY_DELAY=0)
+class LockedSaveTests(TransactionTestCase):
+    """Повтор занятой базы возможен только вне транзакции TestCase."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='author')
+        self.client.force_login(self.user)
+        self.addCleanup(shutil.rmtree, TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_retry_does_not_repeat_image_work(self):
+        """Повтор сохранения поста не обрабатывает и не пишет картинку
+        снова"""
+        change = stats.change
+        calls = []
+
+        def locked_once(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return change(*args, **kwargs)
+        source = BytesIO()
+        Image.new('RGB', (10, 10), 'red').save(source, 'PNG')
+        uploaded = SimpleUploadedFile(
+            'retry.png', source.getvalue(), content_type='image/png')
+        with mock.patch('posts.forms.ingest', wraps=ingest) as ingested, \
+                mock.patch('posts.stats.change', locked_once):
+            self.client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Пост с повтором', 'image': uploaded},
+            )
+        self.assertEqual(ingested.call_count, 1)
+        self.assertEqual(len(calls), 2)
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/retry.jpg')
+        self.assertEqual(
+            os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'posts')), ['retry.jpg'])
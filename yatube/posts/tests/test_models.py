@@ -1,8 +1,11 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import TestCase
 from posts.models import COUNT_OF_CHAR
 
-from ..models import Group, Post
+from ..models import Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -43,3 +46,48 @@ class GroupModelTest(TestCase):
         group = GroupModelTest.group
         expected_group_title = group.title
         self.assertEqual(expected_group_title, str(group))
+
+
+class UserStatsModelTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='auth')
+
+    def get_stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_posts_and_subscriptions(self):
+        """Счётчики меняются вместе с постами и подписками"""
+        post = Post.objects.create(author=self.author, text='Текст')
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.get_stats(self.author).posts_count, 1)
+        self.assertEqual(self.get_stats(self.author).followers_count, 1)
+        self.assertEqual(self.get_stats(self.user).following_count, 1)
+        post.delete()
+        follow.delete()
+        author_stats = self.get_stats(self.author)
+        self.assertEqual(author_stats.posts_count, 0)
+        self.assertEqual(author_stats.followers_count, 0)
+        self.assertEqual(self.get_stats(self.user).following_count, 0)
+
+    def test_author_change_moves_post_count(self):
+        """Смена автора поста переносит его в счётчик нового автора"""
+        post = Post.objects.create(author=self.author, text='Текст')
+        post.author = self.user
+        post.save()
+        self.assertEqual(self.get_stats(self.author).posts_count, 0)
+        self.assertEqual(self.get_stats(self.user).posts_count, 1)
+        post.delete()
+        User.objects.get(pk=self.author.pk).delete()
+        self.assertEqual(self.get_stats(self.user).posts_count, 0)
+
+    def test_reconcile_stats_fixes_drift(self):
+        """Команда reconcile_stats исправляет разошедшиеся счётчики"""
+        Post.objects.create(author=self.author, text='Текст')
+        UserStats.objects.filter(user=self.author).update(posts_count=7)
+        UserStats.objects.filter(user=self.user).delete()
+        call_command('reconcile_stats', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.get_stats(self.author).posts_count, 1)
+        self.assertEqual(self.get_stats(self.user).posts_count, 0)
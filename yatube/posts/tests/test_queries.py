@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from posts.models import Comment, Follow, Group, Post
+from posts.views import COUNT_POSTS
+
+User = get_user_model()
+
+# предельное число запросов к базе на страницу, не зависящее от числа постов
+QUERY_BUDGETS = {
+    'posts:index': 2,
+    'posts:group_posts': 3,
+    'posts:profile': 3,
+    'posts:post_detail': 3,
+    # авторы без рассылки, число постов ленты и страница
+    'posts:follow_index': 3,
+}
+# запросы сессии и пользователя у авторизованного клиента: оба берутся
+# из кеша
+AUTH_QUERIES: int = 0
+
+
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовое название',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def create_content(self, count):
+        """Посты разных авторов с комментариями этих авторов."""
+        start = Post.objects.count()
+        for number in range(start, start + count):
+            author = User.objects.create_user(
+                username=f'author{number}', first_name=f'Имя{number}')
+            Follow.objects.create(user=self.reader, author=author)
+            post = Post.objects.create(
+                author=author, group=self.group, text=f'Пост {number}')
+            Comment.objects.create(
+                post=post, author=author, text=f'Комментарий {number}')
+        return Post.objects.filter(author=author).first()
+
+    def count_queries(self, client, name, **kwargs):
+        cache.clear()
+        # сессия и пользователь снова попадают в кеш, как у любого
+        # посетителя после первой страницы
+        client.get(reverse('about:author'))
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(reverse(name, kwargs=kwargs))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def urls(self, post):
+        return {
+            'posts:index': {},
+            'posts:group_posts': {'slug': self.group.slug},
+            'posts:profile': {'username': post.author.username},
+            'posts:post_detail': {'post_id': post.id},
+        }
+
+    def test_guest_pages_within_budget(self):
+        """Страницы укладываются в бюджет запросов при любом числе постов"""
+        post = self.create_content(1)
+        few = {
+            name: self.count_queries(self.guest_client, name, **kwargs)
+            for name, kwargs in self.urls(post).items()
+        }
+        post = self.create_content(COUNT_POSTS + 1)
+        for name, kwargs in self.urls(post).items():
+            with self.subTest(name=name):
+                many = self.count_queries(self.guest_client, name, **kwargs)
+                self.assertEqual(many, few[name])
+                self.assertLessEqual(many, QUERY_BUDGETS[name])
+
+    def test_follow_index_within_budget(self):
+        """Лента подписок укладывается в бюджет запросов"""
+        self.create_content(COUNT_POSTS + 1)
+        queries = self.count_queries(
+            self.authorized_client, 'posts:follow_index')
+        self.assertLessEqual(
+            queries, QUERY_BUDGETS['posts:follow_index'] + AUTH_QUERIES)
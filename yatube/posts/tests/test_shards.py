@@ -0,0 +1,396 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts import shards
+from posts.export import export, user_content
+from posts.models import (
+    Comment, FeedEntry, Follow, Group, IdSequence, Post, RoutedQuerySet,
+    UserStats,
+)
+from posts.search import MARK_END, MARK_START
+from posts.stats import reconcile
+
+User = get_user_model()
+
+SHARDS = ['shard0', 'shard1']
+
+
+class JumpHashTest(SimpleTestCase):
+    def test_new_shard_takes_its_share_only(self):
+        """С добавлением шарда на него переезжает около 1/N бакетов"""
+        before = [shards.jump_hash(key, 4) for key in range(shards.BUCKETS)]
+        after = [shards.jump_hash(key, 5) for key in range(shards.BUCKETS)]
+        moved = [new for old, new in zip(before, after) if old != new]
+        self.assertEqual(set(moved), {4})
+        self.assertAlmostEqual(
+            len(moved) / shards.BUCKETS, 1 / 5, delta=0.05)
+
+
+@override_settings(POST_SHARDS=SHARDS)
+class ShardingTest(TestCase):
+    databases = {'default', *SHARDS}
+
+    @classmethod
+    def setUpTestData(cls):
+        # два автора из разных шардов
+        cls.authors = {}
+        number = 0
+        while len(cls.authors) < 2:
+            user = User.objects.create_user(username=f'author{number}')
+            cls.authors.setdefault(shards.shard_for_author(user.pk), user)
+            number += 1
+        cls.first, cls.second = cls.authors.values()
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        cache.clear()
+        shards._first_tickets.clear()
+        self.client.force_login(self.reader)
+
+    def _should_check_constraints(self, connection):
+        # в шардах нет пользователей, на которых ссылаются посты
+        return connection.alias not in SHARDS and (
+            super()._should_check_constraints(connection))
+
+    def shard_of(self, post):
+        return [
+            alias for alias in ['default', *SHARDS]
+            if Post.objects.using(alias).filter(pk=post.pk).exists()
+        ]
+
+    def posts_count(self, user):
+        return UserStats.objects.get(user=user).posts_count
+
+    def test_posts_and_comments_live_in_author_shard(self):
+        post = Post.objects.create(author=self.first, text='Пост')
+        other = Post.objects.create(author=self.second, text='Другой')
+        self.assertNotEqual(post.pk, other.pk)
+        self.assertEqual(self.shard_of(post), [post._state.db])
+        self.assertEqual(
+            shards.shard_for_post(post.pk),
+            shards.shard_for_author(self.first.pk))
+        self.client.post(
+            reverse('posts:add_comment', args=[post.pk]), {'text': 'Да'})
+        comment = Comment.objects.using(post._state.db).get()
+        self.assertEqual(comment.post_id, post.pk)
+        self.assertFalse(Comment.objects.using('default').exists())
+        self.assertEqual(self.posts_count(self.first), 1)
+
+    def test_sequence_created_concurrently(self):
+        """Номер выдаётся, даже если последовательность одновременно
+        создал другой процесс"""
+        aggregate = RoutedQuerySet.aggregate
+
+        def create_meanwhile(queryset, *args, **kwargs):
+            IdSequence.objects.get_or_create(
+                name='posts.post', defaults={'first': 100, 'last': 100})
+            return aggregate(queryset, *args, **kwargs)
+
+        with patch.object(RoutedQuerySet, 'aggregate', create_meanwhile):
+            self.assertEqual(shards.next_ticket(Post), 101)
+        self.assertEqual(shards.next_ticket(Post), 102)
+
+    def test_deleting_user_and_group_reaches_shards(self):
+        """Удаление пользователя и группы доходит до строк в шардах"""
+        group = Group.objects.create(
+            title='Группа', slug='group', description='')
+        post = Post.objects.create(
+            author=self.first, group=group, text='Пост')
+        other = Post.objects.create(author=self.second, text='Другой')
+        Comment.objects.create(post=other, author=self.first, text='Да')
+        group.delete()
+        post.refresh_from_db()
+        self.assertIsNone(post.group_id)
+        User.objects.get(pk=self.first.pk).delete()
+        self.assertEqual(self.shard_of(post), [])
+        self.assertEqual(self.shard_of(other), [other._state.db])
+        self.assertFalse(Comment.objects.using(other._state.db).exists())
+
+    def test_index_merges_shards_by_date(self):
+        for number in range(12):
+            author = self.first if number % 3 else self.second
+            Post.objects.create(author=author, text=f'Пост {number}')
+        response = self.client.get(reverse('posts:index'))
+        page = list(response.context['page_obj'])
+        self.assertEqual(
+            [post.text for post in page],
+            [f'Пост {number}' for number in range(11, 1, -1)])
+        self.assertEqual(
+            {post.author for post in page}, {self.first, self.second})
+        self.assertEqual(response.context['page_obj'].paginator.count, 12)
+        response = self.client.get(
+            reverse('posts:index'),
+            {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            ['Пост 1', 'Пост 0'])
+
+    def test_follow_index_reads_followed_shards(self):
+        Post.objects.create(author=self.first, text='Подписка')
+        Post.objects.create(author=self.second, text='Чужой')
+        Follow.objects.create(user=self.reader, author=self.first)
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            ['Подписка'])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_materialized_feed_with_shards(self):
+        """Лента подписок хранит записи для постов шардов и подмешивает
+        авторов без рассылки"""
+        Follow.objects.create(user=self.reader, author=self.first)
+        Follow.objects.create(user=self.reader, author=self.second)
+        # у второго автора подписчиков больше порога: его посты не
+        # рассылаются
+        Follow.objects.create(user=self.first, author=self.second)
+        posts = [
+            Post.objects.create(author=author, text=f'Пост {number}')
+            for number in range(6) for author in (self.first, self.second)
+        ]
+        self.assertEqual(
+            set(FeedEntry.objects.filter(user=self.reader).values_list(
+                'post_id', flat=True)),
+            {post.pk for post in posts if post.author == self.first})
+        url = reverse('posts:follow_index')
+        first_page = self.client.get(url).context['page_obj']
+        second_page = self.client.get(
+            url, {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertEqual([*first_page, *second_page], posts[::-1])
+        self.assertEqual(
+            first_page[0].author.username, self.second.username)
+        response = self.client.get(
+            reverse('api:follow_posts'), {'fields': 'id,author'})
+        self.assertEqual(response.json()['results'], [
+            {'id': post.pk, 'author': post.author.username}
+            for post in posts[:-11:-1]
+        ])
+        posts[0].delete()
+        self.assertFalse(FeedEntry.objects.filter(post_id=posts[0].pk))
+        Follow.objects.get(user=self.reader, author=self.first).delete()
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader))
+
+    def test_post_detail_and_profile(self):
+        post = Post.objects.create(author=self.second, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Ответ')
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk]))
+        self.assertEqual(response.context['post'].author, self.second)
+        self.assertEqual(
+            [comment.author for comment in response.context['comments']],
+            [self.reader])
+        response = self.client.get(
+            reverse('posts:profile', args=[self.second.username]))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_api_and_syndication_feeds_read_shards(self):
+        """API и RSS собирают посты шардов с авторами и группами"""
+        group = Group.objects.create(
+            title='Группа', slug='group', description='')
+        first = Post.objects.create(
+            author=self.first, group=group, text='Первый')
+        second = Post.objects.create(
+            author=self.second, group=group, text='Второй')
+        Comment.objects.create(post=second, author=self.reader, text='Ответ')
+        expected = [
+            {'text': 'Второй', 'author': self.second.username,
+             'group': 'group'},
+            {'text': 'Первый', 'author': self.first.username,
+             'group': 'group'},
+        ]
+        fields = {'fields': 'text,author,group'}
+        for url in (reverse('api:post_list'),
+                    reverse('api:group_posts', args=['group'])):
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.client.get(url, fields).json()['results'], expected)
+        response = self.client.get(
+            reverse('api:post_list'),
+            {'ids': f'{first.pk},{second.pk}', **fields})
+        self.assertEqual(response.json()['results'], expected[::-1])
+        response = self.client.get(
+            reverse('api:profile_posts', args=[self.second.username]),
+            fields)
+        self.assertEqual(response.json()['results'], expected[:1])
+        response = self.client.get(
+            reverse('api:post_detail', args=[second.pk]), fields)
+        self.assertEqual(response.json(), expected[0])
+        response = self.client.get(
+            reverse('api:comment_list', args=[second.pk]),
+            {'fields': 'author,text'})
+        self.assertEqual(
+            response.json()['results'],
+            [{'author': self.reader.username, 'text': 'Ответ'}])
+        for url in (reverse('posts:feed_rss'),
+                    reverse('posts:group_rss', args=['group'])):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Первый')
+                self.assertContains(response, self.second.username)
+        response = self.client.get(
+            reverse('posts:profile_rss', args=[self.first.username]))
+        self.assertContains(response, 'Первый')
+        self.assertNotContains(response, 'Второй')
+
+    def test_search_merges_shards(self):
+        """Поиск находит посты всех шардов и листает их по курсору"""
+        posts = [
+            Post.objects.create(author=author, text=f'Заметки о котах {n}')
+            for n in range(6) for author in (self.first, self.second)
+        ]
+        Post.objects.create(author=self.first, text='Про собак')
+        url = reverse('posts:search')
+        first_page = self.client.get(url, {'q': 'котах'}).context['page_obj']
+        second_page = self.client.get(
+            url, {'q': 'котах', 'cursor': first_page.next_cursor},
+        ).context['page_obj']
+        found = [*first_page, *second_page]
+        self.assertEqual(len(first_page), 10)
+        self.assertCountEqual(found, posts)
+        self.assertEqual(
+            {post.author.username for post in found},
+            {self.first.username, self.second.username})
+        self.assertIn(
+            f'{MARK_START}котах{MARK_END}', found[0].snippet)
+
+    def test_export_reads_shards(self):
+        """Выгрузка автора берёт его посты и комментарии из шардов"""
+        group = Group.objects.create(
+            title='Группа', slug='group', description='')
+        post = Post.objects.create(
+            author=self.first, group=group, text='Свой пост')
+        other = Post.objects.create(author=self.second, text='Чужой пост')
+        Comment.objects.create(post=other, author=self.first, text='Ответ')
+        lines = export(*user_content(self.first), 'jsonl')
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [(record['type'], record['id'], record['author'])
+             for record in records],
+            [('post', post.pk, self.first.username),
+             ('comment', Comment.objects.using(other._state.db).get().pk,
+              self.first.username)],
+        )
+        self.assertEqual(records[0]['group'], 'group')
+
+    def test_import_writes_shards(self):
+        """import_posts кладёт посты в шарды авторов, комментарии — к
+        постам"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'archive.jsonl')
+            with open(path, 'w', encoding='utf-8') as file:
+                for record in (
+                    {'type': 'post', 'id': 7, 'author': self.first.username,
+                     'text': 'Архивный'},
+                    {'type': 'post', 'author': self.second.username,
+                     'text': 'Новый'},
+                    {'type': 'comment', 'post': 7,
+                     'author': self.reader.username, 'text': 'Ответ'},
+                ):
+                    file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            call_command('import_posts', path, stdout=StringIO(),
+                         stderr=StringIO())
+            archived = Post.objects.using(
+                shards.shard_for_author(self.first.pk)).get(pk=7)
+            new = Post.objects.using(
+                shards.shard_for_author(self.second.pk)).get(text='Новый')
+            self.assertEqual(shards.shard_for_post(new.pk), new._state.db)
+            self.assertEqual(
+                Comment.objects.using(archived._state.db).get().post_id, 7)
+            self.assertFalse(Post.objects.using('default').exists())
+            # повтор архивного id в другом шарде — ошибка, как без шардов
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(json.dumps({
+                    'type': 'post', 'id': 7,
+                    'author': self.second.username, 'text': 'Повтор'}))
+            with self.assertRaises(CommandError):
+                call_command('import_posts', path, stdout=StringIO(),
+                             stderr=StringIO())
+        self.assertEqual(self.posts_count(self.first), 1)
+
+    def test_seed_writes_shards(self):
+        """seed раскладывает посты и комментарии по шардам"""
+        call_command(
+            'seed', '--users', '10', '--groups', '2', '--posts', '30',
+            '--comments', '20', stdout=StringIO())
+        posts = {
+            alias: list(Post.objects.using(alias).values_list(
+                'id', 'author_id'))
+            for alias in SHARDS
+        }
+        self.assertEqual(sum(map(len, posts.values())), 30)
+        for alias, rows in posts.items():
+            for post_id, author_id in rows:
+                self.assertEqual(shards.shard_for_author(author_id), alias)
+                self.assertEqual(shards.shard_for_post(post_id), alias)
+        comments = sum(
+            Comment.objects.using(alias).filter(
+                post_id__in=[post_id for post_id, _ in posts[alias]]
+            ).count()
+            for alias in SHARDS
+        )
+        self.assertEqual(comments, 20)
+        self.assertFalse(Post.objects.using('default').exists())
+        self.assertEqual(reconcile(100), 0)
+
+    def test_admin_lists_and_edits_shard_rows(self):
+        """Админка показывает посты выбранного шарда и правит их там"""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(admin)
+        post = Post.objects.create(author=self.first, text='Пост в шарде')
+        other = Post.objects.create(author=self.second, text='Другой')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Ответ')
+        url = reverse('admin:posts_post_changelist')
+        for shown in (post, other):
+            with self.subTest(shard=shown._state.db):
+                response = self.client.get(url, {'shard': shown._state.db})
+                self.assertEqual(
+                    list(response.context['cl'].result_list), [shown])
+        response = self.client.get(
+            url, {'shard': post._state.db, 'q': 'шарде'})
+        self.assertEqual(list(response.context['cl'].result_list), [post])
+        response = self.client.get(
+            reverse('admin:posts_comment_changelist'),
+            {'shard': post._state.db})
+        self.assertContains(response, 'Ответ')
+        response = self.client.get(
+            reverse('admin:posts_comment_change', args=[comment.pk]))
+        self.assertContains(response, 'Пост в шарде')
+        change_url = reverse('admin:posts_post_change', args=[post.pk])
+        self.assertEqual(self.client.get(change_url).status_code, 200)
+        self.client.post(change_url, {
+            'text': 'Исправлен', 'author': self.first.pk, 'group': ''})
+        self.assertEqual(
+            Post.objects.using(post._state.db).get(pk=post.pk).text,
+            'Исправлен')
+        self.assertFalse(Post.objects.using('default').exists())
+
+    def test_rebalance_moves_posts_created_before_sharding(self):
+        with override_settings(POST_SHARDS=[]):
+            post = Post.objects.create(author=self.first, text='Старый')
+            Comment.objects.create(post=post, author=self.reader, text='Да')
+        self.assertEqual(self.shard_of(post), ['default'])
+        call_command('rebalance_shards', stdout=StringIO())
+        shard = shards.shard_for_author(self.first.pk)
+        self.assertEqual(self.shard_of(post), [shard])
+        self.assertEqual(Comment.objects.using(shard).count(), 1)
+        self.assertEqual(shards.shard_for_post(post.pk), shard)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[post.pk]))
+        self.assertEqual(response.status_code, 200)
+        # новые id не пересекаются с созданными до шардирования
+        new = Post.objects.create(author=self.first, text='Новый')
+        self.assertGreater(new.pk, post.pk)
+        self.assertEqual(self.posts_count(self.first), 2)
+        # счётчики сверяются с постами во всех шардах
+        self.assertEqual(reconcile(100), 0)
@@ -1,14 +1,23 @@
+import io
+import json
 import shutil
 import tempfile
+import zipfile
+from http import HTTPStatus
+from unittest.mock import patch
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import Client, override_settings, TestCase
 from django.urls import reverse
 from django import forms
-from posts.models import Comment, Follow, Group, Post
+from posts.cache import bump
+from posts.models import Comment, FeedEntry, Follow, Group, Post
+from posts.paginators import ELLIPSIS, CursorPaginator
+from posts.thumbnails import generate
 from posts.views import COUNT_POSTS
 
 User = get_user_model()
@@ -149,6 +158,17 @@ class PostURLTests(TestCase):
                 self.assertIsInstance(form_field, expected)
                 self.assertEqual(is_edit_field, True)
 
+    def test_thumbnail_placeholder_until_generated(self):
+        """Пока миниатюры нет, страница выводит заглушку"""
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[self.post.id]))
+        self.assertNotContains(response, '<img class="card-img')
+        self.assertContains(response, 'bg-light')
+        generate(self.post.id, self.post.image.name)
+        response = self.guest_client.get(
+            reverse('posts:post_detail', args=[self.post.id]))
+        self.assertContains(response, '<img class="card-img')
+
 
 COUNT_POSTS_2: int = 3  # число тестовых постов на второй странице
 
@@ -208,6 +228,183 @@ class PaginatorViewsTest(TestCase):
                     len(response.context['page_obj']), COUNT_POSTS_2)
 
 
+class PaginatorCountTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Тестовый текст {numbers}')
+            for numbers in range(COUNT_POSTS_2 + COUNT_POSTS)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_page_window_is_elided(self):
+        """Номера страниц: первая, последняя и по три вокруг текущей"""
+        paginator = CursorPaginator(Post.objects.all(), 1)
+        self.assertEqual(
+            paginator.page(7).page_window,
+            [1, ELLIPSIS, 4, 5, 6, 7, 8, 9, 10, ELLIPSIS, 13],
+        )
+        self.assertEqual(
+            paginator.page(2).page_window[:6], [1, 2, 3, 4, 5, ELLIPSIS])
+
+    def test_count_cached_until_scope_changes(self):
+        """Число постов берётся из кеша до смены версии области"""
+        def count():
+            return CursorPaginator(
+                Post.objects.all(), COUNT_POSTS, scope='posts').count
+
+        self.assertEqual(count(), COUNT_POSTS_2 + COUNT_POSTS)
+        with self.assertNumQueries(0):
+            count()
+        Post.objects.create(author=self.user, text='Ещё пост')
+        self.assertEqual(count(), COUNT_POSTS_2 + COUNT_POSTS + 1)
+
+    @override_settings(PAGINATOR_COUNT_LIMIT=COUNT_POSTS)
+    def test_count_estimate_keeps_next_link(self):
+        """При оценке числа постов последняя страница ведёт дальше"""
+        paginator = CursorPaginator(Post.objects.all(), COUNT_POSTS_2)
+        page = paginator.page(paginator.num_pages)
+        self.assertTrue(paginator.count_is_estimate)
+        self.assertIsNotNone(page.next_cursor)
+        self.assertEqual(page.page_window[-1], ELLIPSIS)
+
+
+class CursorPaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовое название',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Post.objects.bulk_create(
+            Post(author=cls.user, text=f'Тестовый текст {numbers}',
+                 group=cls.group)
+            for numbers in range(COUNT_POSTS_2 + COUNT_POSTS)
+        )
+        # одинаковое время публикации: порядок держится на id
+        Post.objects.update(pub_date=Post.objects.first().pub_date)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_posts', args=[self.group.slug]),
+            reverse('posts:profile', args=[self.user.username]),
+        )
+        cache.clear()
+
+    def test_cursor_pages_walk_all_posts(self):
+        """Курсор ведёт по всем постам вперёд и назад без повторов"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                first = self.guest_client.get(url + '?cursor=')
+                first_page = first.context['page_obj']
+                self.assertFalse(first_page.has_previous())
+                self.assertEqual(len(first_page), COUNT_POSTS)
+                second = self.guest_client.get(
+                    url + f'?cursor={first_page.next_cursor}')
+                second_page = second.context['page_obj']
+                self.assertEqual(len(second_page), COUNT_POSTS_2)
+                self.assertFalse(second_page.has_next())
+                self.assertEqual(
+                    {post.id for post in first_page}
+                    | {post.id for post in second_page},
+                    set(Post.objects.values_list('id', flat=True)),
+                )
+                back = self.guest_client.get(
+                    url + f'?cursor={second_page.previous_cursor}')
+                self.assertEqual(
+                    list(back.context['page_obj']), list(first_page))
+
+    def test_page_links_use_cursor(self):
+        """Номерная страница ссылается на следующую по курсору"""
+        response = self.guest_client.get(self.urls[0])
+        page_obj = response.context['page_obj']
+        self.assertContains(response, f'?cursor={page_obj.next_cursor}')
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор открывает первую страницу"""
+        response = self.guest_client.get(self.urls[0] + '?cursor=%%%')
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), COUNT_POSTS)
+        self.assertFalse(page_obj.has_previous())
+
+
+class SearchViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        for numbers in range(COUNT_POSTS_2 + COUNT_POSTS):
+            Post.objects.create(
+                author=cls.user, text=f'Заметки о котах номер {numbers}')
+        cls.post = Post.objects.create(
+            author=cls.user, text='Про <b>собак</b> и кошек')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query, cursor=None):
+        data = {'q': query}
+        if cursor is not None:
+            data['cursor'] = cursor
+        return self.guest_client.get(reverse('posts:search'), data)
+
+    def test_search_highlights_escaped_snippet(self):
+        """Поиск без учёта регистра выделяет совпадение и экранирует HTML"""
+        response = self.search('СОБАК')
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        self.assertContains(response, '&lt;b&gt;<mark>собак</mark>')
+
+    def test_search_follows_post_changes(self):
+        """Индекс поиска обновляется при изменении и удалении поста"""
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Про попугаев'
+        post.save()
+        self.assertEqual(len(self.search('собак').context['page_obj']), 0)
+        self.assertEqual(len(self.search('попуга').context['page_obj']), 1)
+        post.delete()
+        self.assertEqual(len(self.search('попуга').context['page_obj']), 0)
+
+    def test_search_cursor_pages(self):
+        """Результаты поиска листаются по курсору без повторов"""
+        first_page = self.search('котах').context['page_obj']
+        self.assertEqual(len(first_page), COUNT_POSTS)
+        second_page = self.search(
+            'котах', first_page.next_cursor).context['page_obj']
+        self.assertEqual(len(second_page), COUNT_POSTS_2)
+        found = {post.id for post in first_page} | {
+            post.id for post in second_page}
+        self.assertEqual(len(found), COUNT_POSTS + COUNT_POSTS_2)
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке находит посты по индексу"""
+        admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.guest_client.force_login(admin_user)
+        response = self.guest_client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собак'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.post])
+
+    def test_admin_search_without_words(self):
+        """Строка без слов в поиске админки даёт пустой список"""
+        admin_user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.guest_client.force_login(admin_user)
+        response = self.guest_client.get(
+            reverse('admin:posts_post_changelist'), {'q': '?!'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
+
 class CommentsViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -286,13 +483,200 @@ class CacheTest(TestCase):
     def test_cache_index_page(self):
         """Проверка кеширования главной страницы"""
         cache1 = self.author_client.get(reverse('posts:index')).content
-        self.post.delete()
+        # update() не шлёт сигналов: страница остаётся в кеше
+        Post.objects.filter(pk=self.post.pk).update(text='Другой текст')
         cache2 = self.author_client.get(reverse('posts:index')).content
         self.assertEqual(cache1, cache2)
         cache.clear()
         cache3 = self.author_client.get(reverse('posts:index')).content
         self.assertNotEqual(cache2, cache3)
 
+    def test_cache_invalidated_on_change(self):
+        """Кеш страниц сбрасывается сразу после изменения поста"""
+        cache.clear()
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[post.id]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.author_client.get(url)
+                post.text = 'Исправленный пост'
+                post.save()
+                response = self.author_client.get(url)
+                self.assertContains(response, 'Исправленный пост')
+                post.text = 'Новый пост'
+                post.save()
+
+    def test_renamed_group_and_author_leave_old_pages(self):
+        """Старые адреса группы и профайла перестают отдаваться из кеша"""
+        cache.clear()
+        group = Group.objects.create(
+            title='Группа', slug='old-slug', description='')
+        author = User.objects.create_user(username='old-name')
+        urls = (
+            (group, 'slug', reverse('posts:group_posts', args=['old-slug'])),
+            (author, 'username',
+             reverse('posts:profile', args=['old-name'])),
+        )
+        for obj, field, url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.author_client.get(url).status_code, HTTPStatus.OK)
+                setattr(obj, field, 'new-name')
+                obj.save()
+                self.assertEqual(
+                    self.author_client.get(url).status_code,
+                    HTTPStatus.NOT_FOUND)
+
+    def test_group_and_author_names_reach_other_pages(self):
+        """Новый адрес группы и имена авторов видны на закешированных
+        страницах поста, профайла и группы"""
+        cache.clear()
+        group = Group.objects.create(
+            title='Группа', slug='group', description='')
+        post = Post.objects.create(
+            author=self.author, group=group, text='Пост в группе')
+        Comment.objects.create(
+            post=post, author=User.objects.create_user(username='reader'),
+            text='Комментарий')
+        urls = (
+            reverse('posts:post_detail', args=[post.id]),
+            reverse('posts:profile', args=[self.author.username]),
+        )
+        for url in urls:
+            self.author_client.get(url)
+        group.slug = 'new-group'
+        group.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.author_client.get(url),
+                    reverse('posts:group_posts', args=['new-group']))
+        urls = (
+            reverse('posts:post_detail', args=[post.id]),
+            reverse('posts:group_posts', args=[group.slug]),
+        )
+        for url in urls:
+            self.author_client.get(url)
+        reader = User.objects.get(username='reader')
+        reader.username = 'renamed-reader'
+        reader.save()
+        self.author.first_name = 'Новое имя'
+        self.author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.author_client.get(url)
+                self.assertContains(response, 'Новое имя')
+        self.assertContains(
+            self.author_client.get(urls[0]), 'renamed-reader')
+
+    def test_author_change_invalidates_both_profiles(self):
+        """Пост со сменённым автором уходит из профайла прежнего автора и
+        появляется у нового"""
+        cache.clear()
+        post = Post.objects.create(author=self.author, text='Чужой пост')
+        other = User.objects.create_user(username='other')
+        old_url = reverse('posts:profile', args=[self.author.username])
+        new_url = reverse('posts:profile', args=[other.username])
+        self.author_client.get(old_url)
+        self.author_client.get(new_url)
+        post.author = other
+        post.save()
+        self.assertNotContains(self.author_client.get(old_url), 'Чужой пост')
+        self.assertContains(self.author_client.get(new_url), 'Чужой пост')
+
+    def test_follow_invalidates_follower_profile(self):
+        """Подписка сразу меняет число подписок в профайле подписчика"""
+        cache.clear()
+        reader = User.objects.create_user(username='reader')
+        url = reverse('posts:profile', args=[reader.username])
+        self.assertContains(self.author_client.get(url), 'подписок: 0')
+        Follow.objects.create(user=reader, author=self.author)
+        self.assertContains(self.author_client.get(url), 'подписок: 1')
+
+    def test_comment_invalidates_post_detail(self):
+        """Новый комментарий сразу виден на закешированной странице"""
+        cache.clear()
+        url = reverse('posts:post_detail', args=[self.post.id])
+        self.author_client.get(url)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Свежий комментарий')
+        self.assertContains(self.author_client.get(url), 'Свежий комментарий')
+
+    def test_stale_page_while_recomputing(self):
+        """Пока страницу пересчитывает другой запрос, отдаётся прежняя"""
+        cache.clear()
+        url = reverse('posts:index')
+        self.author_client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Другой текст')
+        bump('posts')
+        with patch('posts.cache.acquire', return_value=False):
+            self.assertNotContains(self.author_client.get(url), 'Другой текст')
+        self.assertContains(self.author_client.get(url), 'Другой текст')
+
+    @override_settings(PAGE_CACHE_WAIT=0)
+    def test_render_when_wait_expired(self):
+        """Без прежней версии страница не ждёт пересчёта дольше срока"""
+        cache.clear()
+        with patch('posts.cache.acquire', return_value=False):
+            response = self.author_client.get(reverse('posts:index'))
+        self.assertContains(response, self.post.text)
+
+    def test_early_refresh(self):
+        """С большим PAGE_CACHE_EARLY_BETA страница пересчитывается заранее"""
+        cache.clear()
+        url = reverse('posts:index')
+        self.author_client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Другой текст')
+        with override_settings(PAGE_CACHE_EARLY_BETA=10 ** 12):
+            self.assertContains(self.author_client.get(url), 'Другой текст')
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Leo')
+        cls.post = Post.objects.create(author=cls.author, text='Текст')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_not_modified_without_queries(self):
+        """Неизменная страница отдаёт 304 без запросов к базе"""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.id]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_changed_page_has_new_etag(self):
+        """После изменения поста ETag меняется и страница отдаётся"""
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(author=self.author, text='Новый пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Новый пост')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since(self):
+        """Закешированная страница отвечает 304 на If-Modified-Since"""
+        url = reverse('posts:index')
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
 
 class FollowTest(TestCase):
     @classmethod
@@ -388,3 +772,217 @@ class FollowTest(TestCase):
         )
         new_context = response.context['page_obj']
         self.assertEqual(len(new_context), 0)
+
+
+class FeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Author')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_follow_backfills_and_unfollow_prunes_feed(self):
+        """Подписка дополняет ленту, отписка очищает её"""
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.user, post=self.old_post).exists())
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username]))
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост раскладывается по лентам подписчиков"""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.user, post=post).exists())
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_popular_author_is_read_on_request(self):
+        """Посты популярного автора подмешиваются в ленту при чтении"""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(FeedEntry.objects.exists())
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [post, self.old_post])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_author_back_under_threshold_keeps_feed(self):
+        """Посты автора остаются в ленте, когда подписчиков стало меньше"""
+        other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=other, author=self.author)
+        # второй подписчик переводит автора за порог: без дополнения ленты
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+        Follow.objects.filter(user=other).delete()
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [post, self.old_post])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+    def test_author_over_threshold_is_not_doubled(self):
+        """Пост, разосланный до перехода автора за порог, в ленте один раз"""
+        Follow.objects.create(user=self.user, author=self.author)
+        other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [post, self.old_post])
+
+    @override_settings(FEED_MAX_ENTRIES=1)
+    def test_feed_keeps_latest_entries(self):
+        """Подписка добавляет в ленту только последние посты, старые
+        записи удаляет trim_feeds"""
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        Follow.objects.create(user=self.user, author=self.author)
+        entries = FeedEntry.objects.filter(user=self.user)
+        self.assertEqual(
+            list(entries.values_list('post_id', 'pub_date')),
+            [(post.id, post.pub_date)])
+        FeedEntry.objects.create(
+            user=self.user, post=self.old_post,
+            pub_date=self.old_post.pub_date)
+        call_command('trim_feeds', stdout=io.StringIO())
+        self.assertEqual(
+            list(entries.values_list('post_id', flat=True)), [post.id])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост для выгрузки',
+            image=SimpleUploadedFile('export.gif', b'GIF89a-export'),
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='Комментарий')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def get_content(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def test_profile_export_jsonl(self):
+        """Автор выгружает свои посты и комментарии построчно"""
+        content = self.get_content(
+            reverse('posts:profile_export', args=[self.author.username]))
+        records = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(
+            [(record['type'], record['text']) for record in records],
+            [('post', 'Пост для выгрузки'), ('comment', 'Комментарий')],
+        )
+        self.assertEqual(records[0]['group'], 'group')
+
+    def test_export_csv(self):
+        content = self.get_content(
+            reverse('posts:profile_export', args=[self.author.username]),
+            format='csv').decode()
+        self.assertTrue(content.startswith('type,id,post,author'))
+        self.assertIn('Пост для выгрузки', content)
+
+    def test_export_zip_with_images(self):
+        """С ?images=1 выгрузка — zip с записями и картинками"""
+        content = self.get_content(
+            reverse('posts:profile_export', args=[self.author.username]),
+            images='1')
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            self.assertIn('posts.jsonl', archive.namelist())
+            self.assertEqual(
+                archive.read(f'media/{self.post.image.name}'),
+                b'GIF89a-export',
+            )
+
+    def test_export_permissions(self):
+        """Чужой профиль и группу выгружает только персонал"""
+        other = User.objects.create_user(username='other')
+        self.client.force_login(other)
+        urls = (
+            reverse('posts:profile_export', args=[self.author.username]),
+            reverse('posts:group_export', args=[self.group.slug]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.client.get(url).status_code, HTTPStatus.FORBIDDEN)
+        other.is_staff = True
+        other.save()
+        content = self.get_content(
+            reverse('posts:group_export', args=[self.group.slug]))
+        self.assertEqual(len(content.splitlines()), 2)
+
+
+class SyndicationFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Leo')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост для ленты')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds(self):
+        """RSS и Atom общей ленты, группы и автора содержат пост"""
+        urls = (
+            reverse('posts:feed_rss'),
+            reverse('posts:feed_atom'),
+            reverse('posts:group_rss', args=[self.group.slug]),
+            reverse('posts:group_atom', args=[self.group.slug]),
+            reverse('posts:profile_rss', args=[self.author.username]),
+            reverse('posts:profile_atom', args=[self.author.username]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertContains(response, 'Пост для ленты')
+                self.assertIn('xml', response['Content-Type'])
+
+    def test_missing_object(self):
+        urls = (
+            reverse('posts:group_rss', args=['missing']),
+            reverse('posts:profile_atom', args=['missing']),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_cached_until_new_post(self):
+        """Лента отдаётся из кеша и сбрасывается новым постом"""
+        url = reverse('posts:feed_rss')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Свежий пост')
@@ -0,0 +1,99 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from . import shards
+from .cache import bump, post_scopes
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POST_THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails',
+        )
+    return _executor
+
+
+def generate(post_id, name):
+    """Создаёт миниатюры картинки поста во всех размерах POST_THUMBNAILS.
+
+    Страницы с постом закешированы с заглушкой, поэтому после создания
+    миниатюр их версии повышаются.
+    """
+    try:
+        for geometry, options in settings.POST_THUMBNAILS.values():
+            get_thumbnail(name, geometry, **options)
+        post = shards.for_post(
+            Post.objects.filter(pk=post_id), post_id).first()
+        if post is not None:
+            bump(*post_scopes(post))
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+
+
+def generate_in_pool(post_id, name):
+    try:
+        generate(post_id, name)
+    finally:
+        # поток пула держал бы своё соединение с базой до конца процесса
+        connections.close_all()
+
+
+def schedule(post_id, name):
+    """Ставит создание миниатюр в фоновый пул после коммита."""
+    if not settings.POST_THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: generate(post_id, name))
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(generate_in_pool, post_id, name))
+
+
+# thumbnail_options и get_ready_thumbnail повторяют начало
+# ThumbnailBackend.get_thumbnail из sorl-thumbnail 12.7.0 и зовут его
+# закрытые _get_format и _get_thumbnail_filename: у sorl нет открытого
+# способа найти миниатюру, не создавая её. Версия закреплена в
+# requirements.txt; при обновлении sorl сверьте их с get_thumbnail —
+# расхождение ловит test_thumbnail_placeholder_until_generated.
+
+
+def thumbnail_options(source, options):
+    """Опции sorl-thumbnail, с которыми он считает имя миниатюры."""
+    options = dict(options)
+    backend = default.backend
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def get_ready_thumbnail(image, alias):
+    """Готовая миниатюра или None, если её ещё не создали.
+
+    Смотрит только в хранилище ключей sorl-thumbnail и никогда не
+    открывает саму картинку.
+    """
+    if not image:
+        return None
+    geometry, options = settings.POST_THUMBNAILS[alias]
+    source = ImageFile(image)
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, thumbnail_options(source, options))
+    return default.kvstore.get(ImageFile(name, default.storage))
@@ -1,31 +1,63 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.decorators.cache import cache_page
+
+from core.sqlite import save_atomic, write_transaction
+
+from . import shards
 from .models import Follow, Group, Post, User
+from .cache import (
+    AUTHORS_SCOPE, GROUPS_SCOPE, cache_versioned, post_author_scope,
+)
+from .export import CONTENT_TYPES, FORMATS, export, group_content, user_content
+from .feed import feed_posts
 from .forms import CommentForm, PostForm
+from .images import store
+from .paginators import CursorPaginator, FeedCursorPaginator
+from .search import SearchPaginator, search_posts
+from .stats import get_stats
 
 
 COUNT_POSTS: int = 10  # число выводимых постов
+# поля, которые выводит includes/post_list.html и ссылки на группу
+POST_LIST_FIELDS = (
+    'text', 'pub_date', 'image', 'author', 'group',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug', 'group__title',
+)
+
+
+def with_related(queryset):
+    """Посты вместе с автором и группой одним запросом."""
+    return queryset.select_related('author', 'group').only(*POST_LIST_FIELDS)
 
 
-def get_page_context(queryset, request):
-    paginator = Paginator(queryset, COUNT_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+def get_page_context(queryset, request, scope=None,
+                     paginator_class=CursorPaginator):
+    paginator = paginator_class(
+        with_related(queryset), COUNT_POSTS, scope=scope
+    )
+    cursor = request.GET.get('cursor')
+    if cursor is not None:
+        page_obj = paginator.get_cursor_page(cursor)
+    else:
+        page_obj = paginator.get_page(request.GET.get('page'))
     return {
         'page_obj': page_obj,
     }
 
 
-@cache_page(20)
+@cache_versioned('posts')
 def index(request):
     """Шаблон главной страницы"""
     template = 'posts/index.html'
-    context = get_page_context(Post.objects.all(), request)
+    context = get_page_context(
+        shards.everywhere(Post.objects.all()), request, 'posts')
     return render(request, template, context)
 
 
+@cache_versioned('group:{slug}', AUTHORS_SCOPE)
 def group_posts(request, slug):
     """Шаблон с группами постов"""
     group = get_object_or_404(Group, slug=slug)
@@ -33,31 +65,53 @@ def group_posts(request, slug):
     context = {
         'group': group,
     }
-    context.update(get_page_context(group.posts.all(), request))
+    context.update(
+        get_page_context(
+            shards.everywhere(group.posts.all()), request, f'group:{slug}')
+    )
     return render(request, template, context)
 
 
+@cache_versioned('profile:{username}', GROUPS_SCOPE)
 def profile(request, username):
     """Шаблон профайла пользователя"""
-    user = get_object_or_404(User, username=username)
+    user = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     template = 'posts/profile.html'
-    following = user.is_authenticated and user.following.exists()
+    following = (
+        request.user.is_authenticated
+        and Follow.objects.filter(user=request.user, author=user).exists()
+    )
+    stats = get_stats(user)
     context = {
         'author': user,
-        'count_posts': user.posts.count(),
+        'stats': stats,
+        'count_posts': stats.posts_count,
         'following': following,
     }
-    context.update(get_page_context(user.posts.all(), request))
+    context.update(
+        get_page_context(
+            shards.for_author(user.posts.all(), user.pk), request,
+            f'profile:{username}',
+        )
+    )
     return render(request, template, context)
 
 
+@cache_versioned(
+    'post:{post_id}', post_author_scope, GROUPS_SCOPE, AUTHORS_SCOPE)
 def post_detail(request, post_id):
     """Шаблон страницы поста"""
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(shards.for_post(
+        Post.objects.select_related('author__stats', 'group'), post_id
+    ), pk=post_id)
     user = post.author
-    count_posts = user.posts.all().count()
+    count_posts = get_stats(user).posts_count
     form = CommentForm()
-    comments = post.comments.all()
+    comments = shards.for_post(post.comments.select_related('author').only(
+        'text', 'post', 'author', 'author__username'
+    ), post_id)
     template = 'posts/post_detail.html'
     context = {
         'post': post,
@@ -69,15 +123,47 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+def search(request):
+    """Шаблон поиска по тексту постов"""
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    context = {
+        'query': query,
+    }
+    if query:
+        paginator = SearchPaginator(
+            with_related(shards.everywhere(search_posts(query))), COUNT_POSTS
+        )
+        context['page_obj'] = paginator.get_cursor_page(
+            request.GET.get('cursor')
+        )
+    return render(request, template, context)
+
+
+def save_post(post):
+    """Сохраняет пост после проверки формы.
+
+    Картинка уже нормализована в форме; новый файл ложится в хранилище
+    до транзакции, а если пост сохранить не удалось, удаляется.
+    """
+    stored = store(post.image)
+    try:
+        save_atomic(post)
+    except Exception:
+        if stored:
+            post.image.delete(save=False)
+        raise
+
+
 @login_required
 def post_create(request):
     """Шаблон создания поста"""
     template = 'posts/create_post.html'
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     if request.method == 'POST' and form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        save_post(post)
         return redirect('posts:profile', username=request.user)
     context = {
         'form': form,
@@ -88,7 +174,8 @@ def post_create(request):
 @login_required
 def post_edit(request, post_id):
     """Шаблон редактирования поста"""
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        shards.for_post(Post.objects.all(), post_id), pk=post_id)
     template = 'posts/create_post.html'
     if post.author == request.user:
         form = PostForm(
@@ -99,7 +186,7 @@ def post_edit(request, post_id):
         if request.method == 'POST' and form.is_valid():
             post = form.save(commit=False)
             post.author = request.user
-            post.save()
+            save_post(post)
             return redirect('posts:post_detail', post_id=post_id)
         context = {
             'form': form,
@@ -112,25 +199,29 @@ def post_edit(request, post_id):
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        shards.for_post(Post.objects.all(), post_id), id=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        save_atomic(comment)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
     template = 'posts/follow.html'
-    context = get_page_context(posts.all(), request)
+    context = get_page_context(
+        feed_posts(request.user), request,
+        paginator_class=FeedCursorPaginator,
+    )
     return render(request, template, context)
 
 
 @login_required
+@write_transaction
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
@@ -139,8 +230,44 @@ def profile_follow(request, username):
 
 
 @login_required
+@write_transaction
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     unfollowing = Follow.objects.filter(user=request.user, author=author)
     unfollowing.delete()
     return redirect('posts:profile', author)
+
+
+def export_response(request, name, content):
+    """Выгрузка ?format=jsonl|csv, с ?images=1 — zip с картинками."""
+    file_format = request.GET.get('format', 'jsonl')
+    if file_format not in FORMATS:
+        return HttpResponseBadRequest('Неизвестный формат выгрузки')
+    with_images = request.GET.get('images') == '1'
+    extension = 'zip' if with_images else file_format
+    response = StreamingHttpResponse(
+        export(*content, file_format, with_images),
+        content_type=CONTENT_TYPES[extension],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}.{extension}"'
+    )
+    return response
+
+
+@login_required
+def profile_export(request, username):
+    """Выгрузка постов и комментариев автора: ему самому и персоналу"""
+    author = get_object_or_404(User, username=username)
+    if request.user != author and not request.user.is_staff:
+        raise PermissionDenied
+    return export_response(request, author.username, user_content(author))
+
+
+@login_required
+def group_export(request, slug):
+    """Выгрузка постов группы и комментариев к ним для персонала"""
+    if not request.user.is_staff:
+        raise PermissionDenied
+    group = get_object_or_404(Group, slug=slug)
+    return export_response(request, group.slug, group_content(group))
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -40,6 +41,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -50,11 +52,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -85,13 +89,69 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Соединения живут между запросами, у каждого потока сервера своё.
+DATABASE_CONN_MAX_AGE = 600
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+# Прагмы каждого нового соединения SQLite (core.sqlite). В WAL читатели
+# не ждут писателя, а synchronous=NORMAL в WAL не портит базу при сбое
+# и лишь может потерять последние транзакции при отключении питания.
+# busy_timeout — сколько миллисекунд ждать занятую базу; если транзакция
+# записи всё равно не прошла, write_transaction повторяет её до
+# SQLITE_WRITE_ATTEMPTS раз, начиная с паузы SQLITE_RETRY_DELAY секунд.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # в КиБ: 64 МиБ на соединение
+    'temp_store': 'MEMORY',
+}
+SQLITE_WRITE_ATTEMPTS = 5
+SQLITE_RETRY_DELAY = 0.02
+
+# Чтения GET-запросов идут в реплики, пока запрос ничего не записал.
+# Реплики обновляет команда sync_replicas; не обновлявшаяся дольше
+# REPLICA_MAX_AGE секунд реплика не читается, а страницы для кеша
+# считаются по ней, только если в ней есть все изменения. Посетитель,
+# который что-то записал, REPLICA_STICKY_SECONDS читает основную базу:
+# не меньше REPLICA_MAX_AGE, иначе он может не увидеть своих изменений.
+DATABASE_ROUTERS = [
+    'posts.shards.ShardRouter',
+    'core.replicas.ReplicaRouter',
+]
+DATABASE_REPLICAS = ['replica']
+REPLICA_MAX_AGE = 30
+REPLICA_STICKY_SECONDS = REPLICA_MAX_AGE
+REPLICA_PIN_COOKIE = 'db_pin'
+
+# Посты и комментарии можно разнести по POST_SHARD_COUNT локальным
+# базам SQLite по хешу автора; 0 — всё в основной базе. Шарды создаёт
+# migrate --database shardN, строки в них переносит rebalance_shards,
+# в том числе после смены числа шардов. Пользователи, группы, подписки
+# и счётчики остаются в основной базе.
+POST_SHARD_COUNT = 0
+POST_SHARDS = [f'shard{number}' for number in range(POST_SHARD_COUNT)]
+for number in range(POST_SHARD_COUNT):
+    DATABASES[f'shard{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.shard{number}.sqlite3'),
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -133,6 +193,14 @@ STATIC_URL = '/static/'
 
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+# Сессии читаются из кеша, а в базу изменения пишутся раз в
+# SESSION_WRITE_BEHIND секунд (0 — сразу). Пользователь запоминается
+# в сессии и перечитывается после изменения User, но не реже раза в
+# USER_SNAPSHOT_MAX_AGE секунд: изменения через update() сигналов не шлют.
+SESSION_ENGINE = 'core.sessions'
+SESSION_WRITE_BEHIND = 5
+USER_SNAPSHOT_MAX_AGE = 60
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 # LOGOUT_REDIRECT_URL = 'posts:index'
@@ -145,8 +213,88 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Общий для всех процессов сервера кеш в файле, отображённом в память.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.MmapCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'yatube-cache'),
+        'OPTIONS': {
+            'SLOTS': 2048,
+            'SLOT_SIZE': 32 * 1024,
+        },
     }
 }
+
+# Авторы с большим числом подписчиков не рассылаются по лентам при
+# публикации: их посты подмешиваются в ленту при чтении.
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_BATCH_SIZE = 500
+# В ленте хранятся записи последних FEED_MAX_ENTRIES постов: подписка
+# добавляет не больше стольких, старые удаляет команда trim_feeds.
+FEED_MAX_ENTRIES = 1000
+
+# Страницы лент кешируются надолго: версии областей сбрасываются
+# сигналами при изменении постов, комментариев, подписок и групп.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 4
+# Страницу пересчитывает один запрос: остальные до PAGE_CACHE_WAIT секунд
+# ждут её или получают предыдущую версию. Чем больше PAGE_CACHE_EARLY_BETA,
+# тем раньше до истечения срока страница пересчитывается заранее.
+PAGE_CACHE_LOCK_TIMEOUT = 30
+PAGE_CACHE_WAIT = 2
+PAGE_CACHE_POLL = 0.05
+PAGE_CACHE_EARLY_BETA = 1.0
+
+# Размеры миниатюр картинок постов: создаются в фоне после сохранения
+# поста, шаблоны до этого показывают заглушку. При 0 потоков миниатюры
+# создаются сразу после коммита.
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+POST_THUMBNAIL_WORKERS = 2
+
+# Загруженные картинки постов нормализуются в пуле процессов: поворот
+# по EXIF, уменьшение до POST_IMAGE_MAX_SIDE, пересжатие без метаданных.
+POST_IMAGE_FORMAT = 'JPEG'
+POST_IMAGE_MAX_SIDE = 1920
+POST_IMAGE_QUALITY = 82
+POST_IMAGE_TIMEOUT = 30
+POST_IMAGE_WORKERS = 2
+
+# Сколько постов пагинатор считает точно в лентах без кеша числа постов
+PAGINATOR_COUNT_LIMIT = 10000
+
+# core.middleware.ServerTimingMiddleware отдаёт в заголовке Server-Timing
+# и пишет в лог core.middleware время SQL, шаблонов, кеша и представления.
+# Доля SERVER_TIMING_PROFILE_RATE запросов профилируется cProfile в
+# SERVER_TIMING_PROFILE_DIR; файлы читает python -m pstats.
+SERVER_TIMING_PROFILE_RATE = 0.0
+SERVER_TIMING_PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+
+# Метрики запросов каждый процесс пишет в свой файл в METRICS_DIR, /metrics
+# складывает файлы всех процессов. При перезапуске сервера каталог можно
+# очистить: Prometheus принимает сброс счётчиков; None выключает метрики.
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'yatube-metrics')
+# /metrics открыт запросу с заголовком Authorization: Bearer METRICS_TOKEN
+# (bearer_token в scrape_config Prometheus) или с адреса из
+# METRICS_ALLOWED_IPS. Оба по умолчанию пусты, и страница закрыта. За
+# обратным прокси на той же машине все запросы приходят с 127.0.0.1,
+# поэтому адреса годятся только без прокси, иначе нужен токен.
+METRICS_TOKEN = None
+METRICS_ALLOWED_IPS = []
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'core.middleware': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
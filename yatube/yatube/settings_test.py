@@ -0,0 +1,54 @@
+"""
+Настройки тестов: pytest берёт их из pytest.ini, manage.py test — из
+--settings=yatube.settings_test или DJANGO_SETTINGS_MODULE.
+
+Всё, чем тестовый запуск отличается от обычного, собрано здесь.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, DATABASE_CONN_MAX_AGE, DATABASES, LOGGING
+
+# Файлы тестового запуска: база и media; каталог удаляется при выходе.
+TEST_DIR = tempfile.mkdtemp(prefix='yatube-test-')
+atexit.register(shutil.rmtree, TEST_DIR, ignore_errors=True)
+
+# Тестовая база в файле, а не в памяти: иначе потоки LiveServerTestCase
+# делят одно соединение, и транзакции одновременных запросов в нём
+# перемешиваются.
+DATABASES['default']['TEST'] = {
+    'NAME': os.path.join(TEST_DIR, 'db.sqlite3'),
+}
+
+# Два шарда заводятся всегда, тесты включают их через
+# override_settings(POST_SHARDS=...).
+for number in range(2):
+    DATABASES.setdefault(f'shard{number}', {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.shard{number}.sqlite3'),
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+    })
+
+# Кеш свой у каждого запуска, чтобы не видеть страниц прошлых.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Картинки постов и миниатюры тестов не попадают в media проекта.
+MEDIA_ROOT = os.path.join(TEST_DIR, 'media')
+
+# Сессии пишутся в базу сразу, а миниатюры создаются сразу после
+# коммита: фоновые потоки не переживают тест.
+SESSION_WRITE_BEHIND = 0
+POST_THUMBNAIL_WORKERS = 0
+
+# Метрики выключены, их тесты включают сами.
+METRICS_DIR = None
+
+LOGGING['loggers']['core.middleware']['level'] = 'WARNING'